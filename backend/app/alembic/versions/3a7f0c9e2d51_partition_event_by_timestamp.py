@@ -0,0 +1,101 @@
+"""Partition event by timestamp
+
+Revision ID: 3a7f0c9e2d51
+Revises: f45c322209db
+Create Date: 2026-10-18 13:02:41.517204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7f0c9e2d51'
+down_revision = 'f45c322209db'
+branch_labels = None
+depends_on = None
+
+
+def _create_event_table(primary_key, **kw):
+    op.create_table('event',
+    sa.Column('user_id', sa.Uuid(), nullable=True),
+    sa.Column('item_id', sa.Uuid(), nullable=True),
+    sa.Column('event_type', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('event_value', sa.JSON(), nullable=True),
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable='timestamp' not in primary_key),
+    sa.ForeignKeyConstraint(['item_id'], ['item.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint(*primary_key),
+    **kw
+    )
+
+
+def _create_event_indexes():
+    op.create_index('ix_event_item_id', 'event', ['item_id'], unique=False, postgresql_where=sa.text('item_id IS NOT NULL'))
+    op.create_index('ix_event_timestamp', 'event', ['timestamp'], unique=False, postgresql_where=sa.text('item_id IS NOT NULL'))
+    op.create_index('ix_event_user_id_item_id', 'event', ['user_id', 'item_id'], unique=False, postgresql_where=sa.text('user_id IS NOT NULL'))
+
+
+def _drop_event_indexes():
+    op.drop_index('ix_event_user_id_item_id', table_name='event')
+    op.drop_index('ix_event_timestamp', table_name='event')
+    op.drop_index('ix_event_item_id', table_name='event')
+
+
+def _copy_events(source):
+    op.execute(
+        'INSERT INTO event (id, timestamp, user_id, item_id, event_type, event_value) '
+        'SELECT id, coalesce(timestamp, now()), user_id, item_id, event_type, event_value '
+        f'FROM {source}'
+    )
+
+
+def upgrade():
+    # index and primary key names are schema-wide, free them for the new table
+    _drop_event_indexes()
+    op.drop_constraint('event_pkey', 'event', type_='primary')
+    op.rename_table('event', 'event_unpartitioned')
+
+    # the partition key has to be part of the primary key
+    _create_event_table(
+        primary_key=('id', 'timestamp'),
+        postgresql_partition_by='RANGE (timestamp)',
+    )
+    op.execute('CREATE TABLE event_default PARTITION OF event DEFAULT')
+    # monthly partitions from the oldest event up to three months ahead, later
+    # ones are created by the cron job (app/ingest/partitions.py)
+    op.execute("""
+        DO $$
+        DECLARE
+            bound timestamp := date_trunc('month', coalesce(
+                (SELECT min(timestamp) FROM event_unpartitioned), now()
+            ) AT TIME ZONE 'UTC');
+        BEGIN
+            WHILE bound < date_trunc('month', now() AT TIME ZONE 'UTC') + interval '4 months' LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF event FOR VALUES FROM (%L) TO (%L)',
+                    'event_p' || to_char(bound, 'YYYYMM'),
+                    bound AT TIME ZONE 'UTC',
+                    (bound + interval '1 month') AT TIME ZONE 'UTC'
+                );
+                bound := bound + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+    _copy_events('event_unpartitioned')
+    op.drop_table('event_unpartitioned')
+    _create_event_indexes()
+
+
+def downgrade():
+    _drop_event_indexes()
+    op.drop_constraint('event_pkey', 'event', type_='primary')
+    op.rename_table('event', 'event_partitioned')
+
+    _create_event_table(primary_key=('id',))
+    _copy_events('event_partitioned')
+    # drops the partitions as well
+    op.drop_table('event_partitioned')
+    _create_event_indexes()
@@ -0,0 +1,115 @@
+"""Add event type catalog and promoted event fields
+
+Revision ID: cb338c91bfa1
+Revises: f9b6a23cac51
+Create Date: 2026-10-18 12:39:46.129930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb338c91bfa1'
+down_revision = 'f9b6a23cac51'
+branch_labels = None
+depends_on = None
+
+
+# Event types at this revision, later changes go to
+# app.models.event.EVENT_TYPE_CATALOG which init_db syncs the table with
+EVENT_TYPES = [
+    (0, 'other', 1.0),
+    (1, 'view', 1.0),
+    (2, 'click', 2.0),
+    (3, 'favourite', 4.0),
+    (4, 'purchase', 8.0),
+]
+
+TO_CODE = "CASE event_type " + " ".join(
+    f"WHEN '{name}' THEN {code}" for code, name, _ in EVENT_TYPES[1:]
+) + " ELSE 0 END"
+TO_NAME = "CASE event_type " + " ".join(
+    f"WHEN {code} THEN '{name}'" for code, name, _ in EVENT_TYPES
+) + " END"
+# events of unregistered types become "other" events keeping their type in
+# event_value, the downgrade restores it
+RAW_NAME = (
+    "CASE WHEN event_type = 0 AND json_typeof(event_value) = 'object' "
+    "THEN event_value ->> 'event_type' END"
+)
+
+
+def upgrade():
+    event_type = op.create_table('event_type',
+    sa.Column('code', sa.SmallInteger(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('code'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(
+        event_type,
+        [{'code': code, 'name': name, 'weight': weight} for code, name, weight in EVENT_TYPES],
+    )
+    op.add_column('event', sa.Column('price_seen', sa.Float(), nullable=True))
+    op.add_column('event', sa.Column('dwell_time_ms', sa.Integer(), nullable=True))
+    # move numeric values of the promoted keys out of event_value
+    op.execute(
+        "UPDATE event SET "
+        "price_seen = CASE WHEN json_typeof(event_value -> 'price_seen') = 'number' "
+        "THEN (event_value ->> 'price_seen')::float END, "
+        "dwell_time_ms = CASE WHEN json_typeof(event_value -> 'dwell_time_ms') = 'number' "
+        "THEN round((event_value ->> 'dwell_time_ms')::numeric)::int END, "
+        "event_value = nullif((event_value::jsonb - 'price_seen' - 'dwell_time_ms')::json::text, '{}')::json "
+        "WHERE json_typeof(event_value) = 'object' "
+        "AND (event_value::jsonb ? 'price_seen' OR event_value::jsonb ? 'dwell_time_ms')"
+    )
+    known = ", ".join(f"'{name}'" for _, name, _ in EVENT_TYPES)
+    op.execute(
+        "UPDATE event SET event_value = "
+        "(coalesce(event_value::jsonb, '{}') || jsonb_build_object('event_type', event_type))::json "
+        f"WHERE event_type NOT IN ({known}) "
+        "AND (event_value IS NULL OR json_typeof(event_value) = 'object')"
+    )
+    # rollup rows of unregistered types are summed into "other" rows, the
+    # events keep their types
+    op.execute(
+        "INSERT INTO user_item_daily (user_id, item_id, day, event_type, count) "
+        "SELECT user_id, item_id, day, 'other', sum(count) FROM user_item_daily "
+        f"WHERE event_type NOT IN ({known}) GROUP BY user_id, item_id, day "
+        "ON CONFLICT (user_id, item_id, day, event_type) "
+        "DO UPDATE SET count = user_item_daily.count + excluded.count"
+    )
+    op.execute(f"DELETE FROM user_item_daily WHERE event_type NOT IN ({known})")
+    for table in ('event', 'user_item_daily'):
+        op.alter_column(table, 'event_type',
+                   existing_type=sa.VARCHAR(length=255),
+                   type_=sa.SmallInteger(),
+                   existing_nullable=False,
+                   postgresql_using=TO_CODE)
+        op.create_foreign_key(f'{table}_event_type_fkey', table, 'event_type', ['event_type'], ['code'])
+
+
+def downgrade():
+    known = ", ".join(f"'{name}'" for _, name, _ in EVENT_TYPES)
+    for table, using in (
+        ('user_item_daily', TO_NAME),
+        ('event', f"coalesce({RAW_NAME}, {TO_NAME})"),
+    ):
+        op.drop_constraint(f'{table}_event_type_fkey', table, type_='foreignkey')
+        op.alter_column(table, 'event_type',
+                   existing_type=sa.SmallInteger(),
+                   type_=sa.VARCHAR(length=255),
+                   existing_nullable=False,
+                   postgresql_using=using)
+    op.execute(
+        "UPDATE event SET event_value = "
+        "nullif((event_value::jsonb - 'event_type')::json::text, '{}')::json "
+        f"WHERE event_type NOT IN ({known}) AND json_typeof(event_value) = 'object' "
+        "AND event_value ->> 'event_type' = event_type"
+    )
+    op.drop_column('event', 'dwell_time_ms')
+    op.drop_column('event', 'price_seen')
+    op.drop_table('event_type')
@@ -0,0 +1,45 @@
+"""Hash item content in SQL
+
+Revision ID: f0aa96d4f8f5
+Revises: 67bf4a421643
+Create Date: 2026-10-18 13:52:19.480678
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0aa96d4f8f5'
+down_revision = '67bf4a421643'
+branch_labels = None
+depends_on = None
+
+
+# Listing columns at this revision, hashed like app.crud.csv._CONTENT_HASH
+ITEM_COLUMNS = [
+    'name', 'year', 'selling_price', 'km_driven', 'fuel_type', 'transmission',
+    'owner_type', 'mileage', 'engine', 'max_power', 'torque', 'seats',
+]
+CONTENT_HASH = "md5(concat_ws(chr(31), " + ", ".join(
+    f"coalesce({name}::text, '')" for name in ITEM_COLUMNS
+) + "))"
+
+
+def upgrade():
+    # rehash imported items, the later copies of a listing that hashed
+    # differently before are kept without a hash like items created by hand
+    op.execute(
+        f"UPDATE item SET content_hash = CASE WHEN h.n = 1 THEN h.hash END "
+        f"FROM (SELECT id, {CONTENT_HASH} AS hash, row_number() OVER ("
+        f"PARTITION BY seller_id, {CONTENT_HASH} ORDER BY created_at, id) AS n "
+        "FROM item WHERE content_hash IS NOT NULL) h "
+        "WHERE item.id = h.id"
+    )
+
+
+def downgrade():
+    # the previous hashes were computed in Python and cannot be restored,
+    # listings imported again after a downgrade are added once more
+    pass
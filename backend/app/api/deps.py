@@ -1,8 +1,10 @@
-from collections.abc import Generator
+import io
+from collections.abc import AsyncIterator, Generator
 from typing import Annotated
 
+import anyio.from_thread
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
@@ -10,6 +12,7 @@ from sqlmodel import Session
 
 from app.core import security
 from app.core.config import settings
+from app.core.pagination import Cursor, decode_cursor
 from app.core.db import engine
 from app.models import TokenPayload, User
 from typing import Optional
@@ -72,3 +75,49 @@ def get_maybe_current_user(
 
 
 MaybeCurrentUser = Annotated[User | None, Depends(get_maybe_current_user)]
+
+
+def get_cursor(cursor: str | None = None) -> Cursor | None:
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+CursorDep = Annotated[Cursor | None, Depends(get_cursor)]
+
+
+class RequestBodyReader(io.RawIOBase):
+    """
+    Blocking file object over the body of `request`, handing out chunks as
+    they are received instead of buffering the whole body. Only usable from
+    sync endpoints, which run in a worker thread and wait for the event loop
+    to receive each chunk.
+    """
+
+    def __init__(self, request: Request) -> None:
+        self._chunks: AsyncIterator[bytes] = request.stream()
+        self._pending = b""
+
+    async def _receive(self) -> bytes:
+        return await anext(self._chunks, b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: "memoryview | bytearray") -> int:  # type: ignore[override]
+        if not self._pending:
+            self._pending = anyio.from_thread.run(self._receive)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def get_body_reader(request: Request) -> io.BufferedReader:
+    return io.BufferedReader(RequestBodyReader(request))
+
+
+BodyReaderDep = Annotated[io.BufferedReader, Depends(get_body_reader)]
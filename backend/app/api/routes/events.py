@@ -1,28 +1,131 @@
-from typing import Any, Sequence
+import queue
+from typing import Annotated, Any, Sequence
 from datetime import datetime
 
-from fastapi import APIRouter, HTTPException, File, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    File,
+    Request,
+    Response,
+    UploadFile,
+)
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlmodel import func, select
 
 from app.api.deps import CurrentUser, SessionDep
-from app.models import Event, EventCreate, EventPublic
+from app.models import Event, EventCreate, EventPublic, EventsBatchPublic
+from app.core.bus import EVENTS_CREATED, bus
 from app.core.config import settings
-from app.crud.csv import import_csv
+from app.crud.events import create_events, parse_events
+from app.ingest.buffer import get_event_buffer
+from app.ingest.dedup import claim_keys, event_key, find_duplicates
+from app.ingest.journal import get_event_journal
 
 router = APIRouter(prefix="/events", tags=["events"])
 
 
 @router.post("/", response_model=EventPublic)
-def create_event(*, session: SessionDep, event_in: EventCreate) -> Any:
+def create_event(
+    *, session: SessionDep, event_in: EventCreate, response: Response
+) -> Any:
     """
     Record and events within the system.
     An event represents an interaction or action involving an item, a user, or a system-wide event, such as:
     - A user purchasing or interacting with an item.
     - A user action.
     - A general system event like.
+
+    With `EVENT_JOURNAL_ENABLED` or `EVENT_BUFFER_ENABLED` the event is written
+    in the background and 202 is returned as soon as it is journaled or queued.
+    A retry repeating the `idempotency_key` of a stored event returns that event.
     """
+    key = event_in.idempotency_key
+    queued = settings.EVENT_JOURNAL_ENABLED or settings.EVENT_BUFFER_ENABLED
+    if key is not None:
+        try:
+            duplicate = find_duplicates(session, [key]).get(key)
+        except OperationalError:
+            if not queued:
+                raise
+            # the database is down, the replay drops the event if it is a retry
+            session.rollback()
+            duplicate = None
+        if duplicate is not None:
+            return duplicate
     event = Event.model_validate(event_in, update={"timestamp": datetime.now()})
+    if settings.EVENT_JOURNAL_ENABLED:
+        get_event_journal().append(event)
+        response.status_code = 202
+        return event
+    if settings.EVENT_BUFFER_ENABLED:
+        try:
+            get_event_buffer().put(event)
+        except queue.Full:
+            raise HTTPException(status_code=503, detail="Event buffer is full")
+        response.status_code = 202
+        return event
+    claim = event_key(event)
     session.add(event)
-    session.commit()
+    if claim is not None:
+        session.add(claim)
+    try:
+        session.commit()
+    except IntegrityError:
+        if claim is None:
+            raise
+        # the key is taken, by a retry handled by another worker, by one still
+        # in its buffer or journal, or by an event older than the window
+        session.rollback()
+        held = claim_keys(session, [event]).get(claim.key)
+        if held is not None:
+            session.rollback()
+            duplicate = session.exec(
+                select(Event).where(
+                    Event.id == held.event_id, Event.timestamp == held.timestamp
+                )
+            ).first()
+            if duplicate is None:
+                raise HTTPException(
+                    status_code=409, detail="An event with this key is being stored"
+                )
+            return duplicate
+        session.add(event)
+        session.commit()
     session.refresh(event)
+    bus.publish(EVENTS_CREATED, [event])
     return event
+
+
+async def read_events_batch(request: Request) -> list[EventCreate | str]:
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        events = parse_events(body, ndjson="ndjson" in content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(events) > settings.EVENTS_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.EVENTS_BATCH_MAX_SIZE} events per batch",
+        )
+    return events
+
+
+@router.post("/batch", response_model=EventsBatchPublic)
+def create_events_batch(
+    *,
+    session: SessionDep,
+    events_in: Annotated[list[EventCreate | str], Depends(read_events_batch)],
+) -> Any:
+    """
+    Record many events at once from a JSON array or newline-delimited JSON
+    (`Content-Type: application/x-ndjson`) of events.
+    Valid records are stored even when others are rejected, see the per-record status.
+    """
+    statuses = create_events(session=session, events_in=events_in)
+    accepted = sum(status.id is not None for status in statuses)
+    return EventsBatchPublic(
+        data=statuses, accepted=accepted, rejected=len(statuses) - accepted
+    )
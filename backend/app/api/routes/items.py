@@ -1,14 +1,18 @@
 import datetime
+import os
 from typing import Any
 import uuid
 import shutil
-import os
 
 from fastapi import APIRouter, HTTPException, File, UploadFile
-from sqlmodel import func, select
+from fastapi.responses import FileResponse
+from sqlmodel import col, func, select
+from starlette.background import BackgroundTask
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import BodyReaderDep, CurrentUser, CursorDep, SessionDep
 from app.models import (
+    ImportJob,
+    ImportJobPublic,
     Item,
     ItemCreate,
     ItemsPublic,
@@ -17,25 +21,38 @@ from app.models import (
     ItemUpdate,
     Message,
 )
+from app.core.bus import ITEMS_CHANGED, bus
 from app.core.config import settings
-from app.crud.csv import import_csv
+from app.core.pagination import encode_cursor, next_cursor
+from app.crud.arrow import ArrowFormat, export_items
+from app.crud.csv import hash_items, import_csv_stream
+from app.ingest.imports import ImportFormat, submit_import_job
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+_EXPORT_FILES = {
+    "parquet": ("items.parquet", "application/vnd.apache.parquet"),
+    "arrow": ("items.arrows", "application/vnd.apache.arrow.stream"),
+}
+
 
 @router.get("/", response_model=ItemsPublic)
 def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+    session: SessionDep,
+    current_user: CurrentUser,
+    cursor: CursorDep,
+    skip: int = 0,
+    limit: int = 100,
 ) -> Any:
     """
     Retrieve items.
+    Pass `next_cursor` of a page as `cursor` to fetch the next one.
     """
 
     if current_user.is_superuser:
         count_statement = select(func.count()).select_from(Item)
         count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
+        statement = select(Item)
     else:
         count_statement = (
             select(func.count())
@@ -43,15 +60,22 @@ def read_items(
             .where(Item.seller_id == current_user.id)
         )
         count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.seller_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        items = session.exec(statement).all()
+        statement = select(Item).where(Item.seller_id == current_user.id)
 
-    return ItemsPublic(data=items, count=count)
+    if cursor is not None:
+        statement = statement.where(col(Item.id) > cursor.id)
+    else:
+        statement = statement.offset(skip)
+    statement = statement.order_by(col(Item.id)).limit(limit)
+    items = session.exec(statement).all()
+
+    # items are paged by id, the cursor key is unused
+    after = next_cursor([item.id for item in items], [0.0] * len(items), limit)
+    return ItemsPublic(
+        data=items,
+        count=count,
+        next_cursor=None if after is None else encode_cursor(after),
+    )
 
 
 @router.get("/{id}", response_model=ItemPublic)
@@ -83,8 +107,11 @@ def create_item(
         },
     )
     session.add(item)
+    session.flush()
+    hash_items(session, [item.id])
     session.commit()
     session.refresh(item)
+    bus.publish(ITEMS_CHANGED, [item.id])
     return item
 
 
@@ -107,8 +134,11 @@ def update_item(
     update_dict = item_in.model_dump(exclude_unset=True)
     item.sqlmodel_update(update_dict)
     session.add(item)
+    session.flush()
+    hash_items(session, [item.id])
     session.commit()
     session.refresh(item)
+    bus.publish(ITEMS_CHANGED, [item.id])
     return item
 
 
@@ -126,23 +156,157 @@ def delete_item(
         raise HTTPException(status_code=400, detail="Not enough permissions")
     session.delete(item)
     session.commit()
+    bus.publish(ITEMS_CHANGED, [id])
     return Message(message="Item deleted successfully")
 
 
-@router.post("/uploadcsv")
+def _submit_upload(
+    session: SessionDep,
+    current_user: CurrentUser,
+    file: UploadFile,
+    fmt: ImportFormat,
+    replace: bool,
+) -> ImportJob:
+    file_location = f"{settings.UPLOAD_DIR}/{uuid.uuid4()}"
+    with open(file_location, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    job = ImportJob(filename=file.filename, seller_id=current_user.id)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    submit_import_job(job.id, file_location, fmt, replace)
+    return job
+
+
+@router.post("/uploadcsv", status_code=202, response_model=ImportJobPublic)
 def uppload_csv(
-    session: SessionDep, current_user: CurrentUser, file: UploadFile = File(...)
-) -> Message:
+    session: SessionDep,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    replace: bool = False,
+) -> Any:
     """
     Uploads CSV file defining items into db.
+    The file is imported in the background, follow the returned job with
+    `GET /items/uploadcsv/{job_id}`. A listing you already have, the same
+    item but for its price, is updated in place when it changed and skipped
+    otherwise. With `replace`, the file is your full feed: your listings
+    missing from it are deleted, unless events reference them.
+    """
+    return _submit_upload(session, current_user, file, "csv", replace)
+
+
+@router.post("/uploadparquet", status_code=202, response_model=ImportJobPublic)
+def upload_parquet(
+    session: SessionDep,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    replace: bool = False,
+) -> Any:
+    """
+    Uploads Parquet file defining items into db, with the columns of the CSV
+    file or of `GET /items/export/parquet`.
+    Imported in the background like `POST /items/uploadcsv`.
     """
+    return _submit_upload(session, current_user, file, "parquet", replace)
+
+
+@router.post("/uploadarrow", status_code=202, response_model=ImportJobPublic)
+def upload_arrow(
+    session: SessionDep,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    replace: bool = False,
+) -> Any:
+    """
+    Uploads Arrow IPC file or stream defining items into db, with the columns
+    of the CSV file or of `GET /items/export/arrow`.
+    Imported in the background like `POST /items/uploadcsv`.
+    """
+    return _submit_upload(session, current_user, file, "arrow", replace)
+
+
+@router.get(
+    "/export/{fmt}",
+    response_class=FileResponse,
+    responses={
+        200: {
+            "content": {
+                media_type: {"schema": {"type": "string", "format": "binary"}}
+                for _, media_type in _EXPORT_FILES.values()
+            }
+        }
+    },
+)
+def export_catalog(
+    session: SessionDep, current_user: CurrentUser, fmt: ArrowFormat
+) -> FileResponse:
+    """
+    Download items as Parquet or as an Arrow IPC stream, all items for
+    superusers.
+    """
+    seller_id = None if current_user.is_superuser else current_user.id
     file_location = f"{settings.UPLOAD_DIR}/{uuid.uuid4()}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
     try:
-        import_csv(file_location, session, current_user.id)
-        return Message(message=f"file '{file.filename}' saved at '{file_location}'")
-    except Exception as e:
-        raise HTTPException(status_code=406, detail="CSV file is in bad format")
+        export_items(session, file_location, fmt, seller_id)
+    except BaseException:
+        if os.path.exists(file_location):
+            os.remove(file_location)
+        raise
+    filename, media_type = _EXPORT_FILES[fmt]
+    return FileResponse(
+        file_location,
+        media_type=media_type,
+        filename=filename,
+        background=BackgroundTask(os.remove, file_location),
+    )
+
+
+@router.get("/uploadcsv/{job_id}", response_model=ImportJobPublic)
+def read_import_job(
+    session: SessionDep, current_user: CurrentUser, job_id: uuid.UUID
+) -> Any:
+    """
+    Get the progress of a CSV import.
+    """
+    job = session.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if not current_user.is_superuser and (job.seller_id != current_user.id):
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return job
+
+
+@router.post(
+    "/uploadcsv/stream",
+    openapi_extra={
+        "requestBody": {
+            "content": {"text/csv": {"schema": {"type": "string"}}},
+            "required": True,
+        }
+    },
+)
+def upload_csv_stream(
+    session: SessionDep, current_user: CurrentUser, body: BodyReaderDep
+) -> Message:
+    """
+    Imports items from a CSV request body while it is received, committing
+    every `CSV_IMPORT_CHUNK_ROWS` rows. Nothing is written to disk. When a
+    chunk is malformed the items of the previous chunks are kept.
+    """
+    imported = 0
+    try:
+        for _, count in import_csv_stream(
+            body, session, current_user.id, settings.CSV_IMPORT_CHUNK_ROWS
+        ):
+            imported += count
+    except Exception:
+        session.rollback()
+        raise HTTPException(
+            status_code=406,
+            detail=f"CSV file is in bad format, {imported} items were imported",
+        )
     finally:
-        os.remove(file_location)
+        if imported:
+            bus.publish(ITEMS_CHANGED, [])
+    return Message(message=f"{imported} items imported")
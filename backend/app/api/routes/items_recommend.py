@@ -3,44 +3,103 @@ import uuid
 
 from fastapi import APIRouter
 
-from app.api.deps import SessionDep
-from app.models import ItemsPublic, ItemQuery
+from app.api.deps import CursorDep, SessionDep
+from app.models import (
+    ItemsBatchPublic,
+    ItemsPublic,
+    ItemQuery,
+    SimilarItemsBatchQuery,
+)
 from app.recommend import (
     find_similar_items,
+    find_similar_items_batch,
     find_most_popular_items,
     find_similar_query,
+    find_trending_items,
 )
+from app.recommend.trending import TrendingWindow
 
 router = APIRouter(prefix="/items/recommend", tags=["items/recommend"])
 
 
 @router.get("/{item_id}/similar", response_model=ItemsPublic)
 def similar_items(
-    session: SessionDep, item_id: uuid.UUID, limit: int = 10, offset: int = 0
+    session: SessionDep,
+    item_id: uuid.UUID,
+    cursor: CursorDep,
+    limit: int = 10,
+    offset: int = 0,
 ) -> Any:
     """
-    Retrieve top `limit` similar items to `item_id`
+    Retrieve top `limit` similar items to `item_id`.
+    Pass `next_cursor` of a page as `cursor` to fetch the next one.
     """
-    items = find_similar_items(session, item_id=item_id, limit=limit, offset=offset)
-    return ItemsPublic(data=items, count=len(items))
+    page = find_similar_items(
+        session, item_id=item_id, limit=limit, offset=offset, cursor=cursor
+    )
+    return ItemsPublic(
+        data=page.items, count=len(page.items), next_cursor=page.next_token
+    )
+
+
+@router.post("/similar/batch", response_model=ItemsBatchPublic)
+def similar_items_batch(
+    session: SessionDep, query: SimilarItemsBatchQuery, limit: int = 10, offset: int = 0
+) -> Any:
+    """
+    Retrieve top `limit` similar items to each of `item_ids` in one request.
+    """
+    results = find_similar_items_batch(
+        session, query.item_ids, limit=limit, offset=offset
+    )
+    return ItemsBatchPublic(
+        data={
+            item_id: ItemsPublic(data=items, count=len(items))
+            for item_id, items in results.items()
+        }
+    )
 
 
 @router.get("/most_popular", response_model=ItemsPublic)
-def most_popular_items(session: SessionDep, limit: int = 10, offset: int = 0) -> Any:
+def most_popular_items(
+    session: SessionDep,
+    cursor: CursorDep,
+    limit: int = 10,
+    offset: int = 0,
+    window: TrendingWindow | None = None,
+) -> Any:
     """
     Retrieve `limit` most popular items.
+    With `window` (1h, 24h or 7d) only events within that window count.
     """
-    items = find_most_popular_items(session, limit=limit, offset=offset)
-    return ItemsPublic(data=items, count=len(items))
+    if window is not None:
+        page = find_trending_items(
+            session, window=window, limit=limit, offset=offset, cursor=cursor
+        )
+    else:
+        page = find_most_popular_items(
+            session, limit=limit, offset=offset, cursor=cursor
+        )
+    return ItemsPublic(
+        data=page.items, count=len(page.items), next_cursor=page.next_token
+    )
 
 
 @router.post("/similar_query", response_model=ItemsPublic)
 def similar_query(
-    session: SessionDep, query: ItemQuery, limit: int = 10, offset: int = 0
+    session: SessionDep,
+    query: ItemQuery,
+    cursor: CursorDep,
+    limit: int = 10,
+    offset: int = 0,
 ) -> Any:
     """
     Retrieve `count` most similar items to query `query` .
     """
 
-    items = find_similar_query(session, query=query, limit=limit, offset=offset)
-    return ItemsPublic(data=items, count=len(items))
+    page = find_similar_query(
+        session, query=query, limit=limit, offset=offset, cursor=cursor
+    )
+    return ItemsPublic(
+        data=page.items, count=len(page.items), next_cursor=page.next_token
+    )
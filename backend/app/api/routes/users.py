@@ -7,13 +7,16 @@ from sqlmodel import col, delete, func, select
 from app import crud
 from app.api.deps import (
     CurrentUser,
+    CursorDep,
     SessionDep,
     get_current_active_superuser,
 )
 from app.core.config import settings
+from app.core.pagination import Page
 from app.core.security import get_password_hash, verify_password
 from app.models import (
     Item,
+    ItemsBatchPublic,
     ItemsPublic,
     Message,
     UpdatePassword,
@@ -21,6 +24,7 @@ from app.models import (
     UserCreate,
     UserPublic,
     UserItemRecommendQuery,
+    UserRecommendationsBatchQuery,
     UserRegister,
     UsersPublic,
     UserUpdate,
@@ -28,7 +32,7 @@ from app.models import (
 )
 from app.recommend.recommender import find_similar_items, find_similar_query
 from app.utils import generate_new_account_email, send_email
-from app.recommend import find_most_popular_items
+from app.recommend import find_recommended_items, find_recommended_items_batch
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -232,11 +236,33 @@ def delete_user(
     return Message(message="User deleted successfully")
 
 
+@router.post("/recommendations/batch", response_model=ItemsBatchPublic)
+def user_recommendations_batch(
+    session: SessionDep,
+    query: UserRecommendationsBatchQuery,
+    limit: int = 10,
+    offset: int = 0,
+) -> Any:
+    """
+    Retrieve personalized recommendations for each of `user_ids` in one request.
+    """
+    results = find_recommended_items_batch(
+        session, query.user_ids, limit=limit, offset=offset
+    )
+    return ItemsBatchPublic(
+        data={
+            user_id: ItemsPublic(data=items, count=len(items))
+            for user_id, items in results.items()
+        }
+    )
+
+
 @router.post("/{user_id}/recommendations", response_model=ItemsPublic)
 def user_recommendations(
     session: SessionDep,
     user_id: uuid.UUID,
     query: UserItemRecommendQuery | None,
+    cursor: CursorDep,
     limit: int = 10,
     offset: int = 0,
 ) -> Any:
@@ -244,21 +270,31 @@ def user_recommendations(
     Retrieve personalized recommendations for given user.
     """
 
-    items = []
+    page = Page[Item]()
 
     if query is None or (query.item_id is None) and (query.query is None):
-        items = find_most_popular_items(
-            session, limit=limit, offset=offset, user_id=user_id
+        page = find_recommended_items(
+            session, user_id=user_id, limit=limit, offset=offset, cursor=cursor
         )
     else:
         if query.item_id is not None:
-            items = find_similar_items(
-                session, query.item_id, limit=limit, offset=offset, user_id=user_id
+            page = find_similar_items(
+                session,
+                query.item_id,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
             )
 
         if query.query is not None:
-            items = find_similar_query(
-                session, query.query, limit=limit, offset=offset, user_id=user_id
+            page = find_similar_query(
+                session,
+                query.query,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
             )
 
-    return ItemsPublic(data=items, count=len(items))
+    return ItemsPublic(
+        data=page.items, count=len(page.items), next_cursor=page.next_token
+    )
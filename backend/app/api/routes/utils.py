@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.models import CacheStats, Message
+from app.recommend.cache import similar_query_cache
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -26,6 +27,18 @@ def test_email(email_to: EmailStr) -> Message:
     return Message(message="Test email sent")
 
 
+@router.get(
+    "/similar-query-cache/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=CacheStats,
+)
+def similar_query_cache_stats() -> CacheStats:
+    """
+    Statistics of the similar_query result cache, for sizing it.
+    """
+    return CacheStats(**similar_query_cache.stats())
+
+
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
@@ -0,0 +1,58 @@
+"""
+In-process publish/subscribe bus for committed writes.
+
+Writers publish once their transaction is committed, subscribers update their
+in-memory state right away instead of waiting for the next rebuild from the
+database. Handlers run synchronously in the publishing thread, so they must be
+cheap; an exception in one handler is logged and does not reach the writer or
+the other handlers. Other worker processes do not see the messages, they catch
+up through their own periodic rebuilds.
+
+Topics:
+- `EVENTS_CREATED`: the stored `Event`s
+- `ITEMS_CHANGED`: ids of the created, updated or deleted items, empty when
+  not known, e.g. after a bulk import
+"""
+
+import logging
+import threading
+from collections.abc import Callable
+from typing import Any, Literal
+
+logger = logging.getLogger(__name__)
+
+Topic = Literal["events.created", "items.changed"]
+EVENTS_CREATED: Topic = "events.created"
+ITEMS_CHANGED: Topic = "items.changed"
+
+Handler = Callable[[Any], None]
+
+
+class EventBus:
+    def __init__(self) -> None:
+        self._handlers: dict[str, list[Handler]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: Topic, handler: Handler) -> None:
+        """
+        Call `handler` with the payload of every message published on `topic`.
+        """
+        with self._lock:
+            # copy on write, publishers iterate without the lock
+            self._handlers[topic] = [*self._handlers.get(topic, []), handler]
+
+    def unsubscribe(self, topic: Topic, handler: Handler) -> None:
+        with self._lock:
+            self._handlers[topic] = [
+                h for h in self._handlers.get(topic, []) if h != handler
+            ]
+
+    def publish(self, topic: Topic, payload: Any) -> None:
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception(f"Handler {handler!r} of '{topic}' failed")
+
+
+bus = EventBus()
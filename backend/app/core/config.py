@@ -1,3 +1,4 @@
+import os
 import secrets
 import warnings
 from typing import Annotated, Any, Literal
@@ -37,6 +38,123 @@ class Settings(BaseSettings):
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
     UPLOAD_DIR: str = "./tmp"
+    # Rows parsed and committed at a time by CSV, Parquet and Arrow imports
+    CSV_IMPORT_CHUNK_ROWS: int = 50_000
+    # Threads running background CSV imports, see app/ingest/imports.py
+    IMPORT_WORKERS: int = 2
+    # Processes parsing background imports in CSV_IMPORT_CHUNK_BYTES pieces,
+    # shared by the import threads. 0 parses in the import thread, -1 uses one
+    # per CPU available to the process
+    CSV_IMPORT_PROCESSES: int = 0
+    CSV_IMPORT_CHUNK_BYTES: int = 16 * 1024 * 1024
+
+    # In-process similarity engine, see app/recommend/features.py
+    SIMILARITY_ENGINE_ENABLED: bool = True
+    SIMILARITY_ENGINE_TTL_SECONDS: int = 300
+    # Item writes rebuild the matrix at most this often
+    SIMILARITY_ENGINE_REBUILD_SECONDS: float = 10.0
+    # Neighbours per item precomputed into the item_similarity table
+    SIMILARITY_TOP_K: int = 50
+    # Directory with model files written by the cron job
+    MODEL_DIR: str = "./models"
+    # Catalogs smaller than this are searched exactly
+    ANN_MIN_ITEMS: int = 20000
+    # Number of IVF lists, 0 means 4 * sqrt(number of items)
+    ANN_N_LISTS: int = 0
+    # Lists scanned per query, higher means better recall and slower search
+    ANN_N_PROBE: int = 8
+
+    # Older interactions count less in the collaborative models
+    INTERACTION_HALF_LIFE_DAYS: float = 30.0
+    # Co-visited neighbours kept per item
+    COVISIT_TOP_N: int = 100
+    # Share of the co-visitation signal in blended item similarity, 0 disables it
+    COVISIT_WEIGHT: float = 0.3
+    # Recent items per user co-visited with new events until the next model
+    # load, 0 disables it
+    COVISIT_RECENT_HISTORY: int = 20
+    # Users whose recent items are kept, least recently active ones are dropped
+    COVISIT_RECENT_MAX_USERS: int = 100_000
+    # Items whose recent co-visits are kept, least recently touched ones are
+    # dropped. Each keeps at most 2 * COVISIT_TOP_N co-visited items
+    COVISIT_RECENT_MAX_ITEMS: int = 100_000
+
+    # Implicit-feedback ALS for personalized recommendations
+    ALS_FACTORS: int = 32
+    ALS_ITERATIONS: int = 10
+    ALS_REGULARIZATION: float = 0.1
+    ALS_ALPHA: float = 40.0
+
+    # Popularity rollup, see app/recommend/popularity.py. Changing the half-life
+    # requires rebuilding the rollup
+    POPULARITY_HALF_LIFE_DAYS: float = 7.0
+    # Each process refreshes the rollup in the background this often, 0 leaves
+    # it to the cron job
+    POPULARITY_REFRESH_SECONDS: int = 60
+    # Rollups skip the most recent events, which may belong to open transactions
+    ROLLUP_LAG_SECONDS: int = 10
+    # Trending counters re-read events written by other workers this often
+    TRENDING_SYNC_SECONDS: int = 300
+    # Cached similar_query results, 0 disables the cache. Writes through other
+    # workers become visible after at most the TTL
+    SIMILAR_QUERY_CACHE_SIZE: int = 1024
+    SIMILAR_QUERY_CACHE_TTL_SECONDS: int = 60
+
+    # Largest number of records accepted by POST /events/batch
+    EVENTS_BATCH_MAX_SIZE: int = 10000
+    # Write-behind mode of POST /events/, see app/ingest/buffer.py. When the
+    # queue is full events wait up to EVENT_BUFFER_BLOCK_SECONDS ("block"), are
+    # dropped ("shed") or the request fails with 503 ("reject")
+    EVENT_BUFFER_ENABLED: bool = False
+    EVENT_BUFFER_SIZE: int = 10000
+    EVENT_BUFFER_FLUSH_SIZE: int = 500
+    EVENT_BUFFER_FLUSH_SECONDS: float = 1.0
+    EVENT_BUFFER_BACKPRESSURE: Literal["block", "shed", "reject"] = "reject"
+    EVENT_BUFFER_BLOCK_SECONDS: float = 1.0
+    # On-disk journal for POST /events/, see app/ingest/journal.py. Appends wait
+    # for an fsync shared by the appends of EVENT_JOURNAL_FSYNC_MS
+    EVENT_JOURNAL_ENABLED: bool = False
+    EVENT_JOURNAL_DIR: str = "./journal"
+    EVENT_JOURNAL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    EVENT_JOURNAL_FSYNC_MS: int = 5
+    EVENT_JOURNAL_REPLAY_SECONDS: float = 1.0
+    # Events repeating the idempotency key of one stored within this window are
+    # not stored again, 0 disables the check. See app/ingest/dedup.py
+    EVENT_DEDUP_WINDOW_SECONDS: int = 86400
+    # Keys per window the Bloom filter is sized for, and its false positive rate
+    EVENT_DEDUP_CAPACITY: int = 1_000_000
+    EVENT_DEDUP_ERROR_RATE: float = 0.001
+    # Monthly event partitions, see app/ingest/partitions.py. The cron job keeps
+    # this many months ahead partitioned
+    EVENT_PARTITIONS_AHEAD_MONTHS: int = 3
+    # Months of events kept, 0 keeps everything. Expired partitions are dropped
+    # or only detached for archiving
+    EVENT_RETENTION_MONTHS: int = 0
+    EVENT_RETENTION_ACTION: Literal["drop", "detach"] = "drop"
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def csv_import_processes(self) -> int:
+        if self.CSV_IMPORT_PROCESSES < 0:
+            # a single CPU gains nothing from a pool
+            cpus = len(os.sched_getaffinity(0))
+            return cpus if cpus > 1 else 0
+        return self.CSV_IMPORT_PROCESSES
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def ann_index_path(self) -> str:
+        return f"{self.MODEL_DIR}/item_ivf.npz"
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def covisit_path(self) -> str:
+        return f"{self.MODEL_DIR}/covisit.npz"
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def als_dir(self) -> str:
+        return f"{self.MODEL_DIR}/als"
 
     BACKEND_CORS_ORIGINS: Annotated[
         list[AnyUrl] | str, BeforeValidator(parse_cors)
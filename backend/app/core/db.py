@@ -2,6 +2,7 @@ from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
+from app.crud.events import sync_event_types
 from app.models import User, UserCreate, Item, Event
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
@@ -21,6 +22,8 @@ def init_db(session: Session) -> None:
     # This works because the models are already imported and registered from app.models
     # SQLModel.metadata.create_all(engine)
 
+    sync_event_types(session=session)
+
     user = session.exec(
         select(User).where(User.email == settings.FIRST_SUPERUSER)
     ).first()
@@ -0,0 +1,124 @@
+"""
+Keyset (cursor) pagination.
+
+A ranked listing is ordered by `(key, id)` ascending, where `key` is the
+ranking score turned into an ascending sort key (e.g. a negated popularity).
+A cursor is the `(key, id)` of the last row of a page; the next page is the
+rows strictly after it, so every page costs the same regardless of depth.
+Listings chaining several rankings also record in the cursor the `source`
+ranking of that row, keys of different sources are not comparable.
+"""
+
+import base64
+import binascii
+import struct
+import uuid
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+import numpy as np
+import numpy.typing as npt
+
+T = TypeVar("T")
+
+_FORMAT = ">d16sB"
+
+
+@dataclass(frozen=True)
+class Cursor:
+    key: float
+    id: uuid.UUID
+    source: int = 0
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """
+    Opaque URL-safe token of `cursor`.
+    """
+    raw = struct.pack(_FORMAT, cursor.key, cursor.id.bytes, cursor.source)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> Cursor:
+    """
+    Inverse of `encode_cursor`, raises ValueError for malformed tokens.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key, id_bytes, source = struct.unpack(_FORMAT, raw)
+    except (binascii.Error, struct.error, UnicodeEncodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if np.isnan(key):
+        raise ValueError("Invalid cursor")
+    return Cursor(key, uuid.UUID(bytes=id_bytes), source)
+
+
+@dataclass
+class Page(Generic[T]):
+    """
+    One page of a listing and the cursor of the page after it, None when
+    this page is the last one.
+    """
+
+    items: list[T] = field(default_factory=list)
+    next_cursor: Cursor | None = None
+
+    @property
+    def next_token(self) -> str | None:
+        return None if self.next_cursor is None else encode_cursor(self.next_cursor)
+
+
+def next_cursor(
+    ids: Sequence[uuid.UUID],
+    keys: Sequence[float] | npt.NDArray[np.number[Any]],
+    limit: int,
+    source: int = 0,
+) -> Cursor | None:
+    """
+    Cursor after the last of the ranked `ids` of a page, None when the page
+    is not full and therefore the last one.
+    """
+    if limit <= 0 or len(ids) < limit:
+        return None
+    return Cursor(float(keys[len(ids) - 1]), ids[len(ids) - 1], source)
+
+
+def after_cursor(
+    keys: npt.NDArray[np.number[Any]],
+    id_of: Callable[[int], uuid.UUID],
+    cursor: Cursor | None,
+) -> npt.NDArray[np.bool_]:
+    """
+    Mask of the rows ordered strictly after `cursor` by `(key, id)`, where
+    `id_of(i)` is the id of row `i`.
+    """
+    keys = np.asarray(keys, dtype=np.float64)
+    if cursor is None:
+        return np.ones(len(keys), dtype=bool)
+    mask = keys > cursor.key
+    for i in np.flatnonzero(keys == cursor.key):
+        mask[i] = id_of(int(i)) > cursor.id
+    return mask
+
+
+def keyset_top_k(
+    keys: npt.NDArray[np.number[Any]],
+    id_of: Callable[[int], uuid.UUID],
+    k: int,
+    cursor: Cursor | None = None,
+) -> npt.NDArray[np.int64]:
+    """
+    Indices of the `k` rows with the smallest `(key, id)` after `cursor`, in
+    order. Rows tied with the k-th key are all considered, so ties are broken
+    by id consistently from page to page.
+    """
+    keys = np.asarray(keys, dtype=np.float64)
+    candidates = np.flatnonzero(after_cursor(keys, id_of, cursor))
+    if k <= 0 or len(candidates) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(candidates) > k:
+        kth = np.partition(keys[candidates], k - 1)[k - 1]
+        candidates = candidates[keys[candidates] <= kth]
+    order = sorted(map(int, candidates), key=lambda i: (keys[i], id_of(i)))
+    return np.array(order[:k], dtype=np.int64)
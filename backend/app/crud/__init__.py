@@ -4,7 +4,9 @@ import datetime
 
 from sqlmodel import Session, select
 
+from app.core.bus import ITEMS_CHANGED, bus
 from app.core.security import get_password_hash, verify_password
+from app.crud.csv import hash_items
 from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
 
 
@@ -58,6 +60,9 @@ def create_item(*, session: Session, item_in: ItemCreate, seller_id: uuid.UUID)
         },
     )
     session.add(db_item)
+    session.flush()
+    hash_items(session, [db_item.id])
     session.commit()
     session.refresh(db_item)
+    bus.publish(ITEMS_CHANGED, [db_item.id])
     return db_item
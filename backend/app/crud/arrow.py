@@ -0,0 +1,156 @@
+import io
+import itertools
+import uuid
+from collections.abc import Iterator
+from typing import IO, Any, Literal
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy import DateTime, Float, Integer, inspect
+from sqlmodel import Session
+
+from app.crud.csv import ITEM_COLUMNS, copy_items, preprocess_df
+from app.models import Item
+
+ArrowFormat = Literal["parquet", "arrow"]
+
+# Exported columns, those of `ItemPublic`
+EXPORT_COLUMNS = ["id", "seller_id", *ITEM_COLUMNS, "created_at", "updated_at"]
+_EXPORT_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def _arrow_type(name: str) -> pa.DataType:
+    column_type = inspect(Item).columns[name].type
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    # text and UUIDs
+    return pa.string()
+
+
+EXPORT_SCHEMA = pa.schema([(name, _arrow_type(name)) for name in EXPORT_COLUMNS])
+
+
+def read_batches(stream: IO[bytes], fmt: ArrowFormat) -> Iterator[pa.RecordBatch]:
+    """
+    Record batches of a Parquet file, or of an Arrow IPC file or stream.
+    Files are read from their footer, so `stream` must be seekable.
+    """
+    if fmt == "parquet":
+        yield from pq.ParquetFile(stream).iter_batches()
+        return
+    is_file = stream.read(6) == b"ARROW1"
+    stream.seek(0)
+    if is_file:
+        reader = ipc.open_file(stream)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    else:
+        yield from ipc.open_stream(stream)
+
+
+def import_arrow(
+    stream: IO[bytes],
+    session: Session,
+    seller_id: uuid.UUID,
+    fmt: ArrowFormat,
+    chunk_rows: int,
+    seen: set[str] | None = None,
+) -> Iterator[tuple[int, int]]:
+    """
+    Import a Parquet or Arrow IPC file at most `chunk_rows` rows at a time,
+    committing every chunk like `import_csv_stream`. Record batches are
+    converted to dataframes column by column and go through `preprocess_df`,
+    so files with the columns of the CSV feed or of `export_items` are both
+    accepted. Listing hashes are added to `seen` as in `copy_items`.
+    Yields the number of read rows and of items committed per chunk.
+    """
+    for batch in read_batches(stream, fmt):
+        for start in range(0, batch.num_rows, chunk_rows):
+            df = batch.slice(start, chunk_rows).to_pandas()
+            imported = copy_items(session, preprocess_df(df), seller_id, seen)
+            session.commit()
+            yield len(df), imported
+
+
+class _CopyReader(io.RawIOBase):
+    """
+    Readable file over the data blocks of a `COPY ... TO STDOUT`.
+    """
+
+    def __init__(self, blocks: Iterator[bytes | memoryview]) -> None:
+        self._blocks = blocks
+        self._block = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._block:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._block = memoryview(block).cast("B")
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+
+
+def export_items(
+    session: Session,
+    sink: str | IO[bytes],
+    fmt: ArrowFormat,
+    seller_id: uuid.UUID | None,
+) -> int:
+    """
+    Write the items of `seller_id`, all items when None, to `sink` as Parquet
+    or as an Arrow IPC stream, with the `EXPORT_SCHEMA` columns.
+    Postgres has no columnar output, so the rows are copied out as CSV and
+    parsed into record batches by Arrow as they arrive, no Python object is
+    built per item.
+    Returns the number of exported items.
+    """
+    columns = ", ".join(EXPORT_COLUMNS)
+    where, params = (
+        ("", None) if seller_id is None else (" WHERE seller_id = %s", (seller_id,))
+    )
+    statement = f"COPY (SELECT {columns} FROM item{where}) TO STDOUT (FORMAT csv)"
+    writer: Any = (
+        pq.ParquetWriter(sink, EXPORT_SCHEMA)
+        if fmt == "parquet"
+        else ipc.new_stream(sink, EXPORT_SCHEMA)
+    )
+    exported = 0
+    with (
+        writer,
+        session.connection().connection.cursor() as cursor,  # type: ignore[attr-defined]
+        cursor.copy(statement, params) as copy,
+    ):
+        blocks = iter(copy)
+        first = next(blocks, None)
+        if first is None:
+            return 0
+        reader = pa_csv.open_csv(
+            io.BufferedReader(
+                _CopyReader(itertools.chain([first], blocks)), _EXPORT_BLOCK_BYTES
+            ),
+            read_options=pa_csv.ReadOptions(
+                column_names=EXPORT_COLUMNS, block_size=_EXPORT_BLOCK_BYTES
+            ),
+            # COPY writes NULL unquoted and empty strings quoted
+            convert_options=pa_csv.ConvertOptions(
+                column_types=EXPORT_SCHEMA,
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        for batch in reader:
+            writer.write_batch(batch)
+            exported += batch.num_rows
+    return exported
@@ -1,43 +1,351 @@
+import binascii
+import io
+import os
 import uuid
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, Future
+from typing import IO
 
-from sqlmodel import Session
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
-from app.models import Item
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from sqlalchemy import Float, Integer, inspect, text
+from sqlmodel import Session
+
+from app.models import Item, ItemBase
+
+# Item columns filled from the CSV, the others keep their server defaults
+ITEM_COLUMNS = list(ItemBase.model_fields)
+_INTEGER_COLUMNS = [
+    name
+    for name in ITEM_COLUMNS
+    if isinstance(inspect(Item).columns[name].type, Integer)
+]
+_FLOAT_COLUMNS = [
+    name for name in ITEM_COLUMNS if isinstance(inspect(Item).columns[name].type, Float)
+]
+_COPY_COLUMNS = ["id", "seller_id", *ITEM_COLUMNS]
+
+
+def _hash(columns: list[str]) -> str:
+    # computed by Postgres from the typed columns, so equal listings hash the
+    # same whichever file, format or chunk they come from
+    return (
+        "md5(concat_ws(chr(31), "
+        + ", ".join(f"coalesce({name}::text, '')" for name in columns)
+        + "))"
+    )
+
+
+_CONTENT_HASH = _hash(ITEM_COLUMNS)
+# A listing is identified by the seller's `listing_id` when it has one, so it
+# is updated in place when it changes, otherwise by its whole content, so
+# distinct units of a seller are never merged
+_LISTING_HASH = (
+    f"CASE WHEN listing_id IS NULL THEN {_CONTENT_HASH} "
+    "ELSE md5(chr(30) || listing_id) END"
+)
+_COPY_CHUNK_ROWS = 100_000
+# CSV columns always parsed as text, so that `preprocess_df` can clean them
+# and the content hash of a row does not depend on the rest of its chunk
+_TEXT_COLUMNS = dict.fromkeys(
+    [
+        "name",
+        "fuel",
+        "seller_type",
+        "transmission",
+        "owner",
+        "mileage",
+        "engine",
+        "max_power",
+        "torque",
+        "listing_id",
+    ],
+    str,
+)
+
+
+def _to_float(column: pd.Series) -> pd.Series:
+    # "23.4 kmpl" in CSV feeds, already a number in Parquet and Arrow files
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(float)
+    return (
+        column.str.replace(r"[^0-9.]+", "", regex=True)
+        .replace(r"^$", "0", regex=True)
+        .astype(float)
+    )
 
 
 def preprocess_df(df: pd.DataFrame) -> pd.DataFrame:
     """
     Prepare dataframe created from CSV file to import to db.
+    Frames with the `Item` column names, as exported, are accepted too.
     """
-    df["fuel_type"] = df["fuel"]
-    df["owner_type"] = df["owner"]
-    df.drop(columns=["seller_type", "fuel", "owner"], inplace=True)
+    if "fuel_type" not in df:
+        df["fuel_type"] = df["fuel"]
+    if "owner_type" not in df:
+        df["owner_type"] = df["owner"]
+    df = df.drop(columns=["seller_type", "fuel", "owner"], errors="ignore")
     df = df.drop_duplicates()
-    df.loc[:, "mileage"] = (
-        df["mileage"]
-        .str.replace(r"[^0-9.]+", "", regex=True)
-        .replace(r"^$", "0", regex=True)
-        .astype(float)
-    )
-    df.loc[:, "max_power"] = (
-        df["max_power"]
-        .str.replace(r"[^0-9.]+", "", regex=True)
-        .replace(r"^$", "0", regex=True)
-        .astype(float)
-    )
+    df.loc[:, "mileage"] = _to_float(df["mileage"])
+    df.loc[:, "max_power"] = _to_float(df["max_power"])
     df.loc[df["seats"].isna(), "seats"] = 4
 
     return df
 
 
-def import_csv(csv_path: str, session: Session, current_user_id: uuid.UUID):
+def uuid4_hex(n: int) -> npt.NDArray[np.str_]:
+    """
+    `n` random version 4 UUIDs as 32-digit hex strings, generated at once.
+    """
+    raw = np.frombuffer(os.urandom(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = raw[:, 6] & 0x0F | 0x40
+    raw[:, 8] = raw[:, 8] & 0x3F | 0x80
+    return np.frombuffer(binascii.hexlify(raw.tobytes()), dtype="S32").astype(str)
+
+
+def _items_frame(df: pd.DataFrame, seller_id: uuid.UUID) -> pd.DataFrame:
+    frame = df.reindex(columns=ITEM_COLUMNS)
+    for name in _INTEGER_COLUMNS:
+        frame[name] = pd.to_numeric(frame[name]).round().astype("Int64")
+    for name in _FLOAT_COLUMNS:
+        frame[name] = pd.to_numeric(frame[name]).astype(float)
+    frame.insert(0, "seller_id", str(seller_id))
+    frame.insert(0, "id", pd.Series(uuid4_hex(len(frame)), index=frame.index))
+    return frame
+
+
+def _csv_blocks(frame: pd.DataFrame) -> Iterator[bytes]:
     """
-    Import CSV file into db.
+    CSV rows of `frame` for COPY, `_COPY_CHUNK_ROWS` rows per block, written
+    by Arrow a column at a time. Empty strings are quoted and missing values
+    are not, as COPY expects.
+    """
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for batch in table.to_batches(max_chunksize=_COPY_CHUNK_ROWS):
+        block = io.BytesIO()
+        pa_csv.write_csv(batch, block, pa_csv.WriteOptions(include_header=False))
+        yield block.getvalue()
+
+
+def _copy(
+    session: Session, blocks: Iterable[bytes], seen: set[str] | None = None
+) -> int:
+    """
+    COPY CSV `blocks` into a staging table, then upsert the rows into `item`
+    keyed on their seller and listing hash. Listings the seller already has
+    are only updated when their content hash changed, the last row of a
+    `listing_id` in the blocks wins. The listing hashes of the rows are added
+    to `seen` when given. Returns the number of inserted or updated items.
+    """
+    columns = ", ".join(_COPY_COLUMNS)
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE item_staging "
+            "(LIKE item INCLUDING DEFAULTS, position bigserial) ON COMMIT DROP"
+        )
+    )
+    statement = f"COPY item_staging ({columns}) FROM STDIN (FORMAT csv)"
+    with (
+        session.connection().connection.cursor() as cursor,  # type: ignore[attr-defined]
+        cursor.copy(statement) as copy,
+    ):
+        for block in blocks:
+            copy.write(block)
+    if seen is not None:
+        seen.update(
+            session.execute(text(f"SELECT {_LISTING_HASH} FROM item_staging")).scalars()
+        )
+    updates = ", ".join(f"{name} = excluded.{name}" for name in ITEM_COLUMNS)
+    written = session.execute(
+        text(
+            f"INSERT INTO item ({columns}, listing_hash, content_hash) "
+            f"SELECT DISTINCT ON (listing_hash) {columns}, listing_hash, content_hash "
+            f"FROM (SELECT {columns}, position, "
+            f"{_LISTING_HASH} AS listing_hash, {_CONTENT_HASH} AS content_hash "
+            "FROM item_staging) AS staging "
+            "ORDER BY listing_hash, position DESC "
+            "ON CONFLICT (seller_id, listing_hash) DO UPDATE "
+            f"SET {updates}, content_hash = excluded.content_hash, updated_at = now() "
+            "WHERE item.content_hash IS DISTINCT FROM excluded.content_hash"
+        )
+    ).rowcount  # type: ignore[attr-defined]
+    session.execute(text("DROP TABLE item_staging"))
+    return int(written)
+
+
+def copy_items(
+    session: Session,
+    df: pd.DataFrame,
+    seller_id: uuid.UUID,
+    seen: set[str] | None = None,
+) -> int:
     """
-    df = pd.read_csv(csv_path)
-    df = preprocess_df(df)
-    records = [
-        Item(seller_id=current_user_id, **row.to_dict()) for _, row in df.iterrows()
-    ]
-    session.add_all(records)
-    session.commit()
+    Upsert the rows of a preprocessed dataframe as items of `seller_id` with
+    COPY. Columns are converted as a whole and streamed as CSV in chunks, no
+    `Item` object is built. Rows with the `listing_id` of a listing the seller
+    already has update it when their content changed, rows without one are
+    skipped when the seller has an item with the same content, so importing
+    a feed again only writes its new or changed listings. The listing hashes of
+    the rows are added to `seen` when given. Committing is left to the caller.
+    Returns the number of inserted or updated items.
+    """
+    return _copy(session, _csv_blocks(_items_frame(df, seller_id)), seen)
+
+
+def hash_items(session: Session, ids: Iterable[uuid.UUID]) -> None:
+    """
+    Compute the listing and content hashes of the items `ids` written through
+    the API, so that importing the same listings matches them instead of
+    adding copies. An item repeating a listing of its seller is left without
+    a listing hash, like the copies of one made by hand. Committing is left
+    to the caller.
+    """
+    session.execute(
+        text(
+            "UPDATE item SET content_hash = h.content_hash, "
+            "listing_hash = CASE WHEN NOT EXISTS (SELECT FROM item AS other "
+            "WHERE other.seller_id = h.seller_id AND other.id <> h.id "
+            "AND other.listing_hash = h.listing_hash) THEN h.listing_hash END "
+            f"FROM (SELECT id, seller_id, {_LISTING_HASH} AS listing_hash, "
+            f"{_CONTENT_HASH} AS content_hash FROM item WHERE id = ANY(:ids)) AS h "
+            "WHERE item.id = h.id"
+        ),
+        {"ids": list(ids)},
+    )
+
+
+def prune_items(session: Session, seller_id: uuid.UUID, seen: Iterable[str]) -> int:
+    """
+    Delete the listings of `seller_id` whose listing hash is not in `seen`,
+    the listing hashes of the seller's full feed. Items referenced by events,
+    and items without a listing hash, are kept. Committing is left to the
+    caller. Returns the number of deleted items.
+    """
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE feed_hash "
+            "(listing_hash varchar(32) PRIMARY KEY) ON COMMIT DROP"
+        )
+    )
+    with (
+        session.connection().connection.cursor() as cursor,  # type: ignore[attr-defined]
+        cursor.copy("COPY feed_hash (listing_hash) FROM STDIN") as copy,
+    ):
+        for listing_hash in seen:
+            copy.write_row((listing_hash,))
+    deleted = session.execute(
+        text(
+            "DELETE FROM item WHERE seller_id = :seller_id "
+            "AND listing_hash IS NOT NULL "
+            "AND listing_hash NOT IN (SELECT listing_hash FROM feed_hash) "
+            "AND NOT EXISTS (SELECT FROM event WHERE event.item_id = item.id)"
+        ),
+        {"seller_id": seller_id},
+    ).rowcount  # type: ignore[attr-defined]
+    session.execute(text("DROP TABLE feed_hash"))
+    return int(deleted)
+
+
+def import_csv_stream(
+    stream: IO[bytes],
+    session: Session,
+    seller_id: uuid.UUID,
+    chunk_rows: int,
+    seen: set[str] | None = None,
+) -> Iterator[tuple[int, int]]:
+    """
+    Import a CSV stream `chunk_rows` rows at a time, committing every chunk,
+    so memory use does not grow with the length of the stream. Duplicates
+    are only dropped within a chunk. Listing hashes are added to `seen` as in
+    `copy_items`.
+    Yields the number of parsed rows and of items committed per chunk.
+    """
+    with pd.read_csv(stream, chunksize=chunk_rows, dtype=_TEXT_COLUMNS) as reader:
+        for chunk in reader:
+            imported = copy_items(session, preprocess_df(chunk), seller_id, seen)
+            session.commit()
+            yield len(chunk), imported
+
+
+def _last_row_end(data: bytes) -> int:
+    """
+    Position of the last newline of `data` outside of a quoted field, -1 if
+    there is none. `data` must start at the beginning of a row.
+    """
+    quotes = data.count(b'"')
+    end = len(data)
+    while (position := data.rfind(b"\n", 0, end)) >= 0:
+        quotes -= data.count(b'"', position, end)
+        if quotes % 2 == 0:
+            return position
+        end = position
+    return -1
+
+
+def split_csv(stream: IO[bytes], chunk_bytes: int) -> Iterator[bytes]:
+    """
+    Split a CSV stream into pieces of about `chunk_bytes` ending on a row
+    boundary, each starting with the header line so it parses on its own.
+    Newlines inside quoted fields are not row boundaries.
+    """
+    header = stream.readline()
+    rest = b""
+    while block := stream.read(chunk_bytes):
+        data = rest + block
+        end = _last_row_end(data)
+        rest = data[end + 1 :]
+        if end >= 0:
+            yield header + data[: end + 1]
+    if rest.strip():
+        yield header + rest
+
+
+def prepare_csv_chunk(data: bytes, seller_id: uuid.UUID) -> tuple[int, bytes]:
+    """
+    Parse and preprocess a piece of `split_csv` into the CSV rows copied
+    into `item`. Returns the number of parsed rows with the rows.
+    Runs in the worker processes of `import_csv_parallel`.
+    """
+    df = pd.read_csv(io.BytesIO(data), dtype=_TEXT_COLUMNS)
+    frame = _items_frame(preprocess_df(df), seller_id)
+    return len(df), b"".join(_csv_blocks(frame))
+
+
+def import_csv_parallel(
+    stream: IO[bytes],
+    session: Session,
+    seller_id: uuid.UUID,
+    chunk_bytes: int,
+    pool: Executor,
+    in_flight: int,
+    seen: set[str] | None = None,
+) -> Iterator[tuple[int, int]]:
+    """
+    `import_csv_stream` with parsing and preprocessing fanned out to `pool`.
+    The stream is split into `chunk_bytes` pieces, at most `in_flight` of
+    them are queued or parsed at a time, and the results are copied and
+    committed in the order of the stream.
+    Yields the number of parsed rows and of items committed per piece.
+    """
+    pending: deque[Future[tuple[int, bytes]]] = deque()
+
+    def write() -> tuple[int, int]:
+        rows, data = pending.popleft().result()
+        imported = _copy(session, [data], seen)
+        session.commit()
+        return rows, imported
+
+    try:
+        for piece in split_csv(stream, chunk_bytes):
+            pending.append(pool.submit(prepare_csv_chunk, piece, seller_id))
+            if len(pending) >= in_flight:
+                yield write()
+        while pending:
+            yield write()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,208 @@
+import json
+import uuid
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Any
+
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, select
+
+from app.core.bus import EVENTS_CREATED, bus
+from app.core.config import settings
+from app.ingest.dedup import claim_keys, find_duplicates
+from app.models import (
+    EVENT_TYPE_CATALOG,
+    Event,
+    EventBatchStatus,
+    EventCreate,
+    EventType,
+    Item,
+    User,
+)
+from app.recommend.popularity import fold_late_item_popularity
+from app.recommend.user_item_daily import fold_late_user_item_daily
+
+
+def _error_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'record'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+def sync_event_types(*, session: Session) -> None:
+    """
+    Insert or update the rows of the event_type table from
+    `EVENT_TYPE_CATALOG`. Rows of types no longer in the catalog are kept,
+    stored events may still reference them.
+    """
+    statement = insert(EventType).values(
+        [
+            {"code": code, "name": name, "weight": weight}
+            for code, name, weight in EVENT_TYPE_CATALOG
+        ]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[col(EventType.code)],
+        set_={"name": statement.excluded.name, "weight": statement.excluded.weight},
+    )
+    session.exec(statement)  # type: ignore
+    session.commit()
+
+
+def parse_events(body: bytes, ndjson: bool) -> list[EventCreate | str]:
+    """
+    Parse a JSON array or newline-delimited JSON of `EventCreate` records.
+    Invalid records are replaced by their error message, so one bad record
+    does not reject the batch. Raises ValueError when a JSON array is malformed.
+    """
+    records: list[Any]
+    if ndjson:
+        records = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                records.append(ValueError(f"Invalid JSON: {e.msg}"))
+    else:
+        try:
+            records = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e.msg}") from e
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON array of events")
+
+    parsed: list[EventCreate | str] = []
+    for record in records:
+        if isinstance(record, ValueError):
+            parsed.append(str(record))
+            continue
+        try:
+            parsed.append(EventCreate.model_validate(record))
+        except ValidationError as e:
+            parsed.append(_error_message(e))
+    return parsed
+
+
+def _existing(session: Session, column: Any, ids: set[uuid.UUID]) -> set[uuid.UUID]:
+    if not ids:
+        return set()
+    return set(session.exec(select(column).where(col(column).in_(ids))).all())
+
+
+def insert_events(
+    *, session: Session, events: Sequence[Event]
+) -> list[EventBatchStatus]:
+    """
+    Store `events` with one multi-row INSERT and a single commit. Returns the
+    status of each event, `index` being its position: events referencing a
+    missing user or item are rejected instead of failing the whole batch.
+    An event whose idempotency key is held by another stored event, or by an
+    earlier accepted event of the batch, is a duplicate of that event and is
+    not stored, see `claim_keys`. Inserting an event with the id and
+    timestamp of a stored one is a no-op. Events older than
+    `ROLLUP_LAG_SECONDS`, such as those replayed from the journal after an
+    outage, are folded into the rollups their watermarks already passed.
+    The stored events are published on the bus.
+    """
+    users = _existing(session, User.id, {e.user_id for e in events if e.user_id})
+    items = _existing(session, Item.id, {e.item_id for e in events if e.item_id})
+    statuses: list[EventBatchStatus] = []
+    accepted: list[Event] = []
+    for index, event in enumerate(events):
+        if event.user_id is not None and event.user_id not in users:
+            statuses.append(
+                EventBatchStatus(index=index, error="user_id: User not found")
+            )
+        elif event.item_id is not None and event.item_id not in items:
+            statuses.append(
+                EventBatchStatus(index=index, error="item_id: Item not found")
+            )
+        else:
+            statuses.append(EventBatchStatus(index=index, id=event.id))
+            accepted.append(event)
+
+    # the first accepted event of each key claims it for the batch
+    first: dict[str, Event] = {}
+    for event in accepted:
+        if event.idempotency_key is not None:
+            first.setdefault(event.idempotency_key, event)
+    held = claim_keys(session, list(first.values()))
+    owners = {key: event.id for key, event in first.items()}
+    owners.update({key: claim.event_id for key, claim in held.items()})
+    rows: list[dict[str, Any]] = []
+    stored_events: list[Event] = []
+    for index, event in enumerate(events):
+        if statuses[index].error is not None:
+            continue
+        owner = owners.get(event.idempotency_key or "", event.id)
+        if owner != event.id:
+            statuses[index] = EventBatchStatus(index=index, id=owner, duplicate=True)
+            continue
+        rows.append(event.model_dump())
+        stored_events.append(event)
+
+    if rows:
+        # insertmanyvalues turns the parameter list into multi-row VALUES.
+        # Events stored before, e.g. replayed from the journal, are skipped
+        lag = timedelta(seconds=settings.ROLLUP_LAG_SECONDS)
+        statement = (
+            insert(Event)
+            .on_conflict_do_nothing()
+            .returning(
+                col(Event.id), col(Event.timestamp) <= func.clock_timestamp() - lag
+            )
+        )
+        stored = session.execute(statement, rows).all()
+        inserted = {event_id for event_id, _ in stored}
+        late = [event_id for event_id, is_late in stored if is_late]
+        if late:
+            fold_late_item_popularity(session, late)
+            fold_late_user_item_daily(session, late)
+        session.commit()
+        bus.publish(EVENTS_CREATED, [e for e in stored_events if e.id in inserted])
+    else:
+        session.commit()
+    return statuses
+
+
+def create_events(
+    *, session: Session, events_in: Sequence[EventCreate | str]
+) -> list[EventBatchStatus]:
+    """
+    Store a batch of parsed events, see `insert_events`. Entries that are
+    error messages are reported as rejected in the per-record statuses.
+    Events repeating the idempotency key of a stored event or of an earlier
+    accepted event of the batch are reported as duplicates and not stored.
+    """
+    valid = [e for e in events_in if isinstance(e, EventCreate)]
+    seen = find_duplicates(session, [e.idempotency_key for e in valid])
+    now = datetime.now()
+    events: dict[int, Event] = {}
+    duplicates: dict[int, Event] = {}
+    for index, event_in in enumerate(events_in):
+        if not isinstance(event_in, EventCreate):
+            continue
+        key = event_in.idempotency_key
+        if key is not None and key in seen:
+            duplicates[index] = seen[key]
+            continue
+        events[index] = Event.model_validate(event_in, update={"timestamp": now})
+
+    inserted = insert_events(session=session, events=list(events.values()))
+    results = dict(zip(events, inserted, strict=True))
+    statuses = []
+    for index, event_in in enumerate(events_in):
+        if isinstance(event_in, str):
+            statuses.append(EventBatchStatus(index=index, error=event_in))
+        elif index in duplicates:
+            statuses.append(
+                EventBatchStatus(index=index, id=duplicates[index].id, duplicate=True)
+            )
+        else:
+            statuses.append(results[index].model_copy(update={"index": index}))
+    return statuses
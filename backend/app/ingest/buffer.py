@@ -0,0 +1,183 @@
+"""
+Write-behind buffer for single events.
+
+`POST /events/` hands validated events to a bounded in-process queue and
+returns immediately. A background thread drains the queue in batches, when
+`EVENT_BUFFER_FLUSH_SIZE` events are waiting or `EVENT_BUFFER_FLUSH_SECONDS`
+after the first one arrived, and stores them with one multi-row INSERT.
+Events still queued when the process dies are lost.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Literal
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.crud.events import insert_events
+from app.models import Event
+
+logger = logging.getLogger(__name__)
+
+Backpressure = Literal["block", "shed", "reject"]
+
+# queued by `close` to wake the flusher up for the final drain
+_CLOSE = object()
+
+
+class EventBuffer:
+    """
+    Bounded queue of events with a background flusher.
+
+    When the queue is full `put` waits up to `block_seconds` for room
+    (`block`), drops the event (`shed`) or fails right away (`reject`).
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        flush_size: int,
+        flush_seconds: float,
+        backpressure: Backpressure = "reject",
+        block_seconds: float = 1.0,
+    ) -> None:
+        self.flush_size = max(1, flush_size)
+        self.flush_seconds = flush_seconds
+        self.backpressure = backpressure
+        self.block_seconds = block_seconds
+        self.shed = 0
+        self.flushed = 0
+        self.failed = 0
+        self._queue: queue.Queue[Event | object] = queue.Queue(max_size)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="event-buffer", daemon=True
+        )
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def put(self, event: Event) -> bool:
+        """
+        Queue `event` for writing. Returns False when it was shed.
+        Raises `queue.Full` when the buffer is full or closed and the event
+        must be rejected.
+        """
+        if self._closed:
+            raise queue.Full
+        try:
+            if self.backpressure == "block":
+                self._queue.put(event, timeout=self.block_seconds)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            if self.backpressure != "shed":
+                raise
+            self.shed += 1
+            return False
+        return True
+
+    def flush(self) -> None:
+        """
+        Wait until every queued event has been written.
+        """
+        self._queue.join()
+
+    def close(self, timeout: float | None = None) -> None:
+        """
+        Stop accepting events and wait for the queued ones to be written.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+
+    def _next_batch(self) -> list[Event | object]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.flush_size and batch[-1] is not _CLOSE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            events = [e for e in batch if isinstance(e, Event)]
+            try:
+                if events:
+                    self._write(events)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(events) < len(batch):
+                break
+        # events queued after `close` was called but before it took effect
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(event, Event):
+                self._write([event])
+            self._queue.task_done()
+
+    def _write(self, events: list[Event]) -> None:
+        try:
+            with Session(engine) as session:
+                statuses = insert_events(session=session, events=events)
+        except Exception:
+            logger.exception("Dropped %d buffered events", len(events))
+            self.failed += len(events)
+            return
+        errors = [status.error for status in statuses if status.error is not None]
+        rejected = len(errors)
+        if rejected:
+            logger.warning("Dropped %d buffered events: %s", rejected, errors)
+        self.flushed += len(events) - rejected
+        self.failed += rejected
+
+
+_buffer: EventBuffer | None = None
+_lock = threading.Lock()
+
+
+def get_event_buffer() -> EventBuffer:
+    """
+    Returns the process-wide buffer, starting its flusher on first use.
+    """
+    global _buffer
+    with _lock:
+        if _buffer is None:
+            _buffer = EventBuffer(
+                settings.EVENT_BUFFER_SIZE,
+                settings.EVENT_BUFFER_FLUSH_SIZE,
+                settings.EVENT_BUFFER_FLUSH_SECONDS,
+                settings.EVENT_BUFFER_BACKPRESSURE,
+                settings.EVENT_BUFFER_BLOCK_SECONDS,
+            )
+        return _buffer
+
+
+def close_event_buffer() -> None:
+    """
+    Drain and stop the buffer, called on application shutdown.
+    """
+    global _buffer
+    with _lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.close()
@@ -0,0 +1,191 @@
+"""
+Duplicate detection for events sent with an `idempotency_key`.
+
+Keys seen by this process are remembered in a time-rotated Bloom filter, so
+a new key is accepted without touching the database. Only a filter hit, a
+retry or a rare false positive, is confirmed with an indexed lookup of the
+stored events of the window.
+
+The event_key table catches the retries the filter misses, those handled by
+another worker process or written while their original still waited in the
+write-behind buffer or journal: an event is stored in the same transaction
+as its key, the table's primary key, so a second event with the key fails
+to commit and is answered with the first one, see `claim_keys`.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.models import Event, EventKey
+
+
+class BloomFilter:
+    """
+    Bloom filter sized for `capacity` keys at false positive rate `error_rate`.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(1, capacity)
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: str) -> None:
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+
+class RotatingBloomFilter:
+    """
+    Keys added during the last `window_seconds` to `2 * window_seconds`.
+    Two filters are kept: new keys go to the current one, which replaces the
+    previous one once it is `window_seconds` old.
+    """
+
+    def __init__(self, window_seconds: float, capacity: int, error_rate: float) -> None:
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def check_and_add(self, key: str) -> bool:
+        """
+        Add `key`, returning whether it may have been added before.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._rotated_at >= self.window_seconds:
+                expired = now - self._rotated_at >= 2 * self.window_seconds
+                self._previous = (
+                    BloomFilter(self.capacity, self.error_rate)
+                    if expired
+                    else self._current
+                )
+                self._current = BloomFilter(self.capacity, self.error_rate)
+                self._rotated_at = now
+            seen = key in self._current or key in self._previous
+            if not seen:
+                self._current.add(key)
+            return seen
+
+
+seen_keys = RotatingBloomFilter(
+    settings.EVENT_DEDUP_WINDOW_SECONDS,
+    settings.EVENT_DEDUP_CAPACITY,
+    settings.EVENT_DEDUP_ERROR_RATE,
+)
+
+
+def find_duplicates(session: Session, keys: Sequence[str | None]) -> dict[str, Event]:
+    """
+    Stored events of the `EVENT_DEDUP_WINDOW_SECONDS` window sharing one of
+    the idempotency `keys`, which are remembered for the following calls.
+    Queries the database only for keys that may have been seen before.
+    """
+    if settings.EVENT_DEDUP_WINDOW_SECONDS <= 0:
+        return {}
+    suspects = {key for key in keys if key is not None and seen_keys.check_and_add(key)}
+    if not suspects:
+        return {}
+    since = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.EVENT_DEDUP_WINDOW_SECONDS
+    )
+    statement = select(Event).where(
+        col(Event.idempotency_key).in_(suspects), col(Event.timestamp) >= since
+    )
+    return {
+        event.idempotency_key: event
+        for event in session.exec(statement).all()
+        if event.idempotency_key is not None
+    }
+
+
+def event_key(event: Event) -> EventKey | None:
+    """
+    The event_key row to store with `event`, None when it has no key or
+    deduplication is disabled. Committing it fails when the key is taken.
+    """
+    if event.idempotency_key is None or settings.EVENT_DEDUP_WINDOW_SECONDS <= 0:
+        return None
+    return EventKey(
+        key=event.idempotency_key,
+        event_id=event.id,
+        timestamp=event.timestamp or datetime.now(),
+    )
+
+
+def claim_keys(session: Session, events: Sequence[Event]) -> dict[str, EventKey]:
+    """
+    Claim the idempotency keys of `events`, each key given once, in the
+    caller's transaction, which must store the events whose key it claimed.
+    Returns the keys held by an event of the `EVENT_DEDUP_WINDOW_SECONDS`
+    window with their claim, those events must not be stored. Keys of older
+    events are claimed again. A concurrent claim of the same key waits for
+    the other transaction to end. Batches claim their keys with this single
+    statement, single events only after `event_key` failed to commit.
+    """
+    if settings.EVENT_DEDUP_WINDOW_SECONDS <= 0:
+        return {}
+    rows = [
+        {
+            "key": event.idempotency_key,
+            "event_id": event.id,
+            "timestamp": event.timestamp or datetime.now(),
+        }
+        for event in events
+        if event.idempotency_key is not None
+    ]
+    if not rows:
+        return {}
+    window = timedelta(seconds=settings.EVENT_DEDUP_WINDOW_SECONDS)
+    upsert = insert(EventKey)
+    statement = upsert.on_conflict_do_update(
+        index_elements=[col(EventKey.key)],
+        set_={
+            "event_id": upsert.excluded.event_id,
+            "timestamp": upsert.excluded.timestamp,
+        },
+        # keys of events older than the window are claimed again
+        where=col(EventKey.timestamp) < upsert.excluded.timestamp - window,
+    ).returning(col(EventKey.key))
+    claimed = set(session.execute(statement, rows).scalars())
+    held = [row["key"] for row in rows if row["key"] not in claimed]
+    if not held:
+        return {}
+    holders = select(EventKey).where(col(EventKey.key).in_(held))
+    return {key.key: key for key in session.exec(holders).all()}
+
+
+def delete_expired_keys(session: Session) -> int:
+    """
+    Delete the keys of events older than the `EVENT_DEDUP_WINDOW_SECONDS`
+    window. Returns the number of deleted keys.
+    """
+    since = datetime.now(timezone.utc) - timedelta(
+        seconds=max(0, settings.EVENT_DEDUP_WINDOW_SECONDS)
+    )
+    deleted = session.exec(  # type: ignore
+        delete(EventKey).where(col(EventKey.timestamp) < since)
+    ).rowcount
+    session.commit()
+    return int(deleted)
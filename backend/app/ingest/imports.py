@@ -0,0 +1,159 @@
+"""
+Background item imports.
+
+`POST /items/uploadcsv`, `/uploadparquet` and `/uploadarrow` store the upload
+under `UPLOAD_DIR`, record an `import_job` row and return at once. A pool of
+`IMPORT_WORKERS` threads runs the imports chunk by chunk with
+`import_csv_stream` or `import_arrow`, updating the job's progress after every
+committed chunk, so `GET /items/uploadcsv/{job_id}` can report it. Jobs
+interrupted by a shutdown stay `running`. An upload marked as the seller's
+full feed with `replace` then deletes the seller's listings missing from it,
+see `prune_items`.
+
+With `CSV_IMPORT_PROCESSES`, the CPU-bound parsing and preprocessing of CSV
+chunks runs in a pool of processes and the import threads only copy the
+results into the database, in file order. `-1` sizes the pool to the CPUs
+available to the process.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import IO, Literal
+
+from sqlmodel import Session
+
+from app.core.bus import ITEMS_CHANGED, bus
+from app.core.config import settings
+from app.core.db import engine
+from app.crud.arrow import import_arrow
+from app.crud.csv import import_csv_parallel, import_csv_stream, prune_items
+from app.models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+ImportFormat = Literal["csv", "parquet", "arrow"]
+
+
+def _import_chunks(
+    stream: IO[bytes],
+    session: Session,
+    seller_id: uuid.UUID,
+    fmt: ImportFormat,
+    seen: set[str] | None,
+) -> Iterator[tuple[int, int]]:
+    if fmt != "csv":
+        return import_arrow(
+            stream, session, seller_id, fmt, settings.CSV_IMPORT_CHUNK_ROWS, seen
+        )
+    if settings.csv_import_processes <= 0:
+        return import_csv_stream(
+            stream, session, seller_id, settings.CSV_IMPORT_CHUNK_ROWS, seen
+        )
+    return import_csv_parallel(
+        stream,
+        session,
+        seller_id,
+        settings.CSV_IMPORT_CHUNK_BYTES,
+        _get_process_pool(),
+        2 * settings.csv_import_processes,
+        seen,
+    )
+
+
+def run_import_job(
+    job_id: uuid.UUID, path: str, fmt: ImportFormat = "csv", replace: bool = False
+) -> None:
+    """
+    Import the `fmt` file `path` for job `job_id` and delete the file.
+    Chunks committed before an error are kept, the error is recorded.
+    With `replace`, the file is the seller's full feed and once it is
+    imported, the seller's listings missing from it are deleted.
+    """
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        if job is None:
+            return
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+        seen: set[str] | None = set() if replace else None
+        try:
+            with open(path, "rb") as f:
+                for rows, imported in _import_chunks(
+                    f, session, job.seller_id, fmt, seen
+                ):
+                    job.rows_processed += rows
+                    job.items_imported += imported
+                    session.add(job)
+                    session.commit()
+            if seen is not None:
+                job.items_deleted = prune_items(session, job.seller_id, seen)
+            job.status = "done"
+        except Exception as e:
+            logger.exception(f"Import job {job_id} failed")
+            session.rollback()
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"[:1024]
+        finally:
+            os.remove(path)
+        job.finished_at = datetime.now(timezone.utc)
+        session.add(job)
+        session.commit()
+        if job.items_imported or job.items_deleted:
+            bus.publish(ITEMS_CHANGED, [])
+
+
+_executor: ThreadPoolExecutor | None = None
+_process_pool: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            # forking would copy the threads and connections of the API worker
+            _process_pool = ProcessPoolExecutor(
+                settings.csv_import_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def submit_import_job(
+    job_id: uuid.UUID, path: str, fmt: ImportFormat = "csv", replace: bool = False
+) -> Future[None]:
+    """
+    Queue the import of `path` for `job_id` on the process-wide worker pool,
+    see `run_import_job`.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.IMPORT_WORKERS, thread_name_prefix="csv-import"
+            )
+        return _executor.submit(run_import_job, job_id, path, fmt, replace)
+
+
+def close_import_executor() -> None:
+    """
+    Wait for the running imports and stop the pools, called on shutdown.
+    Queued jobs that did not start are dropped and stay `pending`.
+    """
+    global _executor, _process_pool
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    with _lock:
+        process_pool, _process_pool = _process_pool, None
+    if process_pool is not None:
+        process_pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,266 @@
+"""
+Append-only on-disk journal for events.
+
+With `EVENT_JOURNAL_ENABLED`, `POST /events/` acknowledges an event once it
+is durable in the journal, whether or not the database is reachable. A
+background replayer copies the journal into the `event` table.
+
+Every process claims its own `worker-N` directory under `EVENT_JOURNAL_DIR`
+with an exclusive lock, so a restarted worker takes over the segments left by
+a dead one. A directory holds segment files named by an increasing sequence
+number. Each record is a 4-byte big-endian payload length, the CRC-32 of the
+payload and the event as JSON. Appends are made durable by group commit:
+writers wait for a syncer thread that fsyncs at most every
+`EVENT_JOURNAL_FSYNC_MS`, so one fsync covers every append of that interval.
+
+The replayer seals the active segment, inserts the sealed ones oldest first
+and deletes each segment once its events are committed. Events keep their id
+and timestamp and inserting a stored event is a no-op, so a segment replayed
+again after a crash is not duplicated. Events older than the rollup
+watermarks are folded into the rollups as they are inserted. A truncated or corrupt record, as left
+by a crash during a write, ends the replay of its segment.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.crud.events import insert_events
+from app.models import Event
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">II")
+_SUFFIX = ".log"
+_REPLAY_CHUNK = 1000
+
+
+def encode_record(event: Event) -> bytes:
+    payload = json.dumps(event.model_dump(mode="json")).encode()
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: Path) -> Iterator[Event]:
+    """
+    Events of the segment `path` up to its end or its first damaged record.
+    """
+    with open(path, "rb") as f:
+        while header := f.read(_HEADER.size):
+            if len(header) == _HEADER.size:
+                length, checksum = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) == length and zlib.crc32(payload) == checksum:
+                    yield Event.model_validate(json.loads(payload))
+                    continue
+            logger.warning(f"Skipping damaged tail of journal segment '{path}'")
+            return
+
+
+def _claim_directory(root: Path) -> tuple[Path, int]:
+    """
+    Lock the first `worker-N` directory under `root` not held by another
+    journal. Returns it with the descriptor holding the lock.
+    """
+    i = 0
+    while True:
+        directory = root / f"worker-{i}"
+        directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(directory / "lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            i += 1
+            continue
+        return directory, fd
+
+
+class EventJournal:
+    """
+    Segmented event journal with group-committed appends and a background
+    replayer into the database.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        segment_bytes: int,
+        fsync_seconds: float,
+        replay_seconds: float,
+    ) -> None:
+        self.directory, self._lock_fd = _claim_directory(Path(root))
+        self.segment_bytes = segment_bytes
+        self.fsync_seconds = fsync_seconds
+        self.replay_seconds = replay_seconds
+        self._cond = threading.Condition()
+        self._replay_lock = threading.Lock()
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        existing = [int(path.stem) for path in self._segments()]
+        self._sequence = max(existing, default=0)
+        self._open_segment()
+        self._threads = [
+            threading.Thread(target=target, name=name, daemon=True)
+            for target, name in (
+                (self._sync_loop, "event-journal-sync"),
+                (self._replay_loop, "event-journal-replay"),
+            )
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"*{_SUFFIX}"))
+
+    def _open_segment(self) -> None:
+        self._sequence += 1
+        self._path = self.directory / f"{self._sequence:020d}{_SUFFIX}"
+        self._file = open(self._path, "ab")
+        self._size = 0
+
+    def _sync(self) -> None:
+        # called with `_cond` held
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._durable = self._appended
+        self._cond.notify_all()
+
+    def _seal(self) -> None:
+        # called with `_cond` held
+        self._sync()
+        self._file.close()
+        self._open_segment()
+
+    def append(self, event: Event) -> None:
+        """
+        Write `event` to the journal, returning once it is on disk.
+        """
+        record = encode_record(event)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Event journal is closed")
+            if self._size and self._size + len(record) > self.segment_bytes:
+                self._seal()
+            self._file.write(record)
+            self._size += len(record)
+            self._appended += 1
+            ticket = self._appended
+            self._cond.notify_all()
+            while self._durable < ticket:
+                self._cond.wait()
+
+    def _sync_loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._durable == self._appended and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # let concurrent appends join this fsync
+            time.sleep(self.fsync_seconds)
+            with self._cond:
+                if not self._file.closed:
+                    self._sync()
+
+    def replay(self) -> int:
+        """
+        Insert the journaled events into the database and drop the replayed
+        segments. Returns the number of replayed events. Database errors are
+        raised and the remaining segments are kept for the next attempt.
+        """
+        with self._replay_lock:
+            with self._cond:
+                if self._size and not self._closed:
+                    self._seal()
+                active = self._path
+            replayed = 0
+            for path in self._segments():
+                if path == active:
+                    continue
+                events = list(read_segment(path))
+                with Session(engine) as session:
+                    for start in range(0, len(events), _REPLAY_CHUNK):
+                        chunk = events[start : start + _REPLAY_CHUNK]
+                        statuses = insert_events(session=session, events=chunk)
+                        for event, status in zip(chunk, statuses, strict=True):
+                            if status.error is not None:
+                                logger.warning(
+                                    f"Dropped event {event.id}: {status.error}"
+                                )
+                path.unlink()
+                replayed += len(events)
+            return replayed
+
+    def _replay_loop(self) -> None:
+        while True:
+            with self._cond:
+                if self._cond.wait_for(lambda: self._closed, self.replay_seconds):
+                    return
+            try:
+                self.replay()
+            except Exception:
+                logger.exception("Event journal replay failed, retrying")
+
+    def close(self) -> None:
+        """
+        Stop accepting events, make the written ones durable and replay what
+        the database accepts. Segments that could not be replayed are picked up
+        by the next journal opened on the directory.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._seal()
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        try:
+            self.replay()
+        except Exception:
+            logger.exception("Event journal replay failed on close")
+        with self._cond:
+            self._file.close()
+            if self._path.stat().st_size == 0:
+                self._path.unlink()
+        os.close(self._lock_fd)
+
+
+_journal: EventJournal | None = None
+_lock = threading.Lock()
+
+
+def get_event_journal() -> EventJournal:
+    """
+    Returns the process-wide journal, starting its threads on first use.
+    """
+    global _journal
+    with _lock:
+        if _journal is None:
+            _journal = EventJournal(
+                settings.EVENT_JOURNAL_DIR,
+                settings.EVENT_JOURNAL_SEGMENT_BYTES,
+                settings.EVENT_JOURNAL_FSYNC_MS / 1000.0,
+                settings.EVENT_JOURNAL_REPLAY_SECONDS,
+            )
+        return _journal
+
+
+def close_event_journal() -> None:
+    global _journal
+    with _lock:
+        journal, _journal = _journal, None
+    if journal is not None:
+        journal.close()
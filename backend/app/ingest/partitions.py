@@ -0,0 +1,149 @@
+"""
+Monthly range partitions of the `event` table.
+
+`event` is partitioned on `timestamp` into `event_pYYYYMM` partitions holding
+one UTC month each, plus `event_default` catching events outside of them.
+The cron job creates partitions ahead of time and detaches or drops the ones
+that fell out of the retention window, so deleting old events never has to
+touch live rows and time-bounded queries only scan the months they need.
+"""
+
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.config import settings
+
+DEFAULT_PARTITION = "event_default"
+
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+# UTC offset of whole hours as Postgres prints it, like `+00`
+_HOUR_OFFSET = re.compile(r"([+-]\d{2})$")
+
+
+def month_start(day: date) -> datetime:
+    return datetime(day.year, day.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def parse_bound(bound: str) -> datetime:
+    """
+    Datetime of a partition bound printed by Postgres, such as
+    `2024-01-01 00:00:00+00`. `datetime.fromisoformat` only accepts offsets
+    with minutes before Python 3.11.
+    """
+    return datetime.fromisoformat(_HOUR_OFFSET.sub(r"\1:00", bound))
+
+
+def partition_name(month: datetime) -> str:
+    return f"event_p{month:%Y%m}"
+
+
+def event_partitions(session: Session) -> dict[str, tuple[datetime, datetime]]:
+    """
+    Attached range partitions of `event` with their `[from, to)` bounds.
+    """
+    rows = session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'event'::regclass"
+        )
+    ).all()
+    partitions = {}
+    for name, bound in rows:
+        match = _BOUNDS.search(bound)
+        if match is not None:
+            lower, upper = (parse_bound(b) for b in match.groups())
+            partitions[name] = (lower, upper)
+    return partitions
+
+
+def create_event_partitions(session: Session, start: date, months: int) -> list[str]:
+    """
+    Make sure a partition exists for each of the `months` months from `start`
+    on. Events that went to the default partition before their month's
+    partition existed are moved into it. Returns the created partitions.
+    """
+    existing = {lower for lower, _ in event_partitions(session).values()}
+    created = []
+    for i in range(months):
+        lower = add_months(month_start(start), i)
+        if lower in existing:
+            continue
+        upper = add_months(lower, 1)
+        name = partition_name(lower)
+        bounds = {"lower": lower, "upper": upper}
+        session.execute(text(f"CREATE TABLE {name} (LIKE event INCLUDING DEFAULTS)"))
+        session.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                "WHERE timestamp >= :lower AND timestamp < :upper RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ),
+            bounds,
+        )
+        session.execute(
+            text(
+                f"ALTER TABLE event ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+        )
+        created.append(name)
+    session.commit()
+    return created
+
+
+def drop_event_partitions(
+    session: Session, before: datetime, detach_only: bool = False
+) -> list[str]:
+    """
+    Detach the partitions holding only events older than `before` and, unless
+    `detach_only`, drop them together with such events in the default
+    partition. Detached partitions stay around as plain tables for archiving.
+    Returns the detached partitions.
+    """
+    expired = [
+        name
+        for name, (_, upper) in event_partitions(session).items()
+        if upper <= before
+    ]
+    for name in expired:
+        session.execute(text(f"ALTER TABLE event DETACH PARTITION {name}"))
+        if not detach_only:
+            session.execute(text(f"DROP TABLE {name}"))
+    if not detach_only:
+        session.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :before"),
+            {"before": before},
+        )
+    session.commit()
+    return expired
+
+
+def maintain_event_partitions(
+    session: Session, now: datetime | None = None
+) -> tuple[list[str], list[str]]:
+    """
+    Create partitions for this month and `EVENT_PARTITIONS_AHEAD_MONTHS` ahead
+    and retire those older than `EVENT_RETENTION_MONTHS`.
+    Returns the created and the retired partitions.
+    """
+    now = now or datetime.now(timezone.utc)
+    created = create_event_partitions(
+        session, now.date(), settings.EVENT_PARTITIONS_AHEAD_MONTHS + 1
+    )
+    retired = []
+    if settings.EVENT_RETENTION_MONTHS > 0:
+        retired = drop_event_partitions(
+            session,
+            add_months(month_start(now.date()), -settings.EVENT_RETENTION_MONTHS),
+            detach_only=settings.EVENT_RETENTION_ACTION == "detach",
+        )
+    return created, retired
@@ -1,10 +1,21 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.ingest.buffer import close_event_buffer
+from app.ingest.imports import close_import_executor
+from app.ingest.journal import close_event_journal, get_event_journal
+from app.recommend.refresh import (
+    close_popularity_refresher,
+    start_popularity_refresher,
+)
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,8 +25,24 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    if settings.EVENT_JOURNAL_ENABLED:
+        # replays events journaled before a restart
+        get_event_journal()
+    start_popularity_refresher()
+    yield
+    # write events still waiting in the write-behind buffer or the journal
+    await run_in_threadpool(close_event_buffer)
+    await run_in_threadpool(close_event_journal)
+    await run_in_threadpool(close_import_executor)
+    await run_in_threadpool(close_popularity_refresher)
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
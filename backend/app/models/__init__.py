@@ -4,6 +4,9 @@ from .event import *
 from .item import *
 from .user import *
 from .event import *
+from .similarity import *
+from .popularity import *
+from .import_job import *
 
 
 # Generic message
@@ -11,6 +14,17 @@ class Message(SQLModel):
     message: str
 
 
+# Hit/miss statistics of an in-process cache
+class CacheStats(SQLModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    generation: int
+
+
 # JSON payload containing access token
 class Token(SQLModel):
     access_token: str
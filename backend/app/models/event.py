@@ -2,19 +2,96 @@ import uuid
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import Column, DateTime, func
+from pydantic import field_validator, model_validator
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Dialect,
+    ForeignKey,
+    Index,
+    SmallInteger,
+    TypeDecorator,
+    func,
+    text,
+)
 from sqlmodel import JSON, Field, SQLModel
 
+# Registered event types as (code, name, weight), `init_db` syncs the
+# event_type table with them. "other" stands for events recorded before types
+# were registered, their original type is kept in `event_value["event_type"]`
+EVENT_TYPE_CATALOG: list[tuple[int, str, float]] = [
+    (0, "other", 1.0),
+    (1, "view", 1.0),
+    (2, "click", 2.0),
+    (3, "favourite", 4.0),
+    (4, "purchase", 8.0),
+]
+EVENT_TYPES: dict[str, int] = {name: code for code, name, _ in EVENT_TYPE_CATALOG}
+_EVENT_TYPE_NAMES = {code: name for name, code in EVENT_TYPES.items()}
+
+# `event_value` keys stored in their own columns
+PROMOTED_EVENT_VALUES = ("price_seen", "dwell_time_ms")
+
+
+class EventTypeCode(TypeDecorator[str]):
+    """
+    Event type name stored as its small-int code.
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect: Dialect) -> int | None:
+        return None if value is None else EVENT_TYPES.get(value, 0)
+
+    def process_result_value(self, value: int | None, dialect: Dialect) -> str | None:
+        return None if value is None else _EVENT_TYPE_NAMES.get(value, "other")
+
+
+# Catalog of the registered event types
+class EventType(SQLModel, table=True):
+    __tablename__ = "event_type"
+
+    code: int = Field(sa_column=Column(SmallInteger, primary_key=True))
+    name: str = Field(unique=True, max_length=64)
+    # contribution of one event to weighted interaction counts
+    weight: float = 1.0
+
 
 class EventBase(SQLModel):
     user_id: uuid.UUID | None = Field(foreign_key="user.id", nullable=True)
     item_id: uuid.UUID | None = Field(foreign_key="item.id", nullable=True)
     event_type: str = Field(max_length=255)
     event_value: dict[str, Any] | None = Field(default=None, sa_column=Column(JSON))
+    price_seen: float | None = None
+    dwell_time_ms: int | None = Field(default=None, ge=0)
+    # client-chosen key, retries of an event repeat it, see app/ingest/dedup.py
+    idempotency_key: str | None = Field(default=None, max_length=128)
 
 
 class EventCreate(EventBase):
-    pass
+    @field_validator("event_type")
+    @classmethod
+    def registered_event_type(cls, value: str) -> str:
+        if value not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type, expected one of {list(EVENT_TYPES)}")
+        return value
+
+    @model_validator(mode="before")
+    @classmethod
+    def promote_event_values(cls, data: Any) -> Any:
+        """
+        Move promoted keys of `event_value` to their fields unless given.
+        """
+        if isinstance(data, dict) and isinstance(data.get("event_value"), dict):
+            value = dict(data["event_value"])
+            data = dict(data)
+            for key in PROMOTED_EVENT_VALUES:
+                if key in value:
+                    promoted = value.pop(key)
+                    data.setdefault(key, promoted)
+            data["event_value"] = value or None
+        return data
 
 
 class EventPublic(EventBase):
@@ -22,8 +99,68 @@ class EventPublic(EventBase):
     timestamp: datetime
 
 
+# Outcome of one record of an event batch, `id` is set when it was stored.
+# Duplicates carry the id of the event stored before
+class EventBatchStatus(SQLModel):
+    index: int
+    id: uuid.UUID | None = None
+    error: str | None = None
+    duplicate: bool = False
+
+
+class EventsBatchPublic(SQLModel):
+    data: list[EventBatchStatus]
+    accepted: int
+    rejected: int
+
+
 class Event(EventBase, table=True):
+    __table_args__ = (
+        # item popularity, item delete foreign key checks
+        Index(
+            "ix_event_item_id", "item_id", postgresql_where=text("item_id IS NOT NULL")
+        ),
+        # per-user popularity
+        Index(
+            "ix_event_user_id_item_id",
+            "user_id",
+            "item_id",
+            postgresql_where=text("user_id IS NOT NULL"),
+        ),
+        # incremental rollups and trending counters read recent item events
+        Index(
+            "ix_event_timestamp",
+            "timestamp",
+            postgresql_where=text("item_id IS NOT NULL"),
+        ),
+        # exact check of idempotency keys
+        Index(
+            "ix_event_idempotency_key",
+            "idempotency_key",
+            postgresql_where=text("idempotency_key IS NOT NULL"),
+        ),
+        # monthly partitions, see app/ingest/partitions.py
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    event_type: str = Field(
+        sa_column=Column(EventTypeCode(), ForeignKey("event_type.code"), nullable=False)
+    )
+    timestamp: datetime = Field(
+        sa_column=Column(
+            DateTime(timezone=True), primary_key=True, server_default=func.now()
+        )
+    )
+
+
+# Idempotency key of a stored event, unique across partitions and worker
+# processes, see app/ingest/dedup.py
+class EventKey(SQLModel, table=True):
+    __tablename__ = "event_key"
+
+    key: str = Field(primary_key=True, max_length=128)
+    event_id: uuid.UUID
     timestamp: datetime = Field(
-        sa_column=Column(DateTime(timezone=True), server_default=func.now())
+        sa_column=Column(DateTime(timezone=True), nullable=False)
     )
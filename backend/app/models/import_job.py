@@ -0,0 +1,53 @@
+import uuid
+from datetime import datetime, timezone
+
+from pydantic import computed_field
+from sqlalchemy import Column, DateTime
+from sqlmodel import Field, SQLModel
+
+
+class ImportJobBase(SQLModel):
+    filename: str | None = Field(default=None, max_length=255)
+    # pending, running, done or failed
+    status: str = Field(default="pending", max_length=16)
+    # CSV rows parsed so far and items stored from them
+    rows_processed: int = 0
+    items_imported: int = 0
+    # listings missing from a full feed, see app/ingest/imports.py
+    items_deleted: int = 0
+    error: str | None = Field(default=None, max_length=1024)
+    started_at: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+    finished_at: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+
+
+# CSV import running in the background, see app/ingest/imports.py
+class ImportJob(ImportJobBase, table=True):
+    __tablename__ = "import_job"
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    seller_id: uuid.UUID = Field(
+        foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True
+    )
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+    )
+
+
+class ImportJobPublic(ImportJobBase):
+    id: uuid.UUID
+    seller_id: uuid.UUID
+    created_at: datetime
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def rows_per_second(self) -> float | None:
+        if self.started_at is None:
+            return None
+        end = self.finished_at or datetime.now(timezone.utc)
+        elapsed = (end - self.started_at).total_seconds()
+        return self.rows_processed / elapsed if elapsed > 0 else None
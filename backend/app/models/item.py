@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from typing import Sequence
 
-from sqlalchemy import Column, DateTime, func
+from sqlalchemy import Column, DateTime, Index, func
 from sqlmodel import Field, Relationship, SQLModel
 from .user import User
 
@@ -21,6 +21,8 @@ class ItemBase(SQLModel):
     max_power: float | None = Field(default=None)
     torque: str | None = Field(default=None, max_length=255)
     seats: int | None = Field(default=None)
+    # the seller's own id of the listing, imports update the item with it
+    listing_id: str | None = Field(default=None, max_length=255)
 
 
 class ItemCreate(ItemBase):
@@ -40,9 +42,24 @@ class ItemPublic(ItemBase):
 
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    __table_args__ = (
+        # find_similar_query filters: equality on fuel type, ranges on the rest
+        Index(
+            "ix_item_fuel_type_year_selling_price",
+            "fuel_type",
+            "year",
+            "selling_price",
+            "km_driven",
+        ),
+        # imports update listings the seller already has
+        Index(
+            "ix_item_seller_id_listing_hash", "seller_id", "listing_hash", unique=True
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     seller_id: uuid.UUID = Field(
-        foreign_key="user.id", nullable=False, ondelete="CASCADE"
+        foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True
     )
     created_at: datetime = Field(
         sa_column=Column(DateTime(timezone=True), server_default=func.now())
@@ -54,11 +71,31 @@ class Item(ItemBase, table=True):
         sa_column=Column(DateTime(timezone=True), server_default=func.now())
     )
     final_price: float | None = Field(default=None)
+    # hashes of the listing id, or of the content without one, and of the
+    # content, see app/crud/csv.py. Items repeating a listing of their seller
+    # have no listing hash
+    listing_hash: str | None = Field(default=None, max_length=32)
+    content_hash: str | None = Field(default=None, max_length=32)
 
 
 class ItemsPublic(SQLModel):
     data: Sequence[Item]
     count: int
+    # pass as `cursor` to fetch the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# Recommendations for many items or users, keyed by their id
+class ItemsBatchPublic(SQLModel):
+    data: dict[uuid.UUID, ItemsPublic]
+
+
+class SimilarItemsBatchQuery(SQLModel):
+    item_ids: list[uuid.UUID] = Field(min_length=1, max_length=100)
+
+
+class UserRecommendationsBatchQuery(SQLModel):
+    user_ids: list[uuid.UUID] = Field(min_length=1, max_length=100)
 
 
 class ItemQuery(SQLModel):
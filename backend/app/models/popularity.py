@@ -0,0 +1,52 @@
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey
+from sqlmodel import Field, SQLModel
+
+from .event import EventTypeCode
+
+
+# Per-item event counts, maintained incrementally from new events
+class ItemPopularity(SQLModel, table=True):
+    __tablename__ = "item_popularity"
+
+    item_id: uuid.UUID = Field(
+        foreign_key="item.id", primary_key=True, ondelete="CASCADE"
+    )
+    event_count: int = Field(default=0)
+    # log of the time-decayed event count, see app/recommend/popularity.py
+    score: float = Field(index=True)
+    last_event_at: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+
+
+# Events up to `watermark` are already folded into the rollup `name`
+class RollupWatermark(SQLModel, table=True):
+    __tablename__ = "rollup_watermark"
+
+    name: str = Field(primary_key=True, max_length=64)
+    watermark: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+
+
+# Per-day event counts of a user with an item, compacted from `Event`
+class UserItemDaily(SQLModel, table=True):
+    __tablename__ = "user_item_daily"
+
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id", primary_key=True, ondelete="CASCADE"
+    )
+    item_id: uuid.UUID = Field(
+        foreign_key="item.id", primary_key=True, ondelete="CASCADE"
+    )
+    # UTC day of the events
+    day: date = Field(primary_key=True)
+    event_type: str = Field(
+        sa_column=Column(
+            EventTypeCode(), ForeignKey("event_type.code"), primary_key=True
+        )
+    )
+    count: int
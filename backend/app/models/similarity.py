@@ -0,0 +1,17 @@
+import uuid
+
+from sqlmodel import Field, SQLModel
+
+
+# Top-K neighbours of every item, precomputed by the cron job
+class ItemSimilarity(SQLModel, table=True):
+    __tablename__ = "item_similarity"
+
+    item_id: uuid.UUID = Field(
+        foreign_key="item.id", primary_key=True, ondelete="CASCADE"
+    )
+    rank: int = Field(primary_key=True)
+    neighbour_id: uuid.UUID = Field(
+        foreign_key="item.id", nullable=False, ondelete="CASCADE", index=True
+    )
+    score: float
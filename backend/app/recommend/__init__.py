@@ -1 +1,19 @@
-from .recommender import find_most_popular_items, find_similar_items, find_similar_query
+from .recommender import (
+    find_most_popular_items,
+    find_recommended_items,
+    find_recommended_items_batch,
+    find_similar_items,
+    find_similar_items_batch,
+    find_similar_query,
+    find_trending_items,
+)
+
+__all__ = [
+    "find_most_popular_items",
+    "find_recommended_items",
+    "find_recommended_items_batch",
+    "find_similar_items",
+    "find_similar_items_batch",
+    "find_similar_query",
+    "find_trending_items",
+]
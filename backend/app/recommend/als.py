@@ -0,0 +1,212 @@
+"""
+Implicit-feedback matrix factorisation (ALS, Hu, Koren & Volinsky 2008).
+
+The cron job trains user and item factors and writes them as `.npy` files.
+API workers memory-map them read-only, so the factors live once in the page
+cache and a personalized top-k is one dot product plus `argpartition`.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp
+
+from app.core.config import settings
+from app.core.pagination import Cursor, keyset_top_k
+from app.recommend.interactions import Interactions
+
+
+def _solve(
+    fixed: npt.NDArray[np.float32], confidence: sp.csr_matrix, regularization: float
+) -> npt.NDArray[np.float32]:
+    """
+    One ALS half-step: solve the factors of every row of `confidence` with the
+    factors of the other side held `fixed`.
+    """
+    n_factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(n_factors)
+    solved = np.zeros((confidence.shape[0], n_factors), dtype=np.float32)
+    for row in range(confidence.shape[0]):
+        lo, hi = confidence.indptr[row], confidence.indptr[row + 1]
+        if lo == hi:
+            continue
+        cols = confidence.indices[lo:hi]
+        c = confidence.data[lo:hi].astype(np.float64)
+        y = fixed[cols].astype(np.float64)
+        # (YtY + Yt (C - I) Y + lambda I) x = Yt C p, with p = 1 on observed items
+        a = gram + (y.T * (c - 1.0)) @ y
+        b = y.T @ c
+        solved[row] = np.linalg.solve(a, b)
+    return solved
+
+
+def train_als(
+    interactions: Interactions,
+    n_factors: int,
+    iterations: int,
+    regularization: float,
+    alpha: float,
+    seed: int = 0,
+) -> tuple[npt.NDArray[np.float32], npt.NDArray[np.float32]]:
+    """
+    Returns `(user_factors, item_factors)` as float32 matrices.
+    Confidence of an observed interaction `r` is `1 + alpha * r`.
+    """
+    rng = np.random.default_rng(seed)
+    confidence = interactions.matrix.astype(np.float64)
+    confidence.data = 1.0 + alpha * confidence.data
+    confidence_t = confidence.T.tocsr()
+    n_users, n_items = confidence.shape
+    users = rng.normal(scale=0.01, size=(n_users, n_factors)).astype(np.float32)
+    items = rng.normal(scale=0.01, size=(n_items, n_factors)).astype(np.float32)
+    for _ in range(iterations):
+        users = _solve(items, confidence, regularization)
+        items = _solve(users, confidence_t, regularization)
+    return users, items
+
+
+def _id_array(ids: list[uuid.UUID]) -> npt.NDArray[np.bytes_]:
+    return np.array([i.bytes for i in ids], dtype="S16")
+
+
+class AlsModel:
+    """
+    Memory-mapped ALS factors. User ids are stored sorted so a user is found
+    with a binary search over the mapped id array instead of a per-process dict.
+    """
+
+    def __init__(
+        self,
+        user_ids: npt.NDArray[np.bytes_],
+        user_factors: npt.NDArray[np.float32],
+        item_ids: npt.NDArray[np.bytes_],
+        item_factors: npt.NDArray[np.float32],
+    ) -> None:
+        self.user_ids = user_ids
+        self.user_factors = user_factors
+        self.item_ids = item_ids
+        self.item_factors = item_factors
+
+    @staticmethod
+    def save(
+        directory: str | Path,
+        user_ids: list[uuid.UUID],
+        user_factors: npt.NDArray[np.float32],
+        item_ids: list[uuid.UUID],
+        item_factors: npt.NDArray[np.float32],
+    ) -> None:
+        """
+        Write a new model version next to `directory` and atomically repoint the
+        `directory` symlink to it, so readers never see a half-written model.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        version = directory.parent / f"{directory.name}-{time.time_ns()}"
+        version.mkdir()
+        users = _id_array(user_ids)
+        order = np.argsort(users, kind="stable")
+        np.save(version / "user_ids.npy", users[order])
+        np.save(version / "user_factors.npy", user_factors[order])
+        np.save(version / "item_ids.npy", _id_array(item_ids))
+        np.save(version / "item_factors.npy", item_factors)
+
+        link = directory.parent / f"{directory.name}.tmp"
+        link.unlink(missing_ok=True)
+        link.symlink_to(version.name)
+        previous = directory.resolve() if directory.is_symlink() else None
+        os.replace(link, directory)
+        if previous is not None and previous != version.resolve():
+            # workers still mapping the old files keep them alive until unmapped
+            shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str | Path) -> "AlsModel | None":
+        directory = Path(directory)
+        if not (directory / "user_factors.npy").exists():
+            return None
+        return cls(
+            np.load(directory / "user_ids.npy", mmap_mode="r"),
+            np.load(directory / "user_factors.npy", mmap_mode="r"),
+            np.load(directory / "item_ids.npy", mmap_mode="r"),
+            np.load(directory / "item_factors.npy", mmap_mode="r"),
+        )
+
+    def user_vector(self, user_id: uuid.UUID) -> npt.NDArray[np.float32] | None:
+        key = np.array(user_id.bytes, dtype="S16")
+        position = int(np.searchsorted(self.user_ids, key))
+        if position >= len(self.user_ids) or self.user_ids[position] != key:
+            return None
+        return np.asarray(self.user_factors[position])
+
+    def item_id(self, position: int) -> uuid.UUID:
+        # numpy strips trailing zero bytes of fixed-width byte strings
+        return uuid.UUID(bytes=bytes(self.item_ids[position]).ljust(16, b"\0"))
+
+    def recommend(self, user_id: uuid.UUID, k: int) -> list[uuid.UUID] | None:
+        """
+        Top `k` items for `user_id` by predicted preference, None for unknown users.
+        """
+        ranked = self.ranked(user_id, k)
+        return None if ranked is None else [item_id for item_id, _ in ranked]
+
+    def ranked(
+        self, user_id: uuid.UUID, k: int, after: Cursor | None = None
+    ) -> list[tuple[uuid.UUID, float]] | None:
+        """
+        `recommend` with the predicted preferences, continuing after cursor
+        `after` whose key is the negated preference.
+        """
+        vector = self.user_vector(user_id)
+        if vector is None:
+            return None
+        scores = (self.item_factors @ vector).astype(np.float64)
+        top = keyset_top_k(-scores, self.item_id, k, after)
+        return [(self.item_id(i), float(scores[i])) for i in top]
+
+    def recommend_many(
+        self, user_ids: Sequence[uuid.UUID], k: int
+    ) -> dict[uuid.UUID, list[uuid.UUID]]:
+        """
+        `recommend` for many users scored with one matrix product.
+        Users unknown to the model are left out.
+        """
+        vectors = {user_id: self.user_vector(user_id) for user_id in user_ids}
+        known = {
+            user_id: vector for user_id, vector in vectors.items() if vector is not None
+        }
+        if not known:
+            return {}
+        scores = np.stack(list(known.values())) @ self.item_factors.T
+        return {
+            user_id: [
+                self.item_id(i)
+                for i in keyset_top_k(-row.astype(np.float64), self.item_id, k)
+            ]
+            for user_id, row in zip(known, scores, strict=True)
+        }
+
+
+_model: AlsModel | None = None
+_loaded_version: str | None = None
+_lock = threading.Lock()
+
+
+def get_als_model() -> AlsModel | None:
+    """
+    Returns the memory-mapped model written by the cron job, remapping it when
+    a new version is published. None when no model has been trained yet.
+    """
+    global _model, _loaded_version
+    version = os.path.realpath(settings.als_dir)
+    with _lock:
+        if version != _loaded_version:
+            _model = AlsModel.load(version)
+            _loaded_version = version if _model is not None else None
+        return _model
@@ -0,0 +1,272 @@
+"""
+Approximate nearest-neighbour search over the item feature matrix.
+
+Inverted-file (IVF) index: items are bucketed by their nearest k-means
+centroid and a search only scans the `n_probe` buckets closest to the query.
+`n_lists` and `n_probe` trade recall for latency.
+"""
+
+import json
+import uuid
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+_ASSIGN_CHUNK = 65536
+
+
+def _nearest_centroids(
+    vectors: npt.NDArray[np.float32],
+    centroids: npt.NDArray[np.float32],
+    c_norms: npt.NDArray[np.float32],
+) -> npt.NDArray[np.int32]:
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        chunk = vectors[start : start + _ASSIGN_CHUNK]
+        scores = c_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        labels[start : start + len(chunk)] = np.argmin(scores, axis=1)
+    return labels
+
+
+def kmeans(
+    vectors: npt.NDArray[np.float32], n_clusters: int, n_iter: int = 10, seed: int = 0
+) -> npt.NDArray[np.float32]:
+    """
+    Lloyd's k-means returning `n_clusters` float32 centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n, dim = vectors.shape
+    n_clusters = min(n_clusters, n)
+    centroids = vectors[rng.choice(n, n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        c_norms = np.einsum("ij,ij->i", centroids, centroids)
+        labels = _nearest_centroids(vectors, centroids, c_norms)
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.stack(
+            [
+                np.bincount(labels, weights=vectors[:, j], minlength=n_clusters)
+                for j in range(dim)
+            ],
+            axis=1,
+        )
+        empty = counts == 0
+        centroids[~empty] = (sums[~empty] / counts[~empty, None]).astype(np.float32)
+        # re-seed empty clusters with random points
+        centroids[empty] = vectors[rng.choice(n, int(empty.sum()))]
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a feature matrix.
+
+    `assignments[i]` is the list (centroid) of row `i`; rows of list `l` are
+    `order[offsets[l]:offsets[l + 1]]`.
+    """
+
+    def __init__(
+        self, centroids: npt.NDArray[np.float32], assignments: npt.NDArray[np.int32]
+    ) -> None:
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(
+        cls,
+        vectors: npt.NDArray[np.float32],
+        n_lists: int | None = None,
+        n_iter: int = 10,
+        sample_size: int = 256,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Train centroids on a sample of `sample_size` rows per list and assign all rows.
+        `n_lists` defaults to `4 * sqrt(n)`.
+        """
+        n = len(vectors)
+        if n_lists is None or n_lists <= 0:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if n > n_lists * sample_size:
+            sample = vectors[rng.choice(n, n_lists * sample_size, replace=False)]
+        centroids = kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        return cls.from_centroids(centroids, vectors)
+
+    @classmethod
+    def from_centroids(
+        cls, centroids: npt.NDArray[np.float32], vectors: npt.NDArray[np.float32]
+    ) -> "IVFIndex":
+        c_norms = np.einsum("ij,ij->i", centroids, centroids)
+        return cls(centroids, _nearest_centroids(vectors, centroids, c_norms))
+
+    def members(
+        self, lists: Sequence[int] | npt.NDArray[np.int64]
+    ) -> npt.NDArray[np.int64]:
+        """
+        Row positions belonging to the given lists.
+        """
+        return np.concatenate(
+            [self.order[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+        )
+
+    def nearest_lists(
+        self, query: npt.NDArray[np.float32], n_probe: int
+    ) -> npt.NDArray[np.int64]:
+        """
+        The `n_probe` lists whose centroids are closest to `query`.
+        """
+        scores = self.c_norms - 2.0 * (self.centroids @ query.astype(np.float32))
+        return np.argsort(scores)[: max(1, n_probe)]
+
+    def search(
+        self,
+        vectors: npt.NDArray[np.float32],
+        sq_norms: npt.NDArray[np.float32],
+        query: npt.NDArray[np.float32],
+        k: int,
+        n_probe: int,
+        valid: npt.NDArray[np.bool_] | None = None,
+        beyond: float = 0.0,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+        """
+        Returns positions and squared distances of (approximately) the `k`
+        nearest rows of `vectors` ordered by distance. Rows where `valid` is
+        False or closer than `beyond` are skipped. The probe is widened until
+        `k` candidates are found.
+        """
+        query = query.astype(np.float32, copy=False)
+        list_order = self.nearest_lists(query, self.n_lists)
+        n_probe = max(1, n_probe)
+        while True:
+            candidates = self.members(list_order[:n_probe])
+            if valid is not None:
+                candidates = candidates[valid[candidates]]
+            distances = (
+                sq_norms[candidates]
+                - 2.0 * (vectors[candidates] @ query)
+                + float(query @ query)
+            )
+            if beyond > 0:
+                far = distances >= beyond
+                candidates, distances = candidates[far], distances[far]
+            if len(candidates) >= k or n_probe >= self.n_lists:
+                break
+            n_probe *= 2
+
+        if len(candidates) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        k = min(k, len(candidates))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.lexsort((candidates[top], distances[top]))]
+        return candidates[top], distances[top]
+
+    def save(self, path: str | Path, ids: Sequence[uuid.UUID], layout: str) -> None:
+        """
+        Persist centroids and row assignments keyed by item id.
+        `layout` identifies the feature space the centroids live in.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            ids=np.frombuffer(b"".join(i.bytes for i in ids), dtype=np.uint8).reshape(
+                -1, 16
+            ),
+            layout=np.array(layout),
+        )
+        tmp.replace(path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str | Path,
+        ids: Sequence[uuid.UUID],
+        vectors: npt.NDArray[np.float32],
+        layout: str,
+    ) -> "IVFIndex | None":
+        """
+        Load an index saved by `save` and remap it onto the rows `ids`/`vectors`.
+        Rows unknown to the saved index are assigned to their nearest centroid.
+        Centroids saved for other categorical vocabularies are carried over to
+        `layout`, see `remap_centroids`. Returns None when the file is missing
+        or the numeric features differ.
+        """
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            centroids = remap_centroids(data["centroids"], str(data["layout"]), layout)
+            # ids as 16-byte keys, matched by a sorted search instead of a dict
+            saved_ids = data["ids"].view("S16").ravel()
+            saved_assignments = data["assignments"]
+        if centroids is None or centroids.shape[1] != vectors.shape[1]:
+            return None
+        keys = np.frombuffer(b"".join(i.bytes for i in ids), dtype="S16")
+        order = np.argsort(saved_ids)
+        found = np.minimum(
+            np.searchsorted(saved_ids, keys, sorter=order), len(order) - 1
+        )
+        assignments = np.full(len(keys), -1, dtype=np.int32)
+        if len(order):
+            matches = saved_ids[order[found]] == keys
+            assignments[matches] = saved_assignments[order[found[matches]]]
+        missing = np.flatnonzero(assignments < 0)
+        if len(missing):
+            c_norms = np.einsum("ij,ij->i", centroids, centroids)
+            assignments[missing] = _nearest_centroids(
+                vectors[missing], centroids, c_norms
+            )
+        return cls(centroids, assignments)
+
+
+def remap_centroids(
+    centroids: npt.NDArray[np.float32], saved_layout: str, layout: str
+) -> npt.NDArray[np.float32] | None:
+    """
+    Move `centroids` from the feature space `saved_layout` to `layout`, which
+    may have gained or lost categorical values: a centroid has no weight on a
+    value it never saw. Returns None when the numeric features differ.
+    """
+    if saved_layout == layout:
+        return centroids
+    saved_vocabularies = json.loads(saved_layout)
+    vocabularies = json.loads(layout)
+    n_numeric = centroids.shape[1] - sum(len(v) for v in saved_vocabularies)
+    if len(saved_vocabularies) != len(vocabularies) or n_numeric < 0:
+        return None
+    remapped = np.zeros(
+        (len(centroids), n_numeric + sum(len(v) for v in vocabularies)),
+        dtype=np.float32,
+    )
+    remapped[:, :n_numeric] = centroids[:, :n_numeric]
+    saved_offset, offset = n_numeric, n_numeric
+    for saved_values, values in zip(saved_vocabularies, vocabularies, strict=True):
+        positions = {value: offset + i for i, value in enumerate(values)}
+        for i, value in enumerate(saved_values):
+            if value in positions:
+                remapped[:, positions[value]] = centroids[:, saved_offset + i]
+        saved_offset += len(saved_values)
+        offset += len(values)
+    return remapped
+
+
+def layout_signature(vocabularies: Sequence[dict[str, int]]) -> str:
+    """
+    Identifies the feature space of a matrix with the given categorical vocabularies.
+    """
+    return json.dumps([sorted(v, key=v.__getitem__) for v in vocabularies])
@@ -0,0 +1,110 @@
+"""
+Bounded LRU + TTL cache for recommendation results.
+
+Writes to the catalog bump a generation counter: cached entries of older
+generations are dropped, and results computed while a write happened are
+not stored, so a slow request cannot reinsert a stale result.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+from app.core.bus import ITEMS_CHANGED, bus
+from app.core.config import settings
+from app.models import ItemQuery
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl_seconds` after insertion.
+    A `max_size` of 0 disables caching.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Cached value of `key`, None when missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        """
+        Store `value` computed during `generation`, evicting the least recently
+        used entries beyond `max_size`. Ignored when the cache was invalidated
+        since.
+        """
+        with self._lock:
+            if self.max_size <= 0 or generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "generation": self.generation,
+            }
+
+
+def similar_query_key(query: ItemQuery, limit: int, offset: int) -> Hashable:
+    """
+    Cache key of a `find_similar_query` call. Built from the validated query,
+    so e.g. a price sent as `"5000"`, `5000` or `5000.0` maps to the same key.
+    """
+    return tuple(query.model_dump().items()), limit, offset
+
+
+similar_query_cache = QueryCache(
+    settings.SIMILAR_QUERY_CACHE_SIZE, settings.SIMILAR_QUERY_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_query_cache() -> None:
+    """
+    Drop cached recommendation results after a catalog write.
+    """
+    similar_query_cache.invalidate()
+
+
+bus.subscribe(ITEMS_CHANGED, lambda item_ids: invalidate_query_cache())
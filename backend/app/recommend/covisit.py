@@ -0,0 +1,324 @@
+"""
+Item-item collaborative filtering from `Event` co-occurrence.
+
+Interactions are folded into a sparse user x item matrix `X` and the item-item
+co-occurrence `X.T @ X` is computed blockwise, keeping only the top-N
+neighbours of every item in a compact CSR matrix.
+
+The model is rebuilt by the cron job. In between, `RecentCoVisits` counts the
+co-occurrences of the events published on the bus, so fresh pairs are
+recommended within seconds.
+"""
+
+import math
+import os
+import threading
+import uuid
+from collections import Counter, OrderedDict, deque
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp
+from sqlmodel import Session
+
+from app.core.bus import EVENTS_CREATED, bus
+from app.core.config import settings
+from app.models import Event
+from app.recommend.features import ItemFeatureMatrix
+from app.recommend.interactions import Interactions
+
+_BLOCK_ROWS = 4096
+
+
+class CoVisitation:
+    """
+    Top-N co-visited neighbours of every item.
+
+    Row `i` of `neighbours` holds cosine-normalized co-occurrence scores in
+    [0, 1] of item `ids[i]` with the items indexed by the same `ids`.
+    """
+
+    def __init__(self, ids: Sequence[uuid.UUID], neighbours: sp.csr_matrix) -> None:
+        self.ids = list(ids)
+        self.positions = {item_id: i for i, item_id in enumerate(self.ids)}
+        self.neighbours = neighbours.tocsr()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_interactions(
+        cls, interactions: Interactions, top_n: int
+    ) -> "CoVisitation":
+        """
+        Build from a user x item interaction matrix. Repeated interactions of a
+        user with an item count at most once.
+        """
+        x = interactions.matrix.copy()
+        np.minimum(x.data, 1.0, out=x.data)
+        return cls(interactions.item_ids, cls._top_n_cooccurrence(x, top_n))
+
+    @staticmethod
+    def _top_n_cooccurrence(x: sp.csr_matrix, top_n: int) -> sp.csr_matrix:
+        xt = x.T.tocsr()
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        n_items = x.shape[1]
+
+        indptr = [0]
+        indices: list[npt.NDArray[np.int32]] = []
+        data: list[npt.NDArray[np.float32]] = []
+        for start in range(0, n_items, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, n_items)
+            block = (xt[start:stop] @ x).tocsr()
+            for row in range(block.shape[0]):
+                lo, hi = block.indptr[row], block.indptr[row + 1]
+                cols = block.indices[lo:hi]
+                scores = block.data[lo:hi] / (norms[start + row] * norms[cols])
+                other = (cols != start + row) & (scores > 0)
+                cols, scores = cols[other], scores[other]
+                if len(cols) > top_n:
+                    keep = np.argpartition(-scores, top_n - 1)[:top_n]
+                    cols, scores = cols[keep], scores[keep]
+                order = np.argsort(-scores, kind="stable")
+                indices.append(cols[order].astype(np.int32))
+                data.append(scores[order].astype(np.float32))
+                indptr.append(indptr[-1] + len(cols))
+
+        return sp.csr_matrix(
+            (
+                np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+                np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+                np.array(indptr, dtype=np.int64),
+            ),
+            shape=(n_items, n_items),
+        )
+
+    @classmethod
+    def from_session(cls, session: Session, top_n: int) -> "CoVisitation":
+        return cls.from_interactions(Interactions.from_session(session), top_n)
+
+    def scores(self, item_id: uuid.UUID) -> dict[uuid.UUID, float]:
+        """
+        Co-visitation neighbours of `item_id` with their scores.
+        """
+        position = self.positions.get(item_id)
+        if position is None:
+            return {}
+        lo, hi = self.neighbours.indptr[position], self.neighbours.indptr[position + 1]
+        return {
+            self.ids[j]: float(score)
+            for j, score in zip(
+                self.neighbours.indices[lo:hi],
+                self.neighbours.data[lo:hi],
+                strict=True,
+            )
+        }
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            ids=np.frombuffer(
+                b"".join(i.bytes for i in self.ids), dtype=np.uint8
+            ).reshape(-1, 16),
+            data=self.neighbours.data,
+            indices=self.neighbours.indices,
+            indptr=self.neighbours.indptr,
+        )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "CoVisitation | None":
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            ids = [uuid.UUID(bytes=row.tobytes()) for row in data["ids"]]
+            neighbours = sp.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=(len(ids), len(ids)),
+            )
+        return cls(ids, neighbours)
+
+
+class RecentCoVisits:
+    """
+    Co-occurrence counts of the events recorded since the last model load.
+
+    Each user keeps a window of the `history` items they touched last. A new
+    item is paired with those once, so repeated interactions count at most
+    once as in the model, and scored like the model with the cosine
+    `pairs / sqrt(users(a) * users(b))`. Recording an event costs
+    O(`history`).
+
+    Memory stays bounded until the next load: counts are kept for the
+    `max_items` most recently touched items, the least recently touched ones
+    are forgotten, and an item keeping more than `2 * top_n` pairs drops all
+    but its `top_n` most frequent ones.
+    """
+
+    def __init__(
+        self, history: int, max_users: int, max_items: int, top_n: int
+    ) -> None:
+        self.history = history
+        self.max_users = max_users
+        self.max_items = max_items
+        self.top_n = top_n
+        self._recent: OrderedDict[uuid.UUID, deque[uuid.UUID]] = OrderedDict()
+        self._users: Counter[uuid.UUID] = Counter()
+        self._pairs: OrderedDict[uuid.UUID, Counter[uuid.UUID]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def _counts(self, item_id: uuid.UUID) -> Counter[uuid.UUID]:
+        # called with `_lock` held
+        pairs = self._pairs.get(item_id)
+        if pairs is None:
+            pairs = self._pairs[item_id] = Counter()
+            if len(self._pairs) > self.max_items:
+                forgotten, _ = self._pairs.popitem(last=False)
+                self._users.pop(forgotten, None)
+        else:
+            self._pairs.move_to_end(item_id)
+        return pairs
+
+    def _pair(self, pairs: Counter[uuid.UUID], other: uuid.UUID) -> None:
+        # called with `_lock` held
+        pairs[other] += 1
+        if len(pairs) > 2 * self.top_n:
+            kept = pairs.most_common(self.top_n)
+            pairs.clear()
+            pairs.update(dict(kept))
+
+    def record(self, user_id: uuid.UUID, item_id: uuid.UUID) -> None:
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = self._recent[user_id] = deque(maxlen=self.history)
+                if len(self._recent) > self.max_users:
+                    self._recent.popitem(last=False)
+            else:
+                self._recent.move_to_end(user_id)
+            if item_id in recent:
+                return
+            pairs = self._counts(item_id)
+            self._users[item_id] += 1
+            for other in recent:
+                self._pair(pairs, other)
+                self._pair(self._counts(other), item_id)
+            recent.append(item_id)
+
+    def scores(self, item_id: uuid.UUID) -> dict[uuid.UUID, float]:
+        with self._lock:
+            users = self._users.get(item_id)
+            if not users:
+                return {}
+            return {
+                other: count / math.sqrt(users * self._users[other])
+                for other, count in self._pairs.get(item_id, {}).items()
+                # forgotten items have no user count
+                if self._users[other]
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self._users.clear()
+            self._pairs.clear()
+
+
+def blend(
+    matrix: ItemFeatureMatrix,
+    vector: npt.NDArray[np.float32],
+    positions: npt.NDArray[np.int64],
+    covisited: dict[uuid.UUID, float],
+    weight: float,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.floating[Any]]]:
+    """
+    Attribute neighbours `positions` of `vector` extended with the co-visited
+    items, and their `(1 - weight) * attribute + weight * co-visitation`
+    scores, where the attribute score is `1 / (1 + distance)`. Distances are
+    `exact_distances`, so the cron job and the engine score an item alike.
+    Returns candidate positions and scores, unsorted.
+    """
+    if covisited and weight > 0:
+        known = {int(i) for i in positions}
+        extra = [
+            matrix.positions[item_id]
+            for item_id in covisited
+            if item_id in matrix.positions and matrix.positions[item_id] not in known
+        ]
+        positions = np.concatenate([positions, np.array(extra, dtype=np.int64)])
+    positions = positions.astype(np.int64, copy=False)
+    distances = matrix.exact_distances(vector, positions).astype(np.float64)
+    scores = 1.0 / (1.0 + distances)
+    if covisited and weight > 0:
+        cooccurrence = np.array(
+            [covisited.get(matrix.ids[i], 0.0) for i in positions], dtype=np.float64
+        )
+        scores = (1.0 - weight) * scores + weight * cooccurrence
+    return positions, scores
+
+
+_model: CoVisitation | None = None
+_loaded_mtime: float | None = None
+_lock = threading.Lock()
+
+
+recent_covisits = RecentCoVisits(
+    settings.COVISIT_RECENT_HISTORY,
+    settings.COVISIT_RECENT_MAX_USERS,
+    settings.COVISIT_RECENT_MAX_ITEMS,
+    settings.COVISIT_TOP_N,
+)
+
+
+def get_covisitation() -> CoVisitation | None:
+    """
+    Returns the co-visitation model written by the cron job, reloading it when
+    the file changes. None when no model has been trained yet.
+    Recent co-visits are reset on reload, the new model includes them.
+    """
+    global _model, _loaded_mtime
+    path = settings.covisit_path
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if _model is None or mtime != _loaded_mtime:
+            _model = CoVisitation.load(path)
+            _loaded_mtime = mtime
+            recent_covisits.clear()
+        return _model
+
+
+def covisited_scores(item_id: uuid.UUID) -> dict[uuid.UUID, float]:
+    """
+    Co-visited items of `item_id` with their scores, from the model and the
+    events recorded since, taking the higher score of an item found in both.
+    """
+    covisitation = get_covisitation()
+    scores = covisitation.scores(item_id) if covisitation is not None else {}
+    for other, score in recent_covisits.scores(item_id).items():
+        scores[other] = max(score, scores.get(other, 0.0))
+    return scores
+
+
+def _record_covisits(events: Sequence[Event]) -> None:
+    if settings.COVISIT_RECENT_HISTORY <= 0:
+        return
+    for event in events:
+        if event.user_id is not None and event.item_id is not None:
+            recent_covisits.record(event.user_id, event.item_id)
+
+
+bus.subscribe(EVENTS_CREATED, _record_covisits)
@@ -0,0 +1,473 @@
+"""
+In-process item similarity engine.
+
+The whole catalog is kept as a normalized float32 feature matrix so that
+similar items can be scored with one vectorized distance computation instead
+of a database round trip.
+"""
+
+import logging
+import threading
+import time
+import uuid
+import warnings
+from collections.abc import Callable, Iterator, Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from sqlmodel import Session, col, select
+
+from app.core.bus import ITEMS_CHANGED, bus
+from app.core.config import settings
+from app.models import Item, ItemQuery
+from app.recommend.ann import IVFIndex, layout_signature
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FEATURES = (
+    "year",
+    "selling_price",
+    "km_driven",
+    "mileage",
+    "max_power",
+    "seats",
+)
+CATEGORICAL_FEATURES = ("fuel_type", "transmission", "owner_type")
+
+
+class ItemFeatureMatrix:
+    """
+    Normalized feature matrix of the item catalog.
+
+    Numeric features are standardized (missing values map to the column mean),
+    categorical features are one-hot encoded. Row `i` belongs to item `ids[i]`.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[uuid.UUID],
+        numeric: npt.NDArray[np.float64],
+        categorical: Sequence[Sequence[str | None]],
+    ) -> None:
+        self.ids = list(ids)
+        self.positions = {item_id: i for i, item_id in enumerate(self.ids)}
+        self.numeric = np.asarray(numeric, dtype=np.float64).reshape(
+            len(self.ids), len(NUMERIC_FEATURES)
+        )
+
+        mean: npt.NDArray[np.float64] = np.zeros(len(NUMERIC_FEATURES))
+        std: npt.NDArray[np.float64] = np.ones(len(NUMERIC_FEATURES))
+        if self.ids:
+            with warnings.catch_warnings():
+                # all-null columns produce NaN statistics, handled below
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                mean = np.nanmean(self.numeric, axis=0)
+                std = np.nanstd(self.numeric, axis=0)
+        self.mean = np.nan_to_num(mean)
+        std = np.nan_to_num(std)
+        self.std = np.where(std > 0, std, 1.0)
+
+        self.vocabularies: list[dict[str, int]] = []
+        self.codes = np.full((len(self.ids), len(CATEGORICAL_FEATURES)), -1)
+        blocks = [np.nan_to_num((self.numeric - self.mean) / self.std)]
+        for j in range(len(CATEGORICAL_FEATURES)):
+            column = [row[j] for row in categorical]
+            values = sorted({value for value in column if value is not None})
+            vocabulary = {value: i for i, value in enumerate(values)}
+            codes = np.array(
+                [-1 if v is None else vocabulary[v] for v in column], dtype=np.int64
+            )
+            one_hot = np.zeros((len(self.ids), len(vocabulary)))
+            known = codes >= 0
+            one_hot[np.flatnonzero(known), codes[known]] = 1.0
+            self.vocabularies.append(vocabulary)
+            self.codes[:, j] = codes
+            blocks.append(one_hot)
+
+        self.matrix = np.ascontiguousarray(np.hstack(blocks), dtype=np.float32)
+        self.sq_norms: npt.NDArray[np.float32] = np.einsum(
+            "ij,ij->i", self.matrix, self.matrix
+        )
+        self.index: IVFIndex | None = None
+
+    @classmethod
+    def from_session(cls, session: Session) -> "ItemFeatureMatrix":
+        """
+        Build the matrix from the `Item` table, selecting only feature columns.
+        """
+        names = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+        columns = [getattr(Item, name) for name in names]
+        rows = session.exec(select(Item.id, *columns)).all()
+        n_numeric = len(NUMERIC_FEATURES)
+        ids = [row[0] for row in rows]
+        numeric = np.array(
+            [row[1 : n_numeric + 1] for row in rows], dtype=np.float64
+        ).reshape(len(rows), n_numeric)
+        categorical = [tuple(row[n_numeric + 1 :]) for row in rows]
+        return cls(ids, numeric, categorical)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return len(NUMERIC_FEATURES) + sum(len(v) for v in self.vocabularies)
+
+    @property
+    def layout(self) -> str:
+        return layout_signature(self.vocabularies)
+
+    def _encode(
+        self, numeric: npt.NDArray[np.float64], categorical: Sequence[str | None]
+    ) -> npt.NDArray[np.float32]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        scaled = (np.asarray(numeric, dtype=np.float64) - self.mean) / self.std
+        vector[: len(NUMERIC_FEATURES)] = np.nan_to_num(scaled)
+        offset = len(NUMERIC_FEATURES)
+        for value, vocabulary in zip(categorical, self.vocabularies, strict=True):
+            if value is not None and value in vocabulary:
+                vector[offset + vocabulary[value]] = 1.0
+            offset += len(vocabulary)
+        return vector
+
+    def encode(self, values: Any) -> npt.NDArray[np.float32]:
+        """
+        Encode an object with item attributes (e.g. an `Item`) as a feature vector.
+        """
+        numeric = np.array(
+            [
+                np.nan if getattr(values, name, None) is None else getattr(values, name)
+                for name in NUMERIC_FEATURES
+            ],
+            dtype=np.float64,
+        )
+        categorical = [getattr(values, name, None) for name in CATEGORICAL_FEATURES]
+        return self._encode(numeric, categorical)
+
+    def encode_query(
+        self, query: ItemQuery
+    ) -> tuple[npt.NDArray[np.float32], npt.NDArray[np.bool_]]:
+        """
+        Turn an `ItemQuery` into a target vector and a mask of matching rows.
+
+        The target is the catalog mean clipped into the queried ranges, i.e. the
+        most typical item satisfying the query.
+        """
+        lower = np.full(len(NUMERIC_FEATURES), -np.inf)
+        upper = np.full(len(NUMERIC_FEATURES), np.inf)
+        year = NUMERIC_FEATURES.index("year")
+        price = NUMERIC_FEATURES.index("selling_price")
+        km_driven = NUMERIC_FEATURES.index("km_driven")
+        if query.min_year is not None:
+            lower[year] = query.min_year
+        if query.min_price is not None:
+            lower[price] = query.min_price
+        if query.max_price is not None:
+            upper[price] = query.max_price
+        if query.max_km_driven is not None:
+            upper[km_driven] = query.max_km_driven
+
+        constrained = np.isfinite(lower) | np.isfinite(upper)
+        with np.errstate(invalid="ignore"):
+            mask = np.asarray(
+                np.all(
+                    ~constrained | ((self.numeric >= lower) & (self.numeric <= upper)),
+                    axis=1,
+                )
+            )
+        fuel_type = CATEGORICAL_FEATURES.index("fuel_type")
+        if query.fuel_type is not None:
+            code = self.vocabularies[fuel_type].get(query.fuel_type, -2)
+            mask &= self.codes[:, fuel_type] == code
+
+        target = np.clip(self.mean, lower, upper)
+        categorical: list[str | None] = [None] * len(CATEGORICAL_FEATURES)
+        categorical[fuel_type] = query.fuel_type
+        return self._encode(target, categorical), mask
+
+    def vector(self, item_id: uuid.UUID) -> npt.NDArray[np.float32] | None:
+        position = self.positions.get(item_id)
+        return None if position is None else self.matrix[position]
+
+    def id_of(self, positions: npt.NDArray[np.int64]) -> Callable[[int], uuid.UUID]:
+        """
+        Id of the item at `positions[i]`, the `id_of` of `keyset_top_k`.
+        """
+        return lambda i: self.ids[positions[i]]
+
+    def distances(self, vector: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        """
+        Squared euclidean distances of all items to `vector`.
+        """
+        vector = vector.astype(np.float32, copy=False)
+        return self.sq_norms - 2.0 * (self.matrix @ vector) + float(vector @ vector)
+
+    def exact_distances(
+        self, vector: npt.NDArray[np.float32], positions: npt.NDArray[np.int64]
+    ) -> npt.NDArray[np.float32]:
+        """
+        Squared distances of the items at `positions` to `vector`, computed row
+        by row on those rows only. Unlike `distances` the result for an item
+        does not depend on which other rows are scored with it, which keeps
+        ranking keys reproducible from page to page.
+        """
+        diff = self.matrix[positions] - vector.astype(np.float32, copy=False)
+        distances: npt.NDArray[np.float32] = np.einsum("ij,ij->i", diff, diff)
+        return distances
+
+    def nearest(
+        self,
+        vector: npt.NDArray[np.float32],
+        k: int,
+        exclude: uuid.UUID | None = None,
+        valid: npt.NDArray[np.bool_] | None = None,
+        beyond: float = 0.0,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+        """
+        Returns positions and distances of the `k` nearest items ordered by distance.
+        Only rows where `valid` is True and at a squared distance of at least
+        `beyond` are considered, so a ranking can be continued past a page.
+        Uses the ANN index when one is attached, exact search otherwise.
+        """
+        if k <= 0 or not self.ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if exclude is not None and exclude in self.positions:
+            valid = (
+                np.ones(len(self.ids), dtype=bool) if valid is None else valid.copy()
+            )
+            valid[self.positions[exclude]] = False
+
+        if self.index is not None:
+            return self.index.search(
+                self.matrix,
+                self.sq_norms,
+                vector,
+                k,
+                n_probe=settings.ANN_N_PROBE,
+                valid=valid,
+                beyond=beyond,
+            )
+
+        distances = self.distances(vector)
+        if valid is not None:
+            distances[~valid] = np.inf
+        if beyond > 0:
+            distances[distances < beyond] = np.inf
+        k = min(k, len(distances))
+        candidates = np.argpartition(distances, k - 1)[:k]
+        order = np.lexsort((candidates, distances[candidates]))
+        top = candidates[order]
+        finite = np.isfinite(distances[top])
+        return top[finite], distances[top][finite]
+
+    def nearest_many(
+        self,
+        vectors: npt.NDArray[np.float32],
+        k: int,
+        exclude: npt.NDArray[np.int64] | None = None,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+        """
+        Batched `nearest` for the rows of `vectors`, scored against all items
+        with a single matrix product. `exclude[i]` is a position skipped for
+        query `i`, -1 for none. Returns `(neighbours, distances)` as in
+        `iter_top_k`.
+        """
+        vectors = np.atleast_2d(vectors).astype(np.float32, copy=False)
+        if self.index is not None:
+            neighbours = np.full((len(vectors), k), -1, dtype=np.int64)
+            padded = np.full((len(vectors), k), np.inf, dtype=np.float32)
+            for i, vector in enumerate(vectors):
+                valid = None
+                if exclude is not None and exclude[i] >= 0:
+                    valid = np.ones(len(self.ids), dtype=bool)
+                    valid[exclude[i]] = False
+                positions, distances = self.nearest(vector, k, valid=valid)
+                neighbours[i, : len(positions)] = positions
+                padded[i, : len(positions)] = distances
+            return neighbours, np.maximum(padded, 0.0)
+
+        distances = (
+            np.einsum("ij,ij->i", vectors, vectors)[:, None]
+            + self.sq_norms[None, :]
+            - 2.0 * (vectors @ self.matrix.T)
+        )
+        if exclude is not None:
+            queries = np.flatnonzero(exclude >= 0)
+            distances[queries, exclude[queries]] = np.inf
+        return _top_k(distances, np.arange(len(self.ids)), k)
+
+    def iter_top_k(
+        self, k: int, batch_size: int = 1024
+    ) -> Iterator[
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.float32]]
+    ]:
+        """
+        Compute the `k` nearest neighbours of every item in bulk.
+
+        Yields `(rows, neighbours, distances)` blocks where `neighbours[i]` are
+        the positions of the neighbours of row `rows[i]` ordered by distance,
+        padded with -1 when fewer than `k` exist. With an ANN index attached the
+        rows of each IVF list are scored only against the probed lists.
+        """
+        everything = np.arange(len(self.ids))
+        if self.index is None:
+            for start in range(0, len(self.ids), batch_size):
+                rows = everything[start : start + batch_size]
+                yield rows, *self._block_top_k(rows, everything, k)
+            return
+
+        for list_id in range(self.index.n_lists):
+            members = self.index.members([list_id])
+            if len(members) == 0:
+                continue
+            probed = self.index.nearest_lists(
+                self.index.centroids[list_id], settings.ANN_N_PROBE
+            )
+            candidates = self.index.members(probed)
+            for start in range(0, len(members), batch_size):
+                rows = members[start : start + batch_size]
+                yield rows, *self._block_top_k(rows, candidates, k)
+
+    def _block_top_k(
+        self, rows: npt.NDArray[np.int64], candidates: npt.NDArray[np.int64], k: int
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+        distances = (
+            self.sq_norms[rows][:, None]
+            + self.sq_norms[candidates][None, :]
+            - 2.0 * (self.matrix[rows] @ self.matrix[candidates].T)
+        )
+        distances[candidates[None, :] == rows[:, None]] = np.inf
+        return _top_k(distances, candidates, k)
+
+
+def _top_k(
+    distances: npt.NDArray[np.float32], candidates: npt.NDArray[np.int64], k: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]:
+    """
+    Row-wise `k` smallest of `distances` against `candidates`, ordered by
+    distance and padded with -1 / inf.
+    """
+    neighbours = np.full((len(distances), k), -1, dtype=np.int64)
+    padded = np.full((len(distances), k), np.inf, dtype=np.float32)
+    kk = min(k, len(candidates))
+    if kk <= 0:
+        return neighbours, padded
+    top = np.argpartition(distances, kk - 1, axis=1)[:, :kk]
+    top_distances = np.take_along_axis(distances, top, axis=1)
+    order = np.argsort(top_distances, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_distances = np.take_along_axis(top_distances, order, axis=1)
+
+    neighbours[:, :kk] = np.where(np.isfinite(top_distances), candidates[top], -1)
+    padded[:, :kk] = top_distances
+    return neighbours, np.maximum(padded, 0.0)
+
+
+def build_index(matrix: ItemFeatureMatrix) -> IVFIndex:
+    """
+    Train a fresh ANN index over `matrix` using the configured knobs.
+    """
+    return IVFIndex.train(matrix.matrix, n_lists=settings.ANN_N_LISTS)
+
+
+def attach_index(matrix: ItemFeatureMatrix) -> None:
+    """
+    Attach the ANN index persisted by the cron job to large matrices. Small
+    catalogs, and large ones until the cron job saved an index, use exact
+    search: training is too slow for the request path.
+    """
+    if len(matrix) < settings.ANN_MIN_ITEMS:
+        return
+    matrix.index = IVFIndex.load(
+        settings.ann_index_path, matrix.ids, matrix.matrix, matrix.layout
+    )
+    if matrix.index is None:
+        logger.warning(
+            f"No item index at '{settings.ann_index_path}', "
+            f"searching {len(matrix)} items exactly"
+        )
+
+
+_matrix: ItemFeatureMatrix | None = None
+_built_at = 0.0
+# bumped by item writes, the matrix is stale while it lags behind
+_generation = 0
+_matrix_generation = 0
+_lock = threading.Lock()
+# held by the thread rebuilding the matrix
+_build_lock = threading.Lock()
+
+
+def _rebuild_due(now: float) -> bool:
+    # called with `_lock` held
+    age = now - _built_at
+    stale = _matrix_generation != _generation
+    return (
+        _matrix is None
+        or age > settings.SIMILARITY_ENGINE_TTL_SECONDS
+        or (stale and age >= settings.SIMILARITY_ENGINE_REBUILD_SECONDS)
+    )
+
+
+def get_feature_matrix(session: Session) -> ItemFeatureMatrix:
+    """
+    Returns the process-wide feature matrix, rebuilding it when it is older than
+    `SIMILARITY_ENGINE_TTL_SECONDS`, or items changed and it is older than
+    `SIMILARITY_ENGINE_REBUILD_SECONDS`, so a burst of writes costs one rebuild.
+    One request rebuilds the matrix while the others keep using the current one.
+    """
+    global _matrix, _built_at, _matrix_generation
+    with _lock:
+        current = _matrix
+        if current is not None and not _rebuild_due(time.monotonic()):
+            return current
+    if not _build_lock.acquire(blocking=current is None):
+        assert current is not None
+        return current
+    try:
+        with _lock:
+            if _matrix is not None and not _rebuild_due(time.monotonic()):
+                return _matrix
+            generation = _generation
+        matrix = ItemFeatureMatrix.from_session(session)
+        attach_index(matrix)
+        with _lock:
+            _matrix = matrix
+            _built_at = time.monotonic()
+            _matrix_generation = generation
+        return matrix
+    finally:
+        _build_lock.release()
+
+
+def mark_feature_matrix_stale() -> None:
+    """
+    Record an item write, the matrix is rebuilt once the debounce allows it.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def feature_matrix_stale() -> bool:
+    """
+    Whether items were written since the current matrix was built, rankings
+    computed until it is rebuilt may be outdated.
+    """
+    with _lock:
+        return _matrix is not None and _matrix_generation != _generation
+
+
+bus.subscribe(ITEMS_CHANGED, lambda item_ids: mark_feature_matrix_stale())
+
+
+def load_items(session: Session, ids: Sequence[uuid.UUID]) -> list[Item]:
+    """
+    Fetch items by primary key preserving the order of `ids`.
+    """
+    if not ids:
+        return []
+    items = session.exec(select(Item).where(col(Item.id).in_(ids))).all()
+    by_id = {item.id: item for item in items}
+    return [by_id[item_id] for item_id in ids if item_id in by_id]
@@ -0,0 +1,115 @@
+"""
+User x item interaction matrix shared by the collaborative recommenders.
+"""
+
+import time
+import uuid
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse as sp
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.recommend.user_item_daily import user_item_counts
+
+
+@dataclass
+class Interactions:
+    """
+    Sparse user x item matrix of recency- and event-type-weighted interaction
+    counts.
+    Row `u` belongs to `user_ids[u]`, column `i` to `item_ids[i]`.
+    """
+
+    user_ids: list[uuid.UUID]
+    item_ids: list[uuid.UUID]
+    matrix: sp.csr_matrix
+
+    @classmethod
+    def from_session(
+        cls, session: Session, chunk_size: int = 100_000
+    ) -> "Interactions":
+        """
+        Stream `(user_id, item_id, time, weight)` rows of the daily interaction
+        rollup and the events not compacted yet in chunks.
+        Older interactions are down-weighted with `INTERACTION_HALF_LIFE_DAYS`,
+        repeated ones are summed.
+        """
+        counts = user_item_counts()
+        statement = select(
+            counts.c.user_id, counts.c.item_id, counts.c.epoch, counts.c.weight
+        ).execution_options(yield_per=chunk_size)
+        users: dict[uuid.UUID, int] = {}
+        items: dict[uuid.UUID, int] = {}
+        now = time.time()
+        half_life = settings.INTERACTION_HALF_LIFE_DAYS * 86400.0
+
+        def chunks() -> (
+            Iterator[
+                tuple[
+                    npt.NDArray[np.int64],
+                    npt.NDArray[np.int64],
+                    npt.NDArray[np.floating[Any]],
+                ]
+            ]
+        ):
+            for partition in session.exec(statement).partitions():
+                user_codes = np.array(
+                    [users.setdefault(row[0], len(users)) for row in partition]
+                )
+                item_codes = np.array(
+                    [items.setdefault(row[1], len(items)) for row in partition]
+                )
+                epochs = np.array([row[2] for row in partition], dtype=float)
+                weights = np.array([row[3] for row in partition], dtype=float)
+                age = np.maximum(now - epochs, 0.0)
+                yield _sum_pairs(
+                    user_codes, item_codes, weights * np.exp2(-age / half_life)
+                )
+
+        # codes are assigned while streaming, so the matrix is built afterwards
+        collected = list(chunks())
+        return cls.from_arrays(
+            np.concatenate([c[0] for c in collected] or [np.zeros(0, np.int64)]),
+            np.concatenate([c[1] for c in collected] or [np.zeros(0, np.int64)]),
+            np.concatenate([c[2] for c in collected] or [np.zeros(0)]),
+            list(users),
+            list(items),
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        users: npt.NDArray[np.int64],
+        items: npt.NDArray[np.int64],
+        weights: npt.NDArray[np.floating[Any]],
+        user_ids: list[uuid.UUID],
+        item_ids: list[uuid.UUID],
+    ) -> "Interactions":
+        matrix = sp.csr_matrix(
+            (np.asarray(weights, dtype=np.float32), (users, items)),
+            shape=(len(user_ids), len(item_ids)),
+        )
+        matrix.sum_duplicates()
+        return cls(user_ids, item_ids, matrix)
+
+
+def _sum_pairs(
+    users: npt.NDArray[np.int64],
+    items: npt.NDArray[np.int64],
+    weights: npt.NDArray[np.floating[Any]],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.floating[Any]]]:
+    """
+    Sum repeated (user, item) pairs so memory grows with unique pairs, not events.
+    """
+    if len(users) == 0:
+        return users, items, weights
+    pairs, inverse = np.unique(
+        np.stack([users, items], axis=1), axis=0, return_inverse=True
+    )
+    summed = np.bincount(inverse.ravel(), weights=weights, minlength=len(pairs))
+    return pairs[:, 0], pairs[:, 1], summed.astype(np.float32)
@@ -0,0 +1,147 @@
+"""
+Item popularity rollup maintained incrementally from new events.
+
+Scores use forward exponential decay: an event at time `t` contributes
+`exp(t * ln 2 / half_life)`, so stored scores never have to be decayed as
+time passes and ordering items by score is ordering them by their decayed
+event count at any moment. Scores are kept in log space to stay finite.
+"""
+
+import math
+import uuid
+from collections.abc import Collection
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import Float, cast, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.models import Event, ItemPopularity, RollupWatermark
+
+ROLLUP_NAME = "item_popularity"
+
+
+def lock_watermark(
+    session: Session, name: str, wait: bool = True
+) -> RollupWatermark | None:
+    """
+    Lock the watermark row of rollup `name`, creating it on first use.
+    Returns None when `wait` is False and another transaction holds the lock.
+    """
+    session.exec(insert(RollupWatermark).values(name=name).on_conflict_do_nothing())  # type: ignore
+    statement = (
+        select(RollupWatermark)
+        .where(RollupWatermark.name == name)
+        .with_for_update(skip_locked=not wait)
+        .execution_options(populate_existing=True)
+    )
+    return session.exec(statement).first()
+
+
+def _fold(session: Session, *conditions: Any) -> int:
+    """
+    Add the events with an item matching `conditions` to `item_popularity`.
+    Returns the number of updated items.
+    """
+    rate = math.log(2) / (settings.POPULARITY_HALF_LIFE_DAYS * 86400.0)
+    new = select(
+        Event.item_id,
+        Event.timestamp,
+        (cast(func.extract("epoch", col(Event.timestamp)), Float) * rate).label("x"),
+    ).where(col(Event.item_id).is_not(None), *conditions)
+    events = new.subquery()
+    peak = (
+        select(events.c.item_id, func.max(events.c.x).label("peak"))
+        .group_by(events.c.item_id)
+        .subquery()
+    )
+    # log-sum-exp shifted by the per-item maximum
+    batch = (
+        select(
+            events.c.item_id,
+            func.count().label("event_count"),
+            (peak.c.peak + func.ln(func.sum(func.exp(events.c.x - peak.c.peak)))).label(
+                "score"
+            ),
+            func.max(events.c.timestamp).label("last_event_at"),
+        )
+        .join(peak, peak.c.item_id == events.c.item_id)
+        .group_by(events.c.item_id, peak.c.peak)
+    )
+    statement = insert(ItemPopularity).from_select(
+        ["item_id", "event_count", "score", "last_event_at"], batch
+    )
+    current, added = col(ItemPopularity.score), statement.excluded.score
+    statement = statement.on_conflict_do_update(
+        index_elements=[col(ItemPopularity.item_id)],
+        set_={
+            "event_count": col(ItemPopularity.event_count)
+            + statement.excluded.event_count,
+            "score": func.greatest(current, added)
+            + func.ln(1.0 + func.exp(-func.abs(current - added))),
+            "last_event_at": func.greatest(
+                col(ItemPopularity.last_event_at), statement.excluded.last_event_at
+            ),
+        },
+    )
+    return session.exec(statement).rowcount  # type: ignore
+
+
+def refresh_item_popularity(
+    session: Session,
+    until: datetime | None = None,
+    wait: bool = True,
+    rebuild: bool = False,
+) -> int:
+    """
+    Fold events newer than the watermark and not newer than `until` into
+    `item_popularity` and advance the watermark. `until` defaults to
+    `ROLLUP_LAG_SECONDS` ago so that events of still open transactions are
+    not skipped. `rebuild` starts over from the full event history, needed
+    after changing `POPULARITY_HALF_LIFE_DAYS`.
+    Returns the number of updated items, 0 when the rollup is being refreshed
+    by another transaction and `wait` is False.
+    """
+    watermark = lock_watermark(session, ROLLUP_NAME, wait=wait)
+    if watermark is None:
+        return 0
+    if rebuild:
+        session.exec(delete(ItemPopularity))  # type: ignore
+        watermark.watermark = None
+    if until is None:
+        now = session.exec(select(func.now())).one()
+        until = now - timedelta(seconds=settings.ROLLUP_LAG_SECONDS)
+    if watermark.watermark is not None and until <= watermark.watermark:
+        # never move back, events up to the watermark are already counted
+        session.commit()
+        return 0
+
+    conditions = [col(Event.timestamp) <= until]
+    if watermark.watermark is not None:
+        conditions.append(col(Event.timestamp) > watermark.watermark)
+    updated = _fold(session, *conditions)
+    watermark.watermark = until
+    session.add(watermark)
+    session.commit()
+    return updated
+
+
+def fold_late_item_popularity(session: Session, ids: Collection[uuid.UUID]) -> int:
+    """
+    Fold the events `ids` the watermark already passed into `item_popularity`,
+    for events stored late such as those replayed from the journal, which a
+    refresh never reads again. Must run in the transaction storing the events:
+    the watermark stays locked until it commits, so a concurrent refresh
+    either counts the events itself or finds them folded.
+    Returns the number of updated items.
+    """
+    watermark = lock_watermark(session, ROLLUP_NAME)
+    if watermark is None or watermark.watermark is None:
+        return 0
+    return _fold(
+        session,
+        col(Event.id).in_(ids),
+        col(Event.timestamp) <= watermark.watermark,
+    )
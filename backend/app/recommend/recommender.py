@@ -1,68 +1,622 @@
 """
-This module should use ML to recommend similar items.
-TODO - implement me, currently it is just mock
+Item recommendations served by the API.
+
+Similar items start with the neighbours the cron job precomputed into
+`item_similarity`, then go on with the in-process feature matrix, searched
+exactly or through its IVF index on large catalogs, blended with item-item
+co-visitation. Without the engine the ranking falls back to SQL. Popular
+items are read from the `item_popularity` rollup or, per user, from the
+`user_item_daily` rollup, trending items from in-process counters, and
+personalized recommendations from the memory-mapped ALS factors.
 """
 
 import uuid
-from typing import Sequence
+from dataclasses import replace
+from typing import Any, Sequence
 
-from sqlalchemy.sql import func
-from sqlmodel import Session, select
-from app.models import Item, ItemQuery, Event
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy.orm import Mapped
+from sqlalchemy.sql import ColumnElement, and_, func, or_
+from sqlmodel import Session, col, select
+from app.core.config import settings
+from app.core.pagination import Cursor, Page, keyset_top_k, next_cursor
+from app.models import Item, ItemPopularity, ItemQuery, ItemSimilarity
+from app.recommend.als import get_als_model
+from app.recommend.cache import similar_query_cache, similar_query_key
+from app.recommend.covisit import (
+    blend,
+    covisited_scores,
+    get_covisitation,
+    recent_covisits,
+)
+from app.recommend.features import (
+    ItemFeatureMatrix,
+    feature_matrix_stale,
+    get_feature_matrix,
+    load_items,
+)
+from app.recommend.trending import TrendingWindow, get_trending_counters
+from app.recommend.user_item_daily import user_item_counts
 
 
 def find_most_popular_items(
-    session: Session, limit: int = 10, offset: int = 0, user_id: uuid.UUID | None = None
-) -> Sequence[Item]:
+    session: Session,
+    limit: int = 10,
+    offset: int = 0,
+    user_id: uuid.UUID | None = None,
+    cursor: Cursor | None = None,
+) -> Page[Item]:
     """
-    Returns top `limit` most popular items from offset `offset`.
+    Returns top `limit` most popular items from offset `offset`, or after
+    `cursor` whose key is the negated popularity.
     If `user_id` is defined personalize the selection.
     """
+    popularity: ColumnElement[float] | Mapped[float]
     if user_id is None:
-        subquery = (
-            select(Event.item_id, func.count(Event.id).label("popularity"))
-            .group_by(Event.item_id)
-            .subquery()
+        # pre-aggregated by app/recommend/popularity.py, refreshed in the
+        # background by app/recommend/refresh.py
+        popularity = col(ItemPopularity.score)
+        statement = select(Item, popularity).join(
+            ItemPopularity, col(ItemPopularity.item_id) == Item.id
         )
+        if cursor is not None:
+            statement = statement.where(
+                or_(
+                    popularity < -cursor.key,
+                    and_(popularity == -cursor.key, col(Item.id) > cursor.id),
+                )
+            )
     else:
+        # compacted by app/recommend/user_item_daily.py
+        counts = user_item_counts()
+        count = func.sum(counts.c.weight)
         subquery = (
-            select(Event.item_id, func.count(Event.id).label("popularity"))
-            .where(Event.user_id == user_id)
-            .group_by(Event.item_id)
-            .subquery()
+            select(counts.c.item_id, count.label("popularity"))
+            .where(counts.c.user_id == user_id)
+            .group_by(counts.c.item_id)
         )
+        if cursor is not None:
+            subquery = subquery.having(
+                or_(
+                    count < -cursor.key,
+                    and_(count == -cursor.key, counts.c.item_id > cursor.id),
+                )
+            )
+        ranked = subquery.subquery()
+        popularity = ranked.c.popularity
+        statement = select(Item, popularity).join(ranked, ranked.c.item_id == Item.id)
 
-    statement = (
-        select(Item)
-        .join(subquery, subquery.c.item_id == Item.id)
-        .order_by(subquery.c.popularity.desc())
-        .offset(offset)
-        .limit(limit)
+    statement = statement.order_by(popularity.desc(), col(Item.id))
+    if cursor is None:
+        statement = statement.offset(offset)
+    rows = session.exec(statement.limit(limit)).all()
+    results = [item for item, _ in rows]
+    page = Page(
+        results,
+        next_cursor(
+            [item.id for item in results], [-float(score) for _, score in rows], limit
+        ),
     )
 
-    results = session.exec(statement).all()
+    if len(results) < limit and cursor is None:
+        fill = select(Item).limit(limit - len(results))
+        page.items = [*results, *session.exec(fill).all()]
+
+    return page
+
 
-    if len(results) < limit:
-        statement = select(Item).limit(limit - len(results))
-        results = [*results, *session.exec(statement).all()]
+def find_trending_items(
+    session: Session,
+    window: TrendingWindow,
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Cursor | None = None,
+) -> Page[Item]:
+    """
+    Returns top `limit` items with the most events within the last `window`
+    from offset `offset`, or after `cursor` whose key is the negated count.
+    """
+    ranked = get_trending_counters(session).ranked(
+        window, limit if cursor is not None else offset + limit, after=cursor
+    )
+    if cursor is None:
+        ranked = ranked[offset:]
+    return _load_page(
+        session, [item_id for item_id, _ in ranked], [-c for _, c in ranked], limit
+    )
 
+
+def find_recommended_items(
+    session: Session,
+    user_id: uuid.UUID,
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Cursor | None = None,
+) -> Page[Item]:
+    """
+    Returns top `limit` items personalized for user `user_id` from offset
+    `offset`, or after `cursor`, using the ALS model, falling back to the
+    user's most popular items for users unknown to the model.
+    """
+    model = get_als_model()
+    if model is not None:
+        ranked = model.ranked(
+            user_id, limit if cursor is not None else offset + limit, after=cursor
+        )
+        if ranked is not None:
+            if cursor is None:
+                ranked = ranked[offset:]
+            return _load_page(
+                session,
+                [item_id for item_id, _ in ranked],
+                [-score for _, score in ranked],
+                limit,
+            )
+    return find_most_popular_items(
+        session, limit=limit, offset=offset, user_id=user_id, cursor=cursor
+    )
+
+
+def find_recommended_items_batch(
+    session: Session, user_ids: Sequence[uuid.UUID], limit: int = 10, offset: int = 0
+) -> dict[uuid.UUID, list[Item]]:
+    """
+    `find_recommended_items` for many users at once: users known to the ALS
+    model are scored with one matrix product, the others fall back to their
+    most popular items read with one query.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    model = get_als_model()
+    recommended = (
+        model.recommend_many(user_ids, offset + limit) if model is not None else {}
+    )
+    recommended = {user_id: ids[offset:] for user_id, ids in recommended.items()}
+    loaded = {
+        item.id: item
+        for item in load_items(
+            session, list({i for ids in recommended.values() for i in ids})
+        )
+    }
+    results = {
+        user_id: [loaded[i] for i in ids if i in loaded]
+        for user_id, ids in recommended.items()
+    }
+    fallback = [user_id for user_id in user_ids if user_id not in results]
+    if fallback:
+        results.update(
+            _most_popular_items_by_user(session, fallback, limit=limit, offset=offset)
+        )
+    return {user_id: results[user_id] for user_id in user_ids}
+
+
+def _most_popular_items_by_user(
+    session: Session, user_ids: Sequence[uuid.UUID], limit: int, offset: int
+) -> dict[uuid.UUID, list[Item]]:
+    """
+    Per-user branch of `find_most_popular_items` for many users in one query.
+    """
+    counts = user_item_counts()
+    popularity = func.sum(counts.c.weight)
+    ranked = (
+        select(
+            counts.c.user_id,
+            counts.c.item_id,
+            func.row_number()
+            .over(
+                partition_by=counts.c.user_id,
+                order_by=(popularity.desc(), counts.c.item_id),
+            )
+            .label("rank"),
+        )
+        .where(counts.c.user_id.in_(user_ids))
+        .group_by(counts.c.user_id, counts.c.item_id)
+        .subquery()
+    )
+    statement = (
+        select(ranked.c.user_id, Item)
+        .join(ranked, ranked.c.item_id == Item.id)
+        .where(ranked.c.rank > offset, ranked.c.rank <= offset + limit)
+        .order_by(ranked.c.user_id, ranked.c.rank)
+    )
+    results: dict[uuid.UUID, list[Item]] = {user_id: [] for user_id in user_ids}
+    for user_id, item in session.exec(statement).all():
+        results[user_id].append(item)
+
+    if any(len(items) < limit for items in results.values()):
+        filler = session.exec(select(Item).limit(limit)).all()
+        for items in results.values():
+            items.extend(filler[: limit - len(items)])
     return results
 
 
+# Sources of the similar items listing, recorded in its cursors: the
+# precomputed neighbours, the ranked items after them, or the ranked items
+# only for items with recent co-visits
+_PRECOMPUTED = 0
+_AFTER_PRECOMPUTED = 1
+_RANKED = 2
+# relative and absolute slack of the float32 distances items are searched by
+_DISTANCE_SLACK = 1e-3
+
+
+def _recently_covisited(item_id: uuid.UUID) -> bool:
+    """
+    Whether events recorded since the co-visitation model was loaded paired
+    `item_id` with other items, which its precomputed neighbours miss.
+    """
+    if not settings.SIMILARITY_ENGINE_ENABLED or settings.COVISIT_WEIGHT <= 0:
+        return False
+    # clears the recent co-visits when a new model is found
+    get_covisitation()
+    return bool(recent_covisits.scores(item_id))
+
+
+def _precomputed_ids(session: Session, item_id: uuid.UUID) -> set[uuid.UUID]:
+    statement = select(ItemSimilarity.neighbour_id).where(
+        ItemSimilarity.item_id == item_id
+    )
+    return set(session.exec(statement).all())
+
+
 def find_similar_items(
     session: Session,
     item_id: uuid.UUID,
     limit: int = 10,
     offset: int = 0,
-    user_id: uuid.UUID | None = None,
-) -> Sequence[Item]:
+    cursor: Cursor | None = None,
+) -> Page[Item]:
     """
-    Returns top `limit` most similar items to item `item_id` from offset `offset`.
-    If `user_id` is defined personalize the selection.
+    Returns top `limit` most similar items to item `item_id` from offset
+    `offset`, or after `cursor` whose key is the negated similarity score.
+
+    The listing starts with the neighbours precomputed by the cron job and
+    goes on with the other items ranked by the in-process engine, or the SQL
+    fallback. The two rankings score differently, so cursors record which one
+    their page ended in and pages never skip or repeat items across them.
+    Items co-visited since the last model load are ranked by the engine from
+    the first page on, so the recent co-visits count.
+    """
+    if (cursor is None and _recently_covisited(item_id)) or (
+        cursor is not None and cursor.source == _RANKED
+    ):
+        return _rank_similar_items(
+            session, item_id, limit, offset, cursor, exclude=set(), source=_RANKED
+        )
+    if cursor is None or cursor.source == _PRECOMPUTED:
+        # a single indexed range read
+        score = col(ItemSimilarity.score)
+        statement = (
+            select(Item, score)
+            .join(ItemSimilarity, col(ItemSimilarity.neighbour_id) == Item.id)
+            .where(ItemSimilarity.item_id == item_id)
+        )
+        if cursor is None:
+            statement = statement.order_by(col(ItemSimilarity.rank)).offset(offset)
+        else:
+            statement = statement.where(
+                or_(
+                    score < -cursor.key,
+                    and_(score == -cursor.key, col(Item.id) > cursor.id),
+                )
+            ).order_by(score.desc(), col(Item.id))
+        rows = session.exec(statement.limit(limit)).all()
+        results = [item for item, _ in rows]
+        if len(rows) == limit:
+            return Page(
+                results,
+                next_cursor(
+                    [item.id for item in results], [-float(s) for _, s in rows], limit
+                ),
+            )
+        # the precomputed neighbours are exhausted, the ranking goes on
+        precomputed = _precomputed_ids(session, item_id)
+        rest = _rank_similar_items(
+            session,
+            item_id,
+            limit=limit - len(results),
+            offset=max(0, offset - len(precomputed)) if cursor is None else 0,
+            cursor=None,
+            exclude=precomputed,
+            source=_AFTER_PRECOMPUTED,
+        )
+        return Page([*results, *rest.items], rest.next_cursor)
+
+    return _rank_similar_items(
+        session,
+        item_id,
+        limit=limit,
+        offset=0,
+        cursor=cursor,
+        exclude=_precomputed_ids(session, item_id),
+        source=_AFTER_PRECOMPUTED,
+    )
+
+
+def _rank_similar_items(
+    session: Session,
+    item_id: uuid.UUID,
+    limit: int,
+    offset: int,
+    cursor: Cursor | None,
+    exclude: set[uuid.UUID],
+    source: int,
+) -> Page[Item]:
+    """
+    `find_similar_items` ranked by the engine or the SQL fallback, skipping
+    the items `exclude`. The cursor of the page has the source `source`.
+    """
+    if not settings.SIMILARITY_ENGINE_ENABLED:
+        page = _find_similar_items_sql(
+            session, item_id, limit=limit, offset=offset, cursor=cursor, exclude=exclude
+        )
+    else:
+        page = _engine_similar_items(session, item_id, limit, offset, cursor, exclude)
+    if page.next_cursor is not None:
+        page.next_cursor = replace(page.next_cursor, source=source)
+    return page
+
+
+def _engine_similar_items(
+    session: Session,
+    item_id: uuid.UUID,
+    limit: int,
+    offset: int,
+    cursor: Cursor | None,
+    exclude: set[uuid.UUID],
+) -> Page[Item]:
+    matrix = get_feature_matrix(session)
+    vector = matrix.vector(item_id)
+    if vector is None:
+        # item created after the matrix was built
+        item = session.get(Item, item_id)
+        if item is None:
+            return Page()
+        vector = matrix.encode(item)
+
+    covisited = {
+        i: score for i, score in _covisited(item_id).items() if i not in exclude
+    }
+    candidates, keys, top = _ranked_page(
+        matrix,
+        vector,
+        _valid(matrix, exclude | {item_id}),
+        covisited,
+        limit,
+        offset,
+        cursor,
+    )
+    return _load_page(
+        session, [matrix.ids[i] for i in candidates[top]], keys[top], limit
+    )
+
+
+def _ranked_page(
+    matrix: ItemFeatureMatrix,
+    vector: npt.NDArray[np.float32],
+    valid: npt.NDArray[np.bool_],
+    covisited: dict[uuid.UUID, float],
+    limit: int,
+    offset: int,
+    cursor: Cursor | None,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.floating[Any]], npt.NDArray[np.int64]]:
+    """
+    Candidates and keys of a page ranked by `_similarity_keys`, with the
+    indices of the page items in them. A page after `cursor` is searched
+    among the items at least as far as the cursor, with the ANN index when
+    one is attached. More are searched while items tied with or before the
+    end of the page could be missing from the search.
+    """
+    beyond = 0.0 if cursor is None else _cursor_distance(cursor, covisited)
+    skip = offset if cursor is None else 0
+    k = 2 * (skip + limit)
+    while True:
+        positions, _ = matrix.nearest(vector, k, valid=valid, beyond=beyond)
+        candidates, keys = _similarity_keys(matrix, vector, positions, covisited)
+        top = keyset_top_k(keys, matrix.id_of(candidates), skip + limit, cursor)
+        if len(positions) < k or _settled(keys, top, len(positions), skip + limit):
+            return candidates, keys, top[skip:]
+        k *= 2
+
+
+def _settled(
+    keys: npt.NDArray[np.floating[Any]],
+    top: npt.NDArray[np.int64],
+    searched: int,
+    count: int,
+) -> bool:
+    """
+    Whether the page `top` of `count` items is final although only the first
+    `searched` candidates were searched for: items not searched are further
+    away, they rank after the farthest searched one.
+    """
+    return len(top) == count and searched > 0 and keys[top[-1]] < keys[:searched].max()
+
+
+def _valid(matrix: ItemFeatureMatrix, exclude: set[uuid.UUID]) -> npt.NDArray[np.bool_]:
+    """
+    Mask of the rows of `matrix` not in `exclude`.
+    """
+    valid = np.ones(len(matrix), dtype=bool)
+    valid[[matrix.positions[i] for i in exclude if i in matrix.positions]] = False
+    return valid
+
+
+def _cursor_distance(cursor: Cursor, covisited: dict[uuid.UUID, float]) -> float:
+    """
+    Squared distance below which no item without co-visits ranks after
+    `cursor`, inverting `_similarity_keys` with some slack for rounding.
+    """
+    weight = settings.COVISIT_WEIGHT if covisited else 0.0
+    score = -cursor.key / (1.0 - weight) if weight < 1.0 else 0.0
+    if score <= 0.0:
+        return 0.0
+    return max(0.0, (1.0 / score - 1.0) * (1.0 - _DISTANCE_SLACK) - _DISTANCE_SLACK)
+
+
+def find_similar_items_batch(
+    session: Session,
+    item_ids: Sequence[uuid.UUID],
+    limit: int = 10,
+    offset: int = 0,
+) -> dict[uuid.UUID, list[Item]]:
+    """
+    `find_similar_items` for many items at once: precomputed neighbours are
+    read with one query and the items they do not fill are scored together.
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    # items with recent co-visits are ranked from the first item on
+    tabled = [i for i in item_ids if not _recently_covisited(i)]
+    statement = (
+        select(ItemSimilarity.item_id, ItemSimilarity.neighbour_id)
+        .where(col(ItemSimilarity.item_id).in_(tabled))
+        .order_by(col(ItemSimilarity.item_id), col(ItemSimilarity.rank))
+    )
+    precomputed: dict[uuid.UUID, list[uuid.UUID]] = {i: [] for i in item_ids}
+    for anchor, neighbour in session.exec(statement).all():
+        precomputed[anchor].append(neighbour)
+    neighbours = {i: ids[offset : offset + limit] for i, ids in precomputed.items()}
+    # ranked items completing the pages, from `offset - len(precomputed)`
+    missing = {
+        i: max(0, offset - len(precomputed[i]))
+        for i in item_ids
+        if len(neighbours[i]) < limit
+    }
+
+    ranked: dict[uuid.UUID, list[uuid.UUID]] = {}
+    if missing and not settings.SIMILARITY_ENGINE_ENABLED:
+        for item_id, start in missing.items():
+            page = _find_similar_items_sql(
+                session,
+                item_id,
+                limit=limit - len(neighbours[item_id]),
+                offset=start,
+                exclude=set(precomputed[item_id]),
+            )
+            ranked[item_id] = [item.id for item in page.items]
+    elif missing:
+        matrix = get_feature_matrix(session)
+        # items created after the matrix was built
+        created = {
+            item.id: matrix.encode(item)
+            for item in load_items(
+                session, [i for i in missing if i not in matrix.positions]
+            )
+        }
+        anchors = [i for i in missing if i in matrix.positions or i in created]
+        if anchors:
+            vectors = np.stack(
+                [
+                    matrix.matrix[matrix.positions[i]]
+                    if i in matrix.positions
+                    else created[i]
+                    for i in anchors
+                ]
+            )
+            exclude = np.array([matrix.positions.get(i, -1) for i in anchors])
+            # enough neighbours to fill every page once the precomputed
+            # ones are skipped
+            k = max(offset + limit + len(precomputed[i]) for i in anchors)
+            rows, _ = matrix.nearest_many(vectors, k, exclude)
+            for item_id, vector, row in zip(anchors, vectors, rows, strict=True):
+                skipped = set(precomputed[item_id])
+                covisited = {
+                    i: score
+                    for i, score in _covisited(item_id).items()
+                    if i not in skipped
+                }
+                found = row[row >= 0]
+                row = np.array(
+                    [i for i in found if matrix.ids[i] not in skipped],
+                    dtype=np.int64,
+                )
+                candidates, keys = _similarity_keys(matrix, vector, row, covisited)
+                start = missing[item_id]
+                count = start + limit - len(neighbours[item_id])
+                top = keyset_top_k(keys, matrix.id_of(candidates), count)
+                if len(found) == k and not _settled(keys, top, len(row), count):
+                    # ties at the end of the page, searched on like a single page
+                    candidates, keys, top = _ranked_page(
+                        matrix,
+                        vector,
+                        _valid(matrix, skipped | {item_id}),
+                        covisited,
+                        count - start,
+                        start,
+                        None,
+                    )
+                    start = 0
+                ranked[item_id] = [matrix.ids[i] for i in candidates[top[start:]]]
+
+    pages = {
+        item_id: [*neighbours[item_id], *ranked.get(item_id, [])]
+        for item_id in item_ids
+    }
+    loaded = {
+        item.id: item
+        for item in load_items(
+            session, list({i for ids in pages.values() for i in ids})
+        )
+    }
+    return {
+        item_id: [loaded[i] for i in ids if i in loaded]
+        for item_id, ids in pages.items()
+    }
+
+
+def _covisited(item_id: uuid.UUID) -> dict[uuid.UUID, float]:
+    """
+    Co-visited items of `item_id` with their scores, empty when
+    co-visitation is disabled.
+    """
+    if settings.COVISIT_WEIGHT <= 0:
+        return {}
+    return covisited_scores(item_id)
+
+
+def _similarity_keys(
+    matrix: ItemFeatureMatrix,
+    vector: npt.NDArray[np.float32],
+    positions: npt.NDArray[np.int64],
+    covisited: dict[uuid.UUID, float],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.floating[Any]]]:
+    """
+    Attribute neighbours `positions` extended with the co-visited items, and
+    their sort keys: the negated `blend` scores the cron job ranks by too.
+    """
+    candidates, scores = blend(
+        matrix, vector, positions, covisited, settings.COVISIT_WEIGHT
+    )
+    return candidates, -scores
+
+
+def _load_page(
+    session: Session,
+    ids: Sequence[uuid.UUID],
+    keys: Sequence[float] | npt.NDArray[np.floating[Any]],
+    limit: int,
+) -> Page[Item]:
+    """
+    Page of the ranked `ids` with the cursor after the last of them.
+    """
+    return Page(load_items(session, ids), next_cursor(ids, keys, limit))
+
+
+def _find_similar_items_sql(
+    session: Session,
+    item_id: uuid.UUID,
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Cursor | None = None,
+    exclude: set[uuid.UUID] | None = None,
+) -> Page[Item]:
+    """
+    Unranked fallback used when the in-process engine is disabled, skipping
+    the items `exclude`.
     """
     item = session.get(Item, item_id)
     if item is None:
-        return []
+        return Page()
 
     query = ItemQuery(
         min_year=item.year,
@@ -71,9 +625,11 @@ def find_similar_items(
         max_km_driven=item.km_driven,
         fuel_type=item.fuel_type,
     )
-    return find_similar_query(
-        session, query, limit=limit, offset=offset, user_id=user_id
-    )
+    if exclude:
+        return _find_similar_query(
+            session, query, limit=limit, offset=offset, cursor=cursor, exclude=exclude
+        )
+    return find_similar_query(session, query, limit=limit, offset=offset, cursor=cursor)
 
 
 def find_similar_query(
@@ -81,25 +637,81 @@ def find_similar_query(
     query: ItemQuery,
     limit: int = 10,
     offset: int = 0,
-    user_id: uuid.UUID | None = None,
-) -> Sequence[Item]:
+    cursor: Cursor | None = None,
+) -> Page[Item]:
     """
-    Returns top `limit` most similar items to query `query` from offset `offset`.
-    If `user_id` is defined personalize the selection.
+    Returns top `limit` most similar items to query `query` from offset
+    `offset`, or after `cursor`.
+    Results are cached per query, see app/recommend/cache.py. Results ranked
+    on a feature matrix that predates an item write are not cached, they
+    would outlive the rebuild of the matrix.
     """
+    key = similar_query_key(query, limit, offset), cursor
+    cached = similar_query_cache.get(key)
+    if cached is not None:
+        ids, after = cached
+        return Page(load_items(session, ids), after)
+    generation = similar_query_cache.generation
+    stale = False
+    if settings.SIMILARITY_ENGINE_ENABLED:
+        # rebuilt first when due, checked after reading the generation as a
+        # write from then on bumps it
+        get_feature_matrix(session)
+        stale = feature_matrix_stale()
+    page = _find_similar_query(
+        session, query, limit=limit, offset=offset, cursor=cursor
+    )
+    if not stale:
+        similar_query_cache.put(
+            key, ([item.id for item in page.items], page.next_cursor), generation
+        )
+    return page
+
+
+def _find_similar_query(
+    session: Session,
+    query: ItemQuery,
+    limit: int,
+    offset: int,
+    cursor: Cursor | None,
+    exclude: set[uuid.UUID] | None = None,
+) -> Page[Item]:
+    if settings.SIMILARITY_ENGINE_ENABLED:
+        matrix = get_feature_matrix(session)
+        vector, valid = matrix.encode_query(query)
+        if exclude:
+            valid[[matrix.positions[i] for i in exclude if i in matrix.positions]] = (
+                False
+            )
+        candidates, keys, top = _ranked_page(
+            matrix, vector, valid, {}, limit, offset, cursor
+        )
+        return _load_page(
+            session, [matrix.ids[i] for i in candidates[top]], keys[top], limit
+        )
+
+    # unranked, items are paged by id
     stmt = select(Item)
 
     if query.min_year is not None:
-        stmt = stmt.where(Item.year >= query.min_year)
+        stmt = stmt.where(col(Item.year) >= query.min_year)
     if query.min_price is not None:
-        stmt = stmt.where(Item.selling_price >= query.min_price)
+        stmt = stmt.where(col(Item.selling_price) >= query.min_price)
     if query.max_price is not None:
-        stmt = stmt.where(Item.selling_price <= query.max_price)
+        stmt = stmt.where(col(Item.selling_price) <= query.max_price)
     if query.max_km_driven is not None:
-        stmt = stmt.where(Item.km_driven <= query.max_km_driven)
+        stmt = stmt.where(col(Item.km_driven) <= query.max_km_driven)
     if query.fuel_type is not None:
         stmt = stmt.where(Item.fuel_type == query.fuel_type)
-    stmt = stmt.offset(offset).limit(limit)
+    if exclude:
+        stmt = stmt.where(col(Item.id).not_in(exclude))
+    if cursor is not None:
+        stmt = stmt.where(col(Item.id) > cursor.id)
+    else:
+        stmt = stmt.offset(offset)
+    stmt = stmt.order_by(col(Item.id)).limit(limit)
 
-    result = session.exec(stmt).all()
-    return result
+    result = list(session.exec(stmt).all())
+    return Page(
+        result, next_cursor([item.id for item in result], [0.0] * len(result), limit)
+    )
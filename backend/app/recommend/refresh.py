@@ -0,0 +1,73 @@
+"""
+Background refresh of the item popularity rollup.
+
+Each process runs a thread folding new events into `item_popularity` every
+`POPULARITY_REFRESH_SECONDS`, so `/items/recommend/most_popular` only reads
+the rollup. A refresh already running in another process is skipped, not
+waited for. The cron job refreshes the rollup as well.
+"""
+
+import logging
+import threading
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.recommend.popularity import refresh_item_popularity
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityRefresher:
+    """
+    Thread refreshing the popularity rollup every `interval` seconds.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="popularity-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def close(self, timeout: float | None = None) -> None:
+        """
+        Stop the thread, waiting for a running refresh to commit.
+        """
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                with Session(engine) as session:
+                    refresh_item_popularity(session, wait=False)
+            except Exception:
+                logger.exception("Item popularity refresh failed")
+
+
+_refresher: PopularityRefresher | None = None
+_lock = threading.Lock()
+
+
+def start_popularity_refresher() -> None:
+    """
+    Start the process-wide refresher unless `POPULARITY_REFRESH_SECONDS` is 0.
+    """
+    global _refresher
+    with _lock:
+        if _refresher is None and settings.POPULARITY_REFRESH_SECONDS > 0:
+            _refresher = PopularityRefresher(settings.POPULARITY_REFRESH_SECONDS)
+
+
+def close_popularity_refresher() -> None:
+    """
+    Stop the refresher, called on application shutdown.
+    """
+    global _refresher
+    with _lock:
+        refresher, _refresher = _refresher, None
+    if refresher is not None:
+        refresher.close()
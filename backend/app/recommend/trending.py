@@ -0,0 +1,260 @@
+"""
+Sliding-window "trending now" counters held in process memory.
+
+Every item owns a row in two ring buffers: 60 per-minute buckets covering
+the last hour and 168 per-hour buckets covering the last week. Running totals
+per window are kept up to date as buckets expire, so a top-k query is a
+single `argpartition` over one array, with no SQL involved.
+
+Each API worker counts its own writes as they are published on the bus and
+re-synchronizes from the `Event` table every `TRENDING_SYNC_SECONDS` to pick
+up the writes of other workers.
+"""
+
+import threading
+import time
+import uuid
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from typing import Literal, TypeVar
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import Float, cast, func
+from sqlmodel import Session, col, select
+
+from app.core.bus import EVENTS_CREATED, bus
+from app.core.config import settings
+from app.core.pagination import Cursor, keyset_top_k
+from app.models import Event
+
+TrendingWindow = Literal["1h", "24h", "7d"]
+
+_ScalarT = TypeVar("_ScalarT", bound=np.generic)
+
+_MINUTES = 60
+_HOURS = 168
+
+
+class TrendingCounters:
+    """
+    Per-item event counts over the last hour, day and week.
+
+    The hour window is exact to the minute, the day and week windows to the
+    hour; the current bucket is always included.
+    """
+
+    def __init__(self, now: float | None = None, capacity: int = 1024) -> None:
+        now = time.time() if now is None else now
+        self.ids: list[uuid.UUID] = []
+        self.positions: dict[uuid.UUID, int] = {}
+        self.minutes: npt.NDArray[np.int32] = np.zeros(
+            (capacity, _MINUTES), dtype=np.int32
+        )
+        self.hours: npt.NDArray[np.int32] = np.zeros((capacity, _HOURS), dtype=np.int32)
+        self.totals: dict[str, npt.NDArray[np.int64]] = {
+            window: np.zeros(capacity, dtype=np.int64) for window in ("1h", "24h", "7d")
+        }
+        self.minute = int(now // 60)
+        self.hour = int(now // 3600)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_session(
+        cls, session: Session, now: float | None = None
+    ) -> "TrendingCounters":
+        """
+        Counters over the events of the last week, aggregated in the database.
+        """
+        now = time.time() if now is None else now
+        counters = cls(now)
+        for bucket, seconds, horizon in (
+            ("minute", 60, _MINUTES),
+            ("hour", 3600, _HOURS),
+        ):
+            start = (int(now // seconds) - horizon + 1) * seconds
+            epoch = cast(func.extract("epoch", col(Event.timestamp)), Float)
+            slot = func.floor(epoch / seconds).label("slot")
+            statement = (
+                select(Event.item_id, slot, func.count())
+                .where(col(Event.item_id).is_not(None))
+                .where(
+                    col(Event.timestamp) >= datetime.fromtimestamp(start, timezone.utc)
+                )
+                .group_by(col(Event.item_id), slot)
+            )
+            rows = session.exec(statement).all()
+            if not rows:
+                continue
+            positions = np.array(
+                [counters._position(row[0]) for row in rows]  # type: ignore[arg-type]
+            )
+            slots = np.array([int(row[1]) for row in rows], dtype=np.int64)
+            counts = np.array([row[2] for row in rows], dtype=np.int64)
+            if bucket == "minute":
+                counters._add_minutes(positions, slots, counts)
+            else:
+                counters._add_hours(positions, slots, counts)
+        return counters
+
+    def _position(self, item_id: uuid.UUID) -> int:
+        position = self.positions.get(item_id)
+        if position is not None:
+            return position
+        position = len(self.ids)
+        if position == len(self.minutes):
+            capacity = 2 * len(self.minutes)
+            self.minutes = _grow(self.minutes, capacity)
+            self.hours = _grow(self.hours, capacity)
+            self.totals = {w: _grow(t, capacity) for w, t in self.totals.items()}
+        self.ids.append(item_id)
+        self.positions[item_id] = position
+        return position
+
+    def _advance(self, now: float) -> None:
+        """
+        Expire the buckets that fell out of the windows since the last call.
+        """
+        n = len(self.ids)
+        minute = int(now // 60)
+        if minute > self.minute:
+            if minute - self.minute >= _MINUTES:
+                self.minutes[:n] = 0
+                self.totals["1h"][:n] = 0
+            else:
+                # buckets of the new minutes still hold counts from an hour ago
+                cols = np.arange(self.minute + 1, minute + 1) % _MINUTES
+                self.totals["1h"][:n] -= self.minutes[:n, cols].sum(axis=1)
+                self.minutes[:n, cols] = 0
+            self.minute = minute
+
+        hour = int(now // 3600)
+        if hour > self.hour:
+            if hour - self.hour >= _HOURS:
+                self.hours[:n] = 0
+                self.totals["24h"][:n] = 0
+                self.totals["7d"][:n] = 0
+            else:
+                leaving = np.arange(self.hour - 23, min(self.hour, hour - 24) + 1)
+                if len(leaving):
+                    self.totals["24h"][:n] -= self.hours[:n, leaving % _HOURS].sum(
+                        axis=1
+                    )
+                cols = np.arange(self.hour + 1, hour + 1) % _HOURS
+                self.totals["7d"][:n] -= self.hours[:n, cols].sum(axis=1)
+                self.hours[:n, cols] = 0
+            self.hour = hour
+
+    def _add_minutes(
+        self,
+        positions: npt.NDArray[np.int64],
+        minutes: npt.NDArray[np.int64],
+        counts: npt.NDArray[np.int64],
+    ) -> None:
+        keep = (minutes > self.minute - _MINUTES) & (minutes <= self.minute)
+        positions, minutes, counts = positions[keep], minutes[keep], counts[keep]
+        np.add.at(self.minutes, (positions, minutes % _MINUTES), counts)
+        np.add.at(self.totals["1h"], positions, counts)
+
+    def _add_hours(
+        self,
+        positions: npt.NDArray[np.int64],
+        hours: npt.NDArray[np.int64],
+        counts: npt.NDArray[np.int64],
+    ) -> None:
+        keep = (hours > self.hour - _HOURS) & (hours <= self.hour)
+        positions, hours, counts = positions[keep], hours[keep], counts[keep]
+        np.add.at(self.hours, (positions, hours % _HOURS), counts)
+        np.add.at(self.totals["7d"], positions, counts)
+        day = hours > self.hour - 24
+        np.add.at(self.totals["24h"], positions[day], counts[day])
+
+    def record(
+        self, item_id: uuid.UUID, timestamp: float | None = None, count: int = 1
+    ) -> None:
+        """
+        Count `count` events of `item_id` at `timestamp`, defaulting to now.
+        """
+        with self._lock:
+            now = time.time()
+            self._advance(now)
+            timestamp = now if timestamp is None else min(timestamp, now)
+            position = np.array([self._position(item_id)])
+            counts = np.array([count], dtype=np.int64)
+            self._add_minutes(position, np.array([int(timestamp // 60)]), counts)
+            self._add_hours(position, np.array([int(timestamp // 3600)]), counts)
+
+    def top(
+        self, window: TrendingWindow, k: int, now: float | None = None
+    ) -> list[uuid.UUID]:
+        """
+        Up to `k` items with the most events in `window`, most active first.
+        Items without events in the window are never returned.
+        """
+        return [item_id for item_id, _ in self.ranked(window, k, now=now)]
+
+    def ranked(
+        self,
+        window: TrendingWindow,
+        k: int,
+        after: Cursor | None = None,
+        now: float | None = None,
+    ) -> list[tuple[uuid.UUID, int]]:
+        """
+        `top` with the event counts, continuing after cursor `after` whose key
+        is the negated count.
+        """
+        with self._lock:
+            self._advance(time.time() if now is None else now)
+            totals = self.totals[window][: len(self.ids)]
+            active = np.flatnonzero(totals)
+            top = keyset_top_k(-totals[active], lambda i: self.ids[active[i]], k, after)
+            return [(self.ids[active[i]], int(totals[active[i]])) for i in top]
+
+
+def _grow(array: npt.NDArray[_ScalarT], capacity: int) -> npt.NDArray[_ScalarT]:
+    grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+_counters: TrendingCounters | None = None
+_synced_at: float = 0.0
+_lock = threading.Lock()
+
+
+def get_trending_counters(session: Session) -> TrendingCounters:
+    """
+    Returns the process-wide counters, re-synchronized from the database when
+    older than `TRENDING_SYNC_SECONDS`.
+    """
+    global _counters, _synced_at
+    with _lock:
+        if (
+            _counters is None
+            or time.monotonic() - _synced_at > settings.TRENDING_SYNC_SECONDS
+        ):
+            _counters = TrendingCounters.from_session(session)
+            _synced_at = time.monotonic()
+        return _counters
+
+
+def record_event(item_id: uuid.UUID | None, timestamp: float | None = None) -> None:
+    """
+    Count a new event of `item_id`. A no-op until the counters are first read,
+    the initial synchronization picks the event up from the database.
+    """
+    counters = _counters
+    if counters is not None and item_id is not None:
+        counters.record(item_id, timestamp)
+
+
+def _record_events(events: Sequence[Event]) -> None:
+    for event in events:
+        record_event(event.item_id, event.timestamp.timestamp())
+
+
+bus.subscribe(EVENTS_CREATED, _record_events)
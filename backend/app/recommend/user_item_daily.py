@@ -0,0 +1,157 @@
+"""
+Daily user x item interaction rollup.
+
+The cron job compacts raw events into per-day `(user, item, event type)`
+counts in `user_item_daily`, incrementally from a watermark. Readers combine
+the rollup with the raw events newer than the watermark, so they see every
+event while only scanning the recent tail of the event log. Each count is also
+reported weighted by the `event_type` catalog, so a purchase can count for
+more than a view.
+"""
+
+import uuid
+from collections.abc import Collection
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import DateTime, Float, Subquery, cast, func, literal, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.models import Event, EventType, RollupWatermark, UserItemDaily
+from app.recommend.popularity import lock_watermark
+
+ROLLUP_NAME = "user_item_daily"
+
+
+def _fold(session: Session, *conditions: Any) -> int:
+    """
+    Add the events with a user and an item matching `conditions` to
+    `user_item_daily`. Returns the number of updated rows.
+    """
+    day = func.date(func.timezone("UTC", Event.timestamp))
+    batch = (
+        select(  # type: ignore[call-overload]
+            Event.user_id, Event.item_id, day, Event.event_type, func.count()
+        )
+        .where(
+            col(Event.user_id).is_not(None),
+            col(Event.item_id).is_not(None),
+            *conditions,
+        )
+        .group_by(Event.user_id, Event.item_id, day, Event.event_type)
+    )
+    statement = insert(UserItemDaily).from_select(
+        ["user_id", "item_id", "day", "event_type", "count"], batch
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[
+            col(UserItemDaily.user_id),
+            col(UserItemDaily.item_id),
+            col(UserItemDaily.day),
+            col(UserItemDaily.event_type),
+        ],
+        set_={"count": col(UserItemDaily.count) + statement.excluded.count},
+    )
+    return session.exec(statement).rowcount  # type: ignore
+
+
+def refresh_user_item_daily(
+    session: Session,
+    until: datetime | None = None,
+    wait: bool = True,
+    rebuild: bool = False,
+) -> int:
+    """
+    Fold events with a user and an item newer than the watermark and not
+    newer than `until` into `user_item_daily` and advance the watermark.
+    `until` defaults to `ROLLUP_LAG_SECONDS` ago, `rebuild` starts over from
+    the events still in the `Event` table.
+    Returns the number of updated rows, 0 when the rollup is being refreshed
+    by another transaction and `wait` is False.
+    """
+    watermark = lock_watermark(session, ROLLUP_NAME, wait=wait)
+    if watermark is None:
+        return 0
+    if rebuild:
+        session.exec(delete(UserItemDaily))  # type: ignore
+        watermark.watermark = None
+    if until is None:
+        now = session.exec(select(func.now())).one()
+        until = now - timedelta(seconds=settings.ROLLUP_LAG_SECONDS)
+    if watermark.watermark is not None and until <= watermark.watermark:
+        # never move back, events up to the watermark are already counted
+        session.commit()
+        return 0
+
+    conditions = [col(Event.timestamp) <= until]
+    if watermark.watermark is not None:
+        conditions.append(col(Event.timestamp) > watermark.watermark)
+    updated = _fold(session, *conditions)
+    watermark.watermark = until
+    session.add(watermark)
+    session.commit()
+    return updated
+
+
+def fold_late_user_item_daily(session: Session, ids: Collection[uuid.UUID]) -> int:
+    """
+    Fold the events `ids` the watermark already passed into `user_item_daily`,
+    see `fold_late_item_popularity`. Readers skip raw events up to the
+    watermark, so such events are only counted once folded.
+    Returns the number of updated rows.
+    """
+    watermark = lock_watermark(session, ROLLUP_NAME)
+    if watermark is None or watermark.watermark is None:
+        return 0
+    return _fold(
+        session,
+        col(Event.id).in_(ids),
+        col(Event.timestamp) <= watermark.watermark,
+    )
+
+
+def user_item_counts() -> Subquery:
+    """
+    Subquery of `(user_id, item_id, event_type, epoch, count, weight)` rows
+    covering every event with a user and an item: rollup rows, timed at noon
+    of their day, followed by the single events newer than the watermark.
+    `weight` is `count` times the weight of the event type.
+    Filters on `user_id` are pushed down into both parts.
+    """
+    watermark = (
+        select(RollupWatermark.watermark)
+        .where(RollupWatermark.name == ROLLUP_NAME)
+        .scalar_subquery()
+    )
+    rolled = select(  # type: ignore[call-overload]
+        UserItemDaily.user_id,
+        UserItemDaily.item_id,
+        UserItemDaily.event_type,
+        (cast(func.extract("epoch", col(UserItemDaily.day)), Float) + 43200.0).label(
+            "epoch"
+        ),
+        col(UserItemDaily.count).label("count"),
+        (col(UserItemDaily.count) * col(EventType.weight)).label("weight"),
+    ).join(EventType, col(EventType.code) == UserItemDaily.event_type)
+    tail = (
+        select(  # type: ignore[call-overload]
+            Event.user_id,
+            Event.item_id,
+            Event.event_type,
+            cast(func.extract("epoch", col(Event.timestamp)), Float),
+            literal(1),
+            EventType.weight,
+        )
+        .join(EventType, col(EventType.code) == Event.event_type)
+        .where(
+            col(Event.user_id).is_not(None),
+            col(Event.item_id).is_not(None),
+            col(Event.timestamp)
+            > func.coalesce(
+                watermark, cast(literal("-infinity"), DateTime(timezone=True))
+            ),
+        )
+    )
+    return union_all(rolled, tail).subquery("user_item_counts")
@@ -1,9 +1,13 @@
+import json
+import uuid
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, func, select
 
 from app import crud
 from app.core.config import settings
-from app.models import UserCreate
+from app.models import Event, UserCreate
 from app.tests.utils.item import create_random_item
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -32,3 +36,166 @@ def test_create_event(client: TestClient, db: Session) -> None:
     assert content["event_type"] == data["event_type"]
     assert "id" in content
     assert "timestamp" in content
+
+
+def test_create_events_batch(client: TestClient, db: Session) -> None:
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    item = create_random_item(db)
+    events = [
+        {"user_id": str(user.id), "item_id": str(item.id), "event_type": "click"},
+        {"user_id": None, "item_id": str(item.id), "event_type": "view"},
+        {"user_id": str(user.id), "item_id": str(uuid.uuid4()), "event_type": "click"},
+        {"user_id": str(user.id), "item_id": None},
+    ]
+    response = client.post(f"{settings.API_V1_STR}/events/batch", json=events)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["accepted"] == 2
+    assert content["rejected"] == 2
+    statuses = content["data"]
+    assert [s["index"] for s in statuses] == [0, 1, 2, 3]
+    assert statuses[0]["id"] and statuses[1]["id"]
+    assert statuses[2]["error"] == "item_id: Item not found"
+    assert statuses[3]["error"].startswith("event_type")
+    stored = db.exec(select(Event).where(Event.item_id == item.id)).all()
+    assert {str(e.id) for e in stored} == {statuses[0]["id"], statuses[1]["id"]}
+
+
+def test_create_events_batch_ndjson(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    lines = [
+        json.dumps({"user_id": None, "item_id": str(item.id), "event_type": "view"}),
+        "{not json",
+        "",
+        json.dumps({"user_id": None, "item_id": None, "event_type": "view"}),
+    ]
+    response = client.post(
+        f"{settings.API_V1_STR}/events/batch",
+        content="\n".join(lines),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["accepted"] == 2
+    assert content["data"][1]["error"].startswith("Invalid JSON")
+
+
+def test_create_events_batch_invalid(client: TestClient) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/events/batch", json={"event_type": "view"}
+    )
+    assert response.status_code == 400
+    with patch.object(settings, "EVENTS_BATCH_MAX_SIZE", 1):
+        response = client.post(
+            f"{settings.API_V1_STR}/events/batch",
+            json=[{"event_type": "view"}] * 2,
+        )
+    assert response.status_code == 413
+
+
+def test_create_event_idempotent(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    data = {
+        "user_id": None,
+        "item_id": str(item.id),
+        "event_type": "click",
+        "idempotency_key": str(uuid.uuid4()),
+    }
+    first = client.post(f"{settings.API_V1_STR}/events/", json=data)
+    retry = client.post(f"{settings.API_V1_STR}/events/", json=data)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+
+    new = str(uuid.uuid4())
+    events = [
+        {**data, "idempotency_key": key}
+        for key in (data["idempotency_key"], new, new, None, None)
+    ]
+    response = client.post(f"{settings.API_V1_STR}/events/batch", json=events)
+    statuses = response.json()["data"]
+    assert [s["duplicate"] for s in statuses] == [True, False, True, False, False]
+    assert statuses[0]["id"] == first.json()["id"]
+    assert statuses[2]["id"] == statuses[1]["id"]
+    stored = db.exec(select(Event).where(Event.item_id == item.id)).all()
+    assert len(stored) == 4
+
+
+def test_create_event_idempotent_across_workers(
+    client: TestClient, db: Session
+) -> None:
+    item = create_random_item(db)
+    data = {
+        "user_id": None,
+        "item_id": str(item.id),
+        "event_type": "click",
+        "idempotency_key": str(uuid.uuid4()),
+    }
+    first = client.post(f"{settings.API_V1_STR}/events/", json=data)
+    # the retry reaches a worker whose Bloom filter never saw the key
+    with patch("app.ingest.dedup.seen_keys.check_and_add", return_value=False):
+        retry = client.post(f"{settings.API_V1_STR}/events/", json=data)
+        response = client.post(f"{settings.API_V1_STR}/events/batch", json=[data])
+    assert retry.json()["id"] == first.json()["id"]
+    status = response.json()["data"][0]
+    assert status["duplicate"]
+    assert status["id"] == first.json()["id"]
+    stored = db.exec(select(Event).where(Event.item_id == item.id)).all()
+    assert len(stored) == 1
+
+
+def test_create_events_batch_duplicate_of_rejected(
+    client: TestClient, db: Session
+) -> None:
+    item = create_random_item(db)
+    key = str(uuid.uuid4())
+    events = [
+        {
+            "user_id": None,
+            "item_id": str(uuid.uuid4()),
+            "event_type": "click",
+            "idempotency_key": key,
+        },
+        {
+            "user_id": None,
+            "item_id": str(item.id),
+            "event_type": "click",
+            "idempotency_key": key,
+        },
+    ]
+    response = client.post(f"{settings.API_V1_STR}/events/batch", json=events)
+    statuses = response.json()["data"]
+    assert statuses[0]["error"] == "item_id: Item not found"
+    assert not statuses[1]["duplicate"]
+    stored = db.exec(select(Event).where(Event.item_id == item.id)).one()
+    assert stored.id == uuid.UUID(statuses[1]["id"])
+
+
+def test_create_event_typed(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    data = {
+        "user_id": None,
+        "item_id": str(item.id),
+        "event_type": "purchase",
+        "event_value": {"price_seen": 9.5, "dwell_time_ms": 1200, "source": "feed"},
+    }
+    response = client.post(f"{settings.API_V1_STR}/events/", json=data)
+    assert response.status_code == 200
+    content = response.json()
+    assert content["event_type"] == "purchase"
+    assert content["price_seen"] == 9.5
+    assert content["dwell_time_ms"] == 1200
+    assert content["event_value"] == {"source": "feed"}
+    stored = db.exec(select(Event).where(Event.item_id == item.id)).one()
+    assert stored.event_type == "purchase"
+    assert stored.price_seen == 9.5
+
+    # unknown types are rejected
+    response = client.post(
+        f"{settings.API_V1_STR}/events/", json={**data, "event_type": "ping"}
+    )
+    assert response.status_code == 422
+    count = db.exec(select(func.count()).where(Event.item_id == item.id)).one()
+    assert count == 1
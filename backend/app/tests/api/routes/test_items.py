@@ -1,12 +1,25 @@
+import io
+import time
 import uuid
+from collections.abc import Iterator
+from typing import Any
+from pathlib import Path
 from unittest.mock import patch
 from datetime import datetime
 
+import pyarrow.parquet as pq
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select
 
+from app import crud
 from app.core.config import settings
+from app.models import Event, Item, ItemCreate, ItemSimilarity, UserCreate
+from app.recommend.features import get_feature_matrix
+from app.recommend.popularity import refresh_item_popularity
+from app.tests.crud.test_csv import HEADER, HYUNDAI, MARUTI
 from app.tests.utils.item import create_random_item
+from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.utils import random_email, random_lower_string
 
 
 def test_create_item(
@@ -83,6 +96,31 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
+def test_read_items_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/"
+    expected = client.get(url, headers=superuser_token_headers).json()
+
+    seen: list[str] = []
+    params: dict[str, str | int] = {"limit": 2}
+    while True:
+        content = client.get(url, headers=superuser_token_headers, params=params).json()
+        seen.extend(item["id"] for item in content["data"])
+        if content["next_cursor"] is None:
+            break
+        params = {"limit": 2, "cursor": content["next_cursor"]}
+    assert len(seen) == expected["count"]
+    assert seen == sorted(seen)
+
+    response = client.get(
+        url, headers=superuser_token_headers, params={"cursor": "not a cursor"}
+    )
+    assert response.status_code == 400
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -163,6 +201,235 @@ def test_similar_items(client: TestClient, db: Session) -> None:
     assert len(content["data"]) > 0
 
 
+def test_similar_items_ranked(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    twin = crud.create_item(
+        session=db,
+        item_in=ItemCreate.model_validate(item, update={"name": "twin"}),
+        seller_id=item.seller_id,
+    )
+    # rebuild the matrix with the new items right away
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/recommend/{item.id}/similar",
+            params={"limit": 5},
+        )
+    assert response.status_code == 200
+    content = response.json()
+    ids = [data["id"] for data in content["data"]]
+    assert ids[0] == str(twin.id)
+    assert str(item.id) not in ids
+
+
+def test_similar_items_cursor(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    for _ in range(6):
+        create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/recommend/{item.id}/similar"
+    # the same matrix for every page
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        first = client.get(url, params={"limit": 3}).json()
+        second = client.get(
+            url, params={"limit": 3, "cursor": first["next_cursor"]}
+        ).json()
+        by_offset = client.get(url, params={"limit": 3, "offset": 3}).json()
+    assert [i["id"] for i in second["data"]] == [i["id"] for i in by_offset["data"]]
+    assert not {i["id"] for i in first["data"]} & {i["id"] for i in second["data"]}
+
+
+def test_similar_query_cursor_pages(client: TestClient, db: Session) -> None:
+    fuel_type = random_lower_string()
+    item = create_random_item(db)
+    item_in = ItemCreate.model_validate(item, update={"fuel_type": fuel_type})
+    # tied items, pages must not skip or repeat any of them
+    for _ in range(4):
+        crud.create_item(session=db, item_in=item_in, seller_id=item.seller_id)
+    for _ in range(5):
+        other = create_random_item(db)
+        crud.create_item(
+            session=db,
+            item_in=ItemCreate.model_validate(other, update={"fuel_type": fuel_type}),
+            seller_id=other.seller_id,
+        )
+    data = {
+        "min_year": None,
+        "min_price": None,
+        "max_price": None,
+        "max_km_driven": None,
+        "fuel_type": fuel_type,
+    }
+    url = f"{settings.API_V1_STR}/items/recommend/similar_query"
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        ranked = client.post(url, json=data, params={"limit": 20}).json()
+        ids = [i["id"] for i in ranked["data"]]
+        assert len(ids) == 9
+        paged: list[str] = []
+        params: dict[str, Any] = {"limit": 2}
+        while True:
+            page = client.post(url, json=data, params=params).json()
+            paged += [i["id"] for i in page["data"]]
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+    assert paged == ids
+
+
+def test_similar_items_precomputed(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    neighbours = [create_random_item(db) for _ in range(3)]
+    for rank, neighbour in enumerate(neighbours):
+        db.add(
+            ItemSimilarity(
+                item_id=item.id, rank=rank, neighbour_id=neighbour.id, score=1.0
+            )
+        )
+    db.commit()
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/recommend/{item.id}/similar",
+        params={"limit": 2, "offset": 1},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [data["id"] for data in content["data"]] == [
+        str(neighbour.id) for neighbour in neighbours[1:]
+    ]
+
+
+def test_similar_items_precomputed_pages(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    neighbours = [create_random_item(db) for _ in range(3)]
+    for _ in range(4):
+        create_random_item(db)
+    for rank, neighbour in enumerate(neighbours):
+        db.add(
+            ItemSimilarity(
+                item_id=item.id,
+                rank=rank,
+                neighbour_id=neighbour.id,
+                score=0.9 - rank / 10,
+            )
+        )
+    db.commit()
+
+    url = f"{settings.API_V1_STR}/items/recommend/{item.id}/similar"
+    # the same matrix for every page
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        by_offset = client.get(url, params={"limit": 6}).json()
+        ids = [i["id"] for i in by_offset["data"]]
+        assert ids[:3] == [str(neighbour.id) for neighbour in neighbours]
+        assert len(set(ids)) == 6
+        # pages crossing the end of the precomputed neighbours
+        paged: list[str] = []
+        cursor = None
+        for offset in range(0, 6, 2):
+            params: dict[str, Any] = {"limit": 2}
+            page = client.get(url, params={**params, "offset": offset}).json()
+            assert [i["id"] for i in page["data"]] == ids[offset : offset + 2]
+            if cursor is not None:
+                params["cursor"] = cursor
+            page = client.get(url, params=params).json()
+            paged += [i["id"] for i in page["data"]]
+            cursor = page["next_cursor"]
+    assert paged == ids
+
+
+def test_similar_items_recent_covisits(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    neighbours = [create_random_item(db) for _ in range(3)]
+    covisited = create_random_item(db)
+    for rank, neighbour in enumerate(neighbours):
+        db.add(
+            ItemSimilarity(
+                item_id=item.id, rank=rank, neighbour_id=neighbour.id, score=1.0
+            )
+        )
+    db.commit()
+
+    url = f"{settings.API_V1_STR}/items/recommend/{item.id}/similar"
+    with (
+        patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0),
+        # ranked by co-visitation alone
+        patch.object(settings, "COVISIT_WEIGHT", 1.0),
+    ):
+        before = client.get(url, params={"limit": 3}).json()
+        assert [i["id"] for i in before["data"]] == [str(n.id) for n in neighbours]
+        # a user views both items after the table was built
+        for viewed in (item, covisited):
+            response = client.post(
+                f"{settings.API_V1_STR}/events/",
+                json={
+                    "user_id": str(item.seller_id),
+                    "item_id": str(viewed.id),
+                    "event_type": "view",
+                },
+            )
+            assert response.status_code == 200
+        after = client.get(url, params={"limit": 3}).json()
+        batch = client.post(
+            f"{settings.API_V1_STR}/items/recommend/similar/batch",
+            params={"limit": 3},
+            json={"item_ids": [str(item.id)]},
+        ).json()
+    assert after["data"][0]["id"] == str(covisited.id)
+    assert batch["data"][str(item.id)]["data"] == after["data"]
+
+
+def test_similar_items_batch(client: TestClient, db: Session) -> None:
+    items = [create_random_item(db) for _ in range(3)]
+    unknown = uuid.uuid4()
+    response = client.post(
+        f"{settings.API_V1_STR}/items/recommend/similar/batch",
+        params={"limit": 2},
+        json={"item_ids": [str(i.id) for i in items] + [str(unknown)]},
+    )
+    assert response.status_code == 200
+    content = response.json()["data"]
+    assert content[str(unknown)]["count"] == 0
+    for item in items:
+        single = client.get(
+            f"{settings.API_V1_STR}/items/recommend/{item.id}/similar",
+            params={"limit": 2},
+        ).json()
+        assert content[str(item.id)]["count"] == 2
+        assert [i["id"] for i in content[str(item.id)]["data"]] == [
+            i["id"] for i in single["data"]
+        ]
+
+
+def test_similar_items_batch_sql(client: TestClient, db: Session) -> None:
+    items = [create_random_item(db) for _ in range(3)]
+    db.add(
+        ItemSimilarity(item_id=items[0].id, rank=0, neighbour_id=items[1].id, score=1)
+    )
+    db.commit()
+    with patch.object(settings, "SIMILARITY_ENGINE_ENABLED", False):
+        response = client.post(
+            f"{settings.API_V1_STR}/items/recommend/similar/batch",
+            params={"limit": 3},
+            json={"item_ids": [str(i.id) for i in items]},
+        )
+        assert response.status_code == 200
+        content = response.json()["data"]
+        for item in items:
+            single = client.get(
+                f"{settings.API_V1_STR}/items/recommend/{item.id}/similar",
+                params={"limit": 3},
+            ).json()
+            assert [i["id"] for i in content[str(item.id)]["data"]] == [
+                i["id"] for i in single["data"]
+            ]
+    assert content[str(items[0].id)]["data"][0]["id"] == str(items[1].id)
+
+
+def test_similar_items_batch_too_large(client: TestClient) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/items/recommend/similar/batch",
+        json={"item_ids": [str(uuid.uuid4()) for _ in range(101)]},
+    )
+    assert response.status_code == 422
+
+
 def test_most_popular(client: TestClient, db: Session) -> None:
     for _ in range(10):
         create_random_item(db)
@@ -172,6 +439,125 @@ def test_most_popular(client: TestClient, db: Session) -> None:
     assert len(content["data"]) > 0
 
 
+def test_most_popular_ranked(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    db.add_all([Event(item_id=item.id, event_type="view") for _ in range(50)])
+    db.commit()
+    with patch.object(settings, "ROLLUP_LAG_SECONDS", 0):
+        refresh_item_popularity(db)
+    response = client.get(f"{settings.API_V1_STR}/items/recommend/most_popular")
+    assert response.status_code == 200
+    content = response.json()
+    assert content["data"][0]["id"] == str(item.id)
+
+
+def test_most_popular_cursor(client: TestClient, db: Session) -> None:
+    items = [create_random_item(db) for _ in range(3)]
+    for count, item in zip((80, 70, 60), items, strict=True):
+        db.add_all([Event(item_id=item.id, event_type="view") for _ in range(count)])
+    db.commit()
+    with patch.object(settings, "ROLLUP_LAG_SECONDS", 0):
+        refresh_item_popularity(db)
+
+    url = f"{settings.API_V1_STR}/items/recommend/most_popular"
+    seen: list[str] = []
+    params: dict[str, str | int] = {"limit": 1}
+    for _ in range(3):
+        content = client.get(url, params=params).json()
+        seen.extend(i["id"] for i in content["data"])
+        params = {"limit": 1, "cursor": content["next_cursor"]}
+    assert seen == [str(item.id) for item in items]
+
+
+def test_most_popular_window(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    for _ in range(3):
+        response = client.post(
+            f"{settings.API_V1_STR}/events/",
+            json={"user_id": None, "item_id": str(item.id), "event_type": "view"},
+        )
+        assert response.status_code == 200
+    response = client.get(
+        f"{settings.API_V1_STR}/items/recommend/most_popular",
+        params={"window": "1h", "limit": 100},
+    )
+    assert response.status_code == 200
+    assert str(item.id) in [i["id"] for i in response.json()["data"]]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/recommend/most_popular",
+        params={"window": "2h"},
+    )
+    assert response.status_code == 422
+
+
+def test_similar_query_cached(
+    client: TestClient, db: Session, superuser_token_headers: dict[str, str]
+) -> None:
+    create_random_item(db)
+    data = {
+        "min_year": 1990,
+        "min_price": None,
+        "max_price": None,
+        "max_km_driven": None,
+        "fuel_type": "Diesel",
+    }
+
+    def stats() -> dict[str, int]:
+        response = client.get(
+            f"{settings.API_V1_STR}/utils/similar-query-cache/",
+            headers=superuser_token_headers,
+        )
+        assert response.status_code == 200
+        counts: dict[str, int] = response.json()
+        return counts
+
+    url = f"{settings.API_V1_STR}/items/recommend/similar_query"
+    # results of a stale feature matrix are not cached
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        first = client.post(url, json=data).json()
+        before = stats()
+        second = client.post(url, json=data).json()
+        after = stats()
+    assert second == first
+    assert after["hits"] == before["hits"] + 1
+
+    create_random_item(db)
+    assert stats()["generation"] == after["generation"] + 1
+    client.post(url, json=data)
+    assert stats()["misses"] == after["misses"] + 1
+
+
+def test_similar_query_not_cached_on_stale_matrix(
+    client: TestClient, db: Session, superuser_token_headers: dict[str, str]
+) -> None:
+    data = {
+        "min_year": 1991,
+        "min_price": None,
+        "max_price": None,
+        "max_km_driven": None,
+        "fuel_type": "Petrol",
+    }
+
+    def size() -> int:
+        response = client.get(
+            f"{settings.API_V1_STR}/utils/similar-query-cache/",
+            headers=superuser_token_headers,
+        )
+        return int(response.json()["size"])
+
+    url = f"{settings.API_V1_STR}/items/recommend/similar_query"
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 3600):
+        get_feature_matrix(db)
+        create_random_item(db)
+        # ranked on the matrix built before the write
+        client.post(url, json=data)
+        assert size() == 0
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        client.post(url, json=data)
+        assert size() == 1
+
+
 def test_similar_query(client: TestClient, db: Session) -> None:
     for _ in range(10):
         create_random_item(db)
@@ -190,3 +576,170 @@ def test_similar_query(client: TestClient, db: Session) -> None:
     assert response.status_code == 200
     content = response.json()
     assert len(content["data"]) > 0
+
+
+def test_upload_csv_stream(client: TestClient, db: Session) -> None:
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=password),
+    )
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    rows = [HEADER, MARUTI, HYUNDAI, MARUTI.replace("2014", "2015")]
+
+    def body(lines: list[str]) -> Iterator[bytes]:
+        # split inside a row, the body arrives in arbitrary pieces
+        data = "\n".join(lines).encode()
+        yield from (data[i : i + 50] for i in range(0, len(data), 50))
+
+    url = f"{settings.API_V1_STR}/items/uploadcsv/stream"
+    headers = {**headers, "Content-Type": "text/csv"}
+    with patch.object(settings, "CSV_IMPORT_CHUNK_ROWS", 2):
+        response = client.post(url, headers=headers, content=body(rows))
+        assert response.status_code == 200
+        assert response.json() == {"message": "3 items imported"}
+
+        # the first chunk is committed before the malformed row is reached
+        new_rows = [MARUTI.replace("2014", year) for year in ("2016", "2017")]
+        response = client.post(
+            url, headers=headers, content=body([HEADER, *new_rows, "x," * 20])
+        )
+    assert response.status_code == 406
+    assert "2 items were imported" in response.json()["detail"]
+    items = db.exec(select(Item).where(Item.seller_id == user.id)).all()
+    assert len(items) == 5
+
+
+def run_import_job(
+    client: TestClient,
+    headers: dict[str, str],
+    path: str,
+    filename: str,
+    content: bytes,
+    params: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    response = client.post(
+        f"{settings.API_V1_STR}/items/{path}",
+        headers=headers,
+        params=params,
+        files={"file": (filename, content)},
+    )
+    assert response.status_code == 202
+    assert response.json()["filename"] == filename
+    job_url = f"{settings.API_V1_STR}/items/uploadcsv/{response.json()['id']}"
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        response = client.get(job_url, headers=headers)
+        if response.json()["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    job: dict[str, Any] = response.json()
+    return job
+
+
+def test_upload_csv_job(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    tmp_path: Path,
+) -> None:
+    url = f"{settings.API_V1_STR}/items/uploadcsv"
+    csv = "\n".join([HEADER, MARUTI, HYUNDAI, MARUTI]).encode()
+
+    def run_job(csv: bytes) -> dict[str, Any]:
+        return run_import_job(
+            client, normal_user_token_headers, "uploadcsv", "cars.csv", csv
+        )
+
+    with patch.object(settings, "UPLOAD_DIR", str(tmp_path)):
+        job = run_job(csv)
+        failed = run_job(b"name,year\n" + b"x," * 20)
+    assert job["status"] == "done"
+    assert job["rows_processed"] == 3
+    assert job["items_imported"] == 2
+    assert job["rows_per_second"] > 0
+    assert job["error"] is None
+    assert list(tmp_path.iterdir()) == []
+    assert failed["status"] == "failed"
+    assert failed["error"] == "KeyError: 'fuel'"
+
+    response = client.get(f"{url}/{uuid.uuid4()}", headers=normal_user_token_headers)
+    assert response.status_code == 404
+
+
+def test_upload_csv_replace(client: TestClient, db: Session, tmp_path: Path) -> None:
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=password),
+    )
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    repriced = MARUTI.replace("450000", "440000")
+    with patch.object(settings, "UPLOAD_DIR", str(tmp_path)):
+        first = run_import_job(
+            client,
+            headers,
+            "uploadcsv",
+            "a.csv",
+            f"{HEADER}\n{MARUTI}\n{HYUNDAI}".encode(),
+        )
+        # without a listing id, a changed listing is a new one
+        update = run_import_job(
+            client, headers, "uploadcsv", "b.csv", f"{HEADER}\n{repriced}".encode()
+        )
+        full = run_import_job(
+            client,
+            headers,
+            "uploadcsv",
+            "c.csv",
+            f"{HEADER}\n{repriced}".encode(),
+            params={"replace": True},
+        )
+    assert [job["items_imported"] for job in (first, update, full)] == [2, 1, 0]
+    assert [job["items_deleted"] for job in (first, update, full)] == [0, 0, 2]
+    prices = db.exec(select(Item.selling_price).where(Item.seller_id == user.id)).all()
+    assert prices == [440000]
+
+
+def test_export_and_upload_parquet(
+    client: TestClient, db: Session, tmp_path: Path
+) -> None:
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=password),
+    )
+    headers = user_authentication_headers(
+        client=client, email=user.email, password=password
+    )
+    item = create_random_item(db)
+    item.seller_id = user.id
+    db.add(item)
+    db.commit()
+
+    with patch.object(settings, "UPLOAD_DIR", str(tmp_path)):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/export/parquet", headers=headers
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/vnd.apache.parquet"
+        table = pq.read_table(io.BytesIO(response.content))
+        assert table.column("id").to_pylist() == [str(item.id)]
+
+        jobs = [
+            run_import_job(
+                client, headers, "uploadparquet", "items.parquet", response.content
+            )
+            for _ in range(2)
+        ]
+        assert [job["status"] for job in jobs] == ["done", "done"]
+        assert [job["rows_processed"] for job in jobs] == [1, 1]
+        # the item created through the API is the same listing
+        assert [job["items_imported"] for job in jobs] == [0, 0]
+    assert list(tmp_path.iterdir()) == []
+
+    response = client.get(f"{settings.API_V1_STR}/items/export/csv", headers=headers)
+    assert response.status_code == 422
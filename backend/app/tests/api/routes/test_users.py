@@ -7,7 +7,7 @@ from sqlmodel import Session, select
 from app import crud
 from app.core.config import settings
 from app.core.security import verify_password
-from app.models import User, UserCreate
+from app.models import Event, User, UserCreate
 from app.tests.utils.utils import random_email, random_lower_string
 from app.tests.utils.item import create_random_item
 
@@ -508,3 +508,38 @@ def test_user_recommendations(
     assert response.status_code == 200
     content = response.json()
     assert len(content["data"]) > 0
+
+
+def test_user_recommendations_batch(client: TestClient, db: Session) -> None:
+    users = [
+        crud.create_user(
+            session=db,
+            user_create=UserCreate(
+                email=random_email(), password=random_lower_string()
+            ),
+        )
+        for _ in range(2)
+    ]
+    favourite = create_random_item(db)
+    for _ in range(3):
+        db.add(Event(user_id=users[0].id, item_id=favourite.id, event_type="view"))
+    db.commit()
+
+    response = client.post(
+        f"{settings.API_V1_STR}/users/recommendations/batch",
+        params={"limit": 3},
+        json={"user_ids": [str(u.id) for u in users]},
+    )
+    assert response.status_code == 200
+    content = response.json()["data"]
+    assert set(content) == {str(u.id) for u in users}
+    assert content[str(users[0].id)]["data"][0]["id"] == str(favourite.id)
+    for user in users:
+        single = client.post(
+            f"{settings.API_V1_STR}/users/{user.id}/recommendations",
+            params={"limit": 3},
+            json={"query": None, "item_id": None},
+        ).json()
+        assert [i["id"] for i in content[str(user.id)]["data"]] == [
+            i["id"] for i in single["data"]
+        ]
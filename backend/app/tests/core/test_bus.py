@@ -0,0 +1,29 @@
+from typing import Any
+
+from app.core.bus import EVENTS_CREATED, ITEMS_CHANGED, EventBus
+
+
+def test_publish_reaches_subscribers_of_topic() -> None:
+    bus = EventBus()
+    received: list[Any] = []
+    bus.subscribe(EVENTS_CREATED, received.append)
+    bus.publish(EVENTS_CREATED, [1])
+    bus.publish(ITEMS_CHANGED, [2])
+    assert received == [[1]]
+
+    bus.unsubscribe(EVENTS_CREATED, received.append)
+    bus.publish(EVENTS_CREATED, [3])
+    assert received == [[1]]
+
+
+def test_failing_handler_is_isolated() -> None:
+    bus = EventBus()
+    received: list[Any] = []
+
+    def fail(payload: Any) -> None:
+        raise RuntimeError(payload)
+
+    bus.subscribe(ITEMS_CHANGED, fail)
+    bus.subscribe(ITEMS_CHANGED, received.append)
+    bus.publish(ITEMS_CHANGED, [])
+    assert received == [[]]
@@ -0,0 +1,77 @@
+import io
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlmodel import Session, col, select
+
+from app.crud.arrow import EXPORT_SCHEMA, export_items, import_arrow
+from app.models import Item
+from app.tests.crud.test_csv import HYUNDAI, MARUTI, import_rows
+from app.tests.utils.user import create_random_user
+
+
+def test_export_items(db: Session) -> None:
+    user = create_random_user(db)
+    import_rows(db, user.id, MARUTI, HYUNDAI)
+
+    sink = io.BytesIO()
+    assert export_items(db, sink, "parquet", user.id) == 2
+    table = pq.read_table(io.BytesIO(sink.getvalue()))
+    assert table.schema == EXPORT_SCHEMA
+    rows = sorted(table.to_pylist(), key=lambda row: row["year"])
+    assert rows[0]["name"] == 'Hyundai i20 "Asta"'
+    assert rows[0]["mileage"] is None
+    assert rows[1]["seller_id"] == str(user.id)
+    assert rows[1]["year"] == 2014
+    assert rows[1]["mileage"] == 23.4
+    assert rows[1]["created_at"] is not None
+
+    sink = io.BytesIO()
+    assert export_items(db, sink, "arrow", create_random_user(db).id) == 0
+    assert ipc.open_stream(io.BytesIO(sink.getvalue())).read_all().num_rows == 0
+
+
+def test_import_arrow(db: Session) -> None:
+    user = create_random_user(db)
+    # columns of the CSV feed, numbers already parsed
+    feed = pa.table(
+        {
+            "name": ["Maruti Swift Dzire VDI", "Hyundai i20"],
+            "year": [2014, 2010],
+            "selling_price": [450000, 225000],
+            "km_driven": [145500, 127000],
+            "fuel": ["Diesel", "Petrol"],
+            "seller_type": ["Individual", "Dealer"],
+            "transmission": ["Manual", "Manual"],
+            "owner": ["First Owner", "Second Owner"],
+            "mileage": [23.4, None],
+            "engine": ["1248 CC", None],
+            "max_power": [74.0, None],
+            "torque": ["190Nm@ 2000rpm", None],
+            "seats": [5, None],
+        }
+    )
+    sink = io.BytesIO()
+    with ipc.new_file(sink, feed.schema) as writer:
+        writer.write_table(feed)
+    counts = list(import_arrow(io.BytesIO(sink.getvalue()), db, user.id, "arrow", 1))
+    assert counts == [(1, 1), (1, 1)]
+
+    items = db.exec(
+        select(Item).where(Item.seller_id == user.id).order_by(col(Item.year))
+    ).all()
+    hyundai, maruti = items
+    assert hyundai.seats == 4
+    assert hyundai.mileage is None
+    assert maruti.fuel_type == "Diesel"
+    assert maruti.max_power == 74.0
+
+    # an export imports as the same listings
+    sink = io.BytesIO()
+    export_items(db, sink, "parquet", user.id)
+    stream = io.BytesIO(sink.getvalue())
+    assert list(import_arrow(stream, db, user.id, "parquet", 10)) == [(2, 0)]
+    other = create_random_user(db)
+    stream.seek(0)
+    assert list(import_arrow(stream, db, other.id, "parquet", 10)) == [(2, 2)]
@@ -0,0 +1,182 @@
+import io
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlmodel import Session, col, func, select
+
+from app import crud
+from app.crud.csv import (
+    import_csv_parallel,
+    import_csv_stream,
+    prune_items,
+    split_csv,
+    uuid4_hex,
+)
+from app.models import Event, Item, ItemCreate
+from app.tests.utils.user import create_random_user
+
+HEADER = "name,year,selling_price,km_driven,fuel,seller_type,transmission,owner,mileage,engine,max_power,torque,seats"
+MARUTI = "Maruti Swift Dzire VDI,2014,450000,145500,Diesel,Individual,Manual,First Owner,23.4 kmpl,1248 CC,74 bhp,190Nm@ 2000rpm,5"
+# quoted name, missing numbers and seats
+HYUNDAI = '"Hyundai i20 ""Asta""",2010,225000,127000,Petrol,Dealer,Manual,Second Owner,,,,"22.4 kgm, 1750rpm",'
+
+
+def import_rows(db: Session, seller_id: uuid.UUID, *rows: str) -> int:
+    stream = io.BytesIO("\n".join([HEADER, *rows]).encode())
+    return sum(n for _, n in import_csv_stream(stream, db, seller_id, 1000))
+
+
+def test_uuid4_hex() -> None:
+    ids = [uuid.UUID(value) for value in uuid4_hex(100)]
+    assert len(set(ids)) == 100
+    assert all(i.version == 4 for i in ids)
+
+
+def test_import_csv_stream(db: Session) -> None:
+    user = create_random_user(db)
+    assert import_rows(db, user.id, MARUTI, HYUNDAI, MARUTI) == 2
+
+    items = db.exec(
+        select(Item).where(Item.seller_id == user.id).order_by(col(Item.year))
+    ).all()
+    assert [item.name for item in items] == [
+        'Hyundai i20 "Asta"',
+        "Maruti Swift Dzire VDI",
+    ]
+    hyundai, maruti = items
+    assert hyundai.torque == "22.4 kgm, 1750rpm"
+    assert hyundai.engine is None
+    assert hyundai.mileage is None
+    assert hyundai.seats == 4
+    assert maruti.fuel_type == "Diesel"
+    assert maruti.owner_type == "First Owner"
+    assert maruti.mileage == 23.4
+    assert maruti.max_power == 74.0
+    assert maruti.seats == 5
+    assert maruti.created_at is not None
+
+
+def test_import_csv_incremental(db: Session) -> None:
+    user = create_random_user(db)
+    assert import_rows(db, user.id, MARUTI, HYUNDAI) == 2
+    assert import_rows(db, user.id, MARUTI, HYUNDAI) == 0
+
+    # listings hash the same whatever else is in their chunk
+    stream = io.BytesIO("\n".join([HEADER, HYUNDAI, MARUTI]).encode())
+    assert [n for _, n in import_csv_stream(stream, db, user.id, 1)] == [0, 0]
+
+    # without a listing id, units differing in price are distinct listings
+    repriced = MARUTI.replace("450000", "440000")
+    assert import_rows(db, user.id, MARUTI, repriced, HYUNDAI) == 1
+    prices = db.exec(select(Item.selling_price).where(Item.seller_id == user.id)).all()
+    assert sorted(p for p in prices if p is not None) == [225000, 440000, 450000]
+    assert import_rows(db, user.id, MARUTI, repriced, HYUNDAI) == 0
+
+    # other sellers import the same listings
+    other = create_random_user(db)
+    assert import_rows(db, other.id, MARUTI, repriced, HYUNDAI) == 3
+
+
+def test_import_csv_listing_id(db: Session) -> None:
+    user = create_random_user(db)
+    header = f"{HEADER},listing_id"
+    repriced = MARUTI.replace("450000", "440000")
+
+    def import_listings(*rows: str) -> int:
+        stream = io.BytesIO("\n".join([header, *rows]).encode())
+        return sum(n for _, n in import_csv_stream(stream, db, user.id, 1000))
+
+    assert import_listings(f"{MARUTI},A1", f"{HYUNDAI},B2") == 2
+    # a changed listing is updated in place, the last row of a listing wins
+    assert import_listings(f"{MARUTI},A1", f"{repriced},A1") == 1
+    prices = db.exec(select(Item.selling_price).where(Item.seller_id == user.id)).all()
+    assert sorted(p for p in prices if p is not None) == [225000, 440000]
+    assert import_listings(f"{repriced},A1", f"{HYUNDAI},B2") == 0
+    # identical units with their own listing ids are kept apart
+    assert import_listings(f"{repriced},A2") == 1
+
+
+def test_hash_items(db: Session) -> None:
+    user = create_random_user(db)
+    item_in = ItemCreate(
+        name="Maruti Swift Dzire VDI",
+        year=2014,
+        selling_price=400000,
+        km_driven=145500,
+        fuel_type="Diesel",
+        transmission="Manual",
+        owner_type="First Owner",
+        mileage=23.4,
+        engine="1248 CC",
+        max_power=74,
+        torque="190Nm@ 2000rpm",
+        seats=5,
+        listing_id="A1",
+    )
+    item = crud.create_item(session=db, item_in=item_in, seller_id=user.id)
+    copy = crud.create_item(session=db, item_in=item_in, seller_id=user.id)
+    assert item.listing_hash is not None and item.content_hash is not None
+    assert copy.listing_hash is None
+
+    # the import updates the item created through the API
+    stream = io.BytesIO(f"{HEADER},listing_id\n{MARUTI},A1".encode())
+    assert [n for _, n in import_csv_stream(stream, db, user.id, 10)] == [1]
+    db.refresh(item)
+    assert item.selling_price == 450000
+    count = db.exec(select(func.count()).where(Item.seller_id == user.id)).one()
+    assert count == 2
+
+
+def test_prune_items(db: Session) -> None:
+    user = create_random_user(db)
+    newer = MARUTI.replace("2014", "2015")
+    stream = io.BytesIO("\n".join([HEADER, MARUTI, newer, HYUNDAI]).encode())
+    list(import_csv_stream(stream, db, user.id, 10))
+    hyundai = db.exec(
+        select(Item).where(Item.seller_id == user.id, Item.year == 2010)
+    ).one()
+    db.add(Event(item_id=hyundai.id, event_type="view"))
+    db.commit()
+
+    # the next full feed only lists a repriced Maruti
+    seen: set[str] = set()
+    repriced = MARUTI.replace("450000", "440000")
+    stream = io.BytesIO("\n".join([HEADER, repriced]).encode())
+    assert [n for _, n in import_csv_stream(stream, db, user.id, 10, seen)] == [1]
+    assert len(seen) == 1
+    assert prune_items(db, user.id, seen) == 2
+    db.commit()
+    prices = db.exec(select(Item.selling_price).where(Item.seller_id == user.id)).all()
+    # the Hyundai is kept for its event
+    assert sorted(p for p in prices if p is not None) == [225000, 440000]
+
+
+def test_split_csv() -> None:
+    rows = [b"a,b\n", b'1,"x\ny"\n', b"2,z\n", b'3,"""q""\n"\n']
+    data = b"".join(rows)
+    for chunk_bytes in range(1, len(data) + 1):
+        pieces = list(split_csv(io.BytesIO(data), chunk_bytes))
+        assert all(piece.startswith(rows[0]) for piece in pieces)
+        assert b"".join(piece[len(rows[0]) :] for piece in pieces) == data[4:]
+        # pieces never end inside a quoted field
+        assert all(piece.count(b'"') % 2 == 0 for piece in pieces)
+    assert list(split_csv(io.BytesIO(b"a,b\n"), 8)) == []
+
+
+def test_import_csv_parallel(db: Session) -> None:
+    user = create_random_user(db)
+    lines = [HEADER] + [MARUTI.replace("2014", str(1900 + i)) for i in range(100)]
+    stream = io.BytesIO("\n".join([*lines, HYUNDAI]).encode())
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(2, mp_context=context) as pool:
+        counts = list(import_csv_parallel(stream, db, user.id, 1000, pool, 3))
+    assert len(counts) > 1
+    assert sum(rows for rows, _ in counts) == 101
+    assert sum(imported for _, imported in counts) == 101
+
+    items = db.exec(
+        select(Item).where(Item.seller_id == user.id).order_by(col(Item.year))
+    ).all()
+    assert [item.year for item in items] == [*range(1900, 2000), 2010]
+    assert items[-1].torque == "22.4 kgm, 1750rpm"
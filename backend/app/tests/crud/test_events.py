@@ -0,0 +1,12 @@
+from sqlmodel import Session, col, select, update
+
+from app.crud.events import sync_event_types
+from app.models import EVENT_TYPE_CATALOG, EventType
+
+
+def test_sync_event_types(db: Session) -> None:
+    db.exec(update(EventType).where(EventType.name == "purchase").values(weight=0.5))  # type: ignore
+    db.commit()
+    sync_event_types(session=db)
+    rows = db.exec(select(EventType).order_by(col(EventType.code))).all()
+    assert [(row.code, row.name, row.weight) for row in rows] == EVENT_TYPE_CATALOG
@@ -0,0 +1,79 @@
+import queue
+import time
+import uuid
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.ingest.buffer import EventBuffer, close_event_buffer, get_event_buffer
+from app.models import Event
+from app.tests.utils.item import create_random_item
+
+
+def make_event(item_id: uuid.UUID | None) -> Event:
+    return Event(item_id=item_id, event_type="view", timestamp=datetime.now())
+
+
+def stored(db: Session, item_id: uuid.UUID) -> int:
+    db.rollback()
+    return len(db.exec(select(Event).where(Event.item_id == item_id)).all())
+
+
+def test_flush_by_size(db: Session) -> None:
+    item = create_random_item(db)
+    buffer = EventBuffer(100, flush_size=2, flush_seconds=60)
+    try:
+        buffer.put(make_event(item.id))
+        buffer.put(make_event(item.id))
+        buffer.flush()
+        assert stored(db, item.id) == 2
+        assert buffer.flushed == 2
+    finally:
+        buffer.close()
+
+
+def test_close_drains(db: Session) -> None:
+    item = create_random_item(db)
+    buffer = EventBuffer(100, flush_size=100, flush_seconds=60)
+    buffer.put(make_event(item.id))
+    buffer.put(make_event(uuid.uuid4()))
+    buffer.close()
+    assert stored(db, item.id) == 1
+    assert (buffer.flushed, buffer.failed) == (1, 1)
+    with pytest.raises(queue.Full):
+        buffer.put(make_event(item.id))
+
+
+def test_backpressure() -> None:
+    # without a flusher the queue stays full
+    with patch.object(EventBuffer, "_run", lambda _self: None):
+        rejecting = EventBuffer(1, 1, 0.1, backpressure="reject")
+        shedding = EventBuffer(1, 1, 0.1, backpressure="shed")
+        blocking = EventBuffer(1, 1, 0.1, backpressure="block", block_seconds=0.05)
+    for buffer in (rejecting, shedding, blocking):
+        assert buffer.put(make_event(None))
+        assert len(buffer) == 1
+    with pytest.raises(queue.Full):
+        rejecting.put(make_event(None))
+    assert not shedding.put(make_event(None))
+    assert shedding.shed == 1
+    start = time.monotonic()
+    with pytest.raises(queue.Full):
+        blocking.put(make_event(None))
+    assert time.monotonic() - start >= 0.05
+
+
+def test_create_event_buffered(client: TestClient, db: Session) -> None:
+    item = create_random_item(db)
+    data = {"user_id": None, "item_id": str(item.id), "event_type": "click"}
+    with patch.object(settings, "EVENT_BUFFER_ENABLED", True):
+        response = client.post(f"{settings.API_V1_STR}/events/", json=data)
+        assert response.status_code == 202
+        assert "id" in response.json()
+        get_event_buffer().flush()
+        close_event_buffer()
+    assert stored(db, item.id) == 1
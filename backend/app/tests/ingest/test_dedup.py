@@ -0,0 +1,31 @@
+import uuid
+from unittest.mock import patch
+
+from app.ingest.dedup import BloomFilter, RotatingBloomFilter
+
+
+def test_bloom_filter() -> None:
+    bloom = BloomFilter(1000, 0.01)
+    keys = [str(uuid.uuid4()) for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+def test_rotating_bloom_filter() -> None:
+    clock = [0.0]
+    with patch("app.ingest.dedup.time.monotonic", lambda: clock[0]):
+        seen = RotatingBloomFilter(10, 100, 0.001)
+        assert not seen.check_and_add("a")
+        assert seen.check_and_add("a")
+        clock[0] = 15
+        # rotated into the previous filter, still remembered
+        assert not seen.check_and_add("b")
+        assert seen.check_and_add("a")
+        clock[0] = 26
+        assert not seen.check_and_add("a")
+        assert seen.check_and_add("b")
+        clock[0] = 100
+        assert not seen.check_and_add("b")
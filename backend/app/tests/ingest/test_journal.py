@@ -0,0 +1,163 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.ingest.journal import (
+    EventJournal,
+    close_event_journal,
+    encode_record,
+    read_segment,
+)
+from app.models import Event, Item, ItemPopularity
+from app.recommend.popularity import refresh_item_popularity
+from app.recommend.user_item_daily import refresh_user_item_daily
+from app.tests.recommend.test_user_item_daily import total_count
+from app.tests.utils.item import create_random_item
+
+
+def make_event(item: Item) -> Event:
+    return Event(
+        user_id=None,
+        item_id=item.id,
+        event_type="view",
+        timestamp=datetime.now(timezone.utc),
+    )
+
+
+def stored(db: Session, item: Item) -> list[Event]:
+    db.rollback()
+    return list(db.exec(select(Event).where(Event.item_id == item.id)).all())
+
+
+def open_journal(root: Path) -> EventJournal:
+    # replays are triggered by the tests
+    return EventJournal(root, 1024, fsync_seconds=0.001, replay_seconds=3600)
+
+
+def test_read_segment_skips_damaged_tail(db: Session, tmp_path: Path) -> None:
+    item = create_random_item(db)
+    events = [make_event(item) for _ in range(3)]
+    records = [encode_record(event) for event in events]
+    path = tmp_path / "segment.log"
+    path.write_bytes(records[0] + records[1] + records[2][:-1])
+    assert [e.id for e in read_segment(path)] == [events[0].id, events[1].id]
+
+    corrupt = bytearray(records[0] + records[1])
+    corrupt[-2] ^= 0xFF
+    path.write_bytes(bytes(corrupt))
+    assert [e.id for e in read_segment(path)] == [events[0].id]
+
+
+def test_append_and_replay(db: Session, tmp_path: Path) -> None:
+    item = create_random_item(db)
+    journal = open_journal(tmp_path)
+    try:
+        events = [make_event(item) for _ in range(10)]
+        for event in events:
+            journal.append(event)
+        # segments rotate at 1 KiB
+        assert len(list(journal.directory.glob("*.log"))) > 2
+
+        failure = OperationalError("INSERT", {}, Exception("database is down"))
+        with patch("app.ingest.journal.insert_events", side_effect=failure):
+            with pytest.raises(OperationalError):
+                journal.replay()
+        assert stored(db, item) == []
+
+        assert journal.replay() == 10
+        assert {e.id for e in stored(db, item)} == {e.id for e in events}
+        assert journal.replay() == 0
+    finally:
+        journal.close()
+    assert list(journal.directory.glob("*.log")) == []
+
+
+def test_takes_over_leftover_segments(db: Session, tmp_path: Path) -> None:
+    item = create_random_item(db)
+    event = make_event(item)
+    leftover = tmp_path / "worker-0"
+    leftover.mkdir()
+    # replayed twice: once before the crash, once by the next journal
+    (leftover / f"{1:020d}.log").write_bytes(encode_record(event) * 2)
+
+    first, second = open_journal(tmp_path), open_journal(tmp_path)
+    try:
+        assert first.directory == leftover
+        assert second.directory == tmp_path / "worker-1"
+        assert first.replay() == 2
+        assert [e.id for e in stored(db, item)] == [event.id]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_replay_behind_watermarks(db: Session, tmp_path: Path) -> None:
+    item = create_random_item(db)
+    # journaled during an outage longer than ROLLUP_LAG_SECONDS
+    event = Event(
+        user_id=item.seller_id,
+        item_id=item.id,
+        event_type="view",
+        timestamp=datetime.now(timezone.utc) - timedelta(minutes=5),
+    )
+    journal = open_journal(tmp_path)
+    try:
+        journal.append(event)
+        journal.append(event)
+        refresh_item_popularity(db)
+        refresh_user_item_daily(db)
+        assert journal.replay() == 2
+    finally:
+        journal.close()
+
+    assert [e.id for e in stored(db, item)] == [event.id]
+    popularity = db.get(ItemPopularity, item.id)
+    assert popularity is not None
+    assert popularity.event_count == 1
+    assert total_count(db, item.seller_id) == 1
+
+
+def test_create_event_journaled(
+    client: TestClient, db: Session, tmp_path: Path
+) -> None:
+    item = create_random_item(db)
+    data = {"user_id": None, "item_id": str(item.id), "event_type": "click"}
+    with (
+        patch.object(settings, "EVENT_JOURNAL_ENABLED", True),
+        patch.object(settings, "EVENT_JOURNAL_DIR", str(tmp_path)),
+    ):
+        response = client.post(f"{settings.API_V1_STR}/events/", json=data)
+        assert response.status_code == 202
+        close_event_journal()
+    assert [str(e.id) for e in stored(db, item)] == [response.json()["id"]]
+
+
+def test_create_event_journaled_database_down(
+    client: TestClient, db: Session, tmp_path: Path
+) -> None:
+    item = create_random_item(db)
+    data = {
+        "user_id": None,
+        "item_id": str(item.id),
+        "event_type": "click",
+        "idempotency_key": str(uuid.uuid4()),
+    }
+    failure = OperationalError("SELECT", {}, Exception("database is down"))
+    with (
+        patch.object(settings, "EVENT_JOURNAL_ENABLED", True),
+        patch.object(settings, "EVENT_JOURNAL_DIR", str(tmp_path)),
+    ):
+        first = client.post(f"{settings.API_V1_STR}/events/", json=data)
+        # the retry cannot be checked and is journaled as well
+        with patch("app.api.routes.events.find_duplicates", side_effect=failure):
+            retry = client.post(f"{settings.API_V1_STR}/events/", json=data)
+        assert retry.status_code == 202
+        close_event_journal()
+    assert [str(e.id) for e in stored(db, item)] == [first.json()["id"]]
@@ -0,0 +1,90 @@
+import uuid
+from datetime import date, datetime, timezone
+from unittest.mock import patch
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.ingest.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    create_event_partitions,
+    drop_event_partitions,
+    event_partitions,
+    maintain_event_partitions,
+    parse_bound,
+)
+from app.models import Event
+
+
+def partition_of(db: Session, event_id: uuid.UUID) -> str:
+    partition: str = db.execute(
+        text("SELECT tableoid::regclass::text FROM event WHERE id = :id"),
+        {"id": event_id},
+    ).scalar_one()
+    return partition
+
+
+def test_add_months() -> None:
+    month = datetime(2024, 11, 1, tzinfo=timezone.utc)
+    assert add_months(month, 2) == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert add_months(month, -11) == datetime(2023, 12, 1, tzinfo=timezone.utc)
+
+
+def test_parse_bound() -> None:
+    utc = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert parse_bound("2024-01-01 00:00:00+00") == utc
+    assert parse_bound("2024-01-01 05:30:00+05:30") == utc
+    assert parse_bound("2023-12-31 19:00:00-05") == utc
+
+
+def test_partition_lifecycle(db: Session) -> None:
+    # far in the past so the test never touches partitions of live events
+    event = Event(
+        event_type="view", timestamp=datetime(1990, 2, 10, tzinfo=timezone.utc)
+    )
+    db.add(event)
+    db.commit()
+    event_id = event.id
+    assert partition_of(db, event_id) == DEFAULT_PARTITION
+
+    created = create_event_partitions(db, date(1990, 1, 20), 2)
+    assert created == ["event_p199001", "event_p199002"]
+    assert create_event_partitions(db, date(1990, 1, 1), 2) == []
+    # moved out of the default partition
+    assert partition_of(db, event_id) == "event_p199002"
+
+    retired = drop_event_partitions(
+        db, datetime(1990, 2, 1, tzinfo=timezone.utc), detach_only=True
+    )
+    assert retired == ["event_p199001"]
+    assert db.execute(text("SELECT to_regclass('event_p199001')")).scalar()
+    db.execute(text("DROP TABLE event_p199001"))
+    db.commit()
+
+    retired = drop_event_partitions(db, datetime(1990, 3, 1, tzinfo=timezone.utc))
+    assert retired == ["event_p199002"]
+    assert db.exec(select(Event).where(Event.id == event_id)).first() is None
+    assert "event_p199002" not in event_partitions(db)
+
+
+def test_maintain_event_partitions(db: Session) -> None:
+    now = datetime.now(timezone.utc)
+    with patch.object(settings, "EVENT_RETENTION_MONTHS", 0):
+        maintain_event_partitions(db, now)
+    lowers = {lower for lower, _ in event_partitions(db).values()}
+    month = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    for i in range(settings.EVENT_PARTITIONS_AHEAD_MONTHS + 1):
+        assert add_months(month, i) in lowers
+
+
+def test_recent_events_prune_partitions(db: Session) -> None:
+    create_event_partitions(db, date(1990, 5, 1), 1)
+    plan = db.execute(
+        text("EXPLAIN SELECT count(*) FROM event WHERE timestamp >= :since"),
+        {"since": datetime.now(timezone.utc)},
+    ).all()
+    scanned = "\n".join(row[0] for row in plan)
+    assert "event_p199005" not in scanned
+    drop_event_partitions(db, datetime(1990, 6, 1, tzinfo=timezone.utc))
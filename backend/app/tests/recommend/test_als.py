@@ -0,0 +1,75 @@
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from app.recommend.als import AlsModel, train_als
+from app.recommend.interactions import Interactions
+
+
+def make_interactions() -> Interactions:
+    # users 0-2 like items 0-2, users 3-5 like items 3-5; user 0 misses item 2
+    users, items = [], []
+    for user in range(6):
+        group = range(0, 3) if user < 3 else range(3, 6)
+        for item in group:
+            if (user, item) != (0, 2):
+                users.append(user)
+                items.append(item)
+    return Interactions.from_arrays(
+        np.array(users),
+        np.array(items),
+        np.ones(len(users)),
+        [uuid.uuid4() for _ in range(6)],
+        [uuid.uuid4() for _ in range(6)],
+    )
+
+
+def test_train_als() -> None:
+    interactions = make_interactions()
+    users, items = train_als(
+        interactions, n_factors=4, iterations=10, regularization=0.1, alpha=10.0
+    )
+    assert users.shape == (6, 4)
+    assert items.shape == (6, 4)
+    assert users.dtype == np.float32
+
+    scores = items @ users[0]
+    # the unseen item of the user's own group beats the other group
+    assert scores[2] > scores[3:].max()
+
+
+def test_save_load_and_recommend(tmp_path: Path) -> None:
+    interactions = make_interactions()
+    users, items = train_als(
+        interactions, n_factors=4, iterations=10, regularization=0.1, alpha=10.0
+    )
+    directory = tmp_path / "als"
+    AlsModel.save(directory, interactions.user_ids, users, interactions.item_ids, items)
+    # publishing a new version replaces the previous one
+    AlsModel.save(directory, interactions.user_ids, users, interactions.item_ids, items)
+    assert len(list(tmp_path.glob("als-*"))) == 1
+
+    model = AlsModel.load(directory)
+    assert model is not None
+    assert isinstance(model.item_factors, np.memmap)
+
+    user_id = interactions.user_ids[0]
+    vector = model.user_vector(user_id)
+    assert vector is not None
+    assert np.allclose(vector, users[0])
+
+    recommended = model.recommend(user_id, 3)
+    assert recommended is not None
+    assert set(recommended) == set(interactions.item_ids[:3])
+    assert model.recommend(uuid.uuid4(), 3) is None
+
+    unknown = uuid.uuid4()
+    batch = model.recommend_many([user_id, interactions.user_ids[4], unknown], 3)
+    assert set(batch[user_id]) == set(recommended)
+    assert set(batch[interactions.user_ids[4]]) == set(interactions.item_ids[3:])
+    assert unknown not in batch
+
+
+def test_load_missing(tmp_path: Path) -> None:
+    assert AlsModel.load(tmp_path / "als") is None
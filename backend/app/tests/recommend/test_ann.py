@@ -0,0 +1,108 @@
+import uuid
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from app.recommend.ann import IVFIndex, layout_signature
+
+
+def exact_top(
+    vectors: npt.NDArray[np.float32], query: npt.NDArray[np.float32], k: int
+) -> set[int]:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return {int(i) for i in np.argsort(distances)[:k]}
+
+
+def random_vectors(n: int = 2000, dim: int = 8) -> npt.NDArray[np.float32]:
+    rng = np.random.default_rng(42)
+    return rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def test_search_recall() -> None:
+    vectors = random_vectors()
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    index = IVFIndex.train(vectors, n_lists=32)
+    assert index.n_lists == 32
+    assert index.offsets[-1] == len(vectors)
+
+    hits = 0
+    for query in vectors[:20]:
+        positions, distances = index.search(vectors, sq_norms, query, 10, n_probe=8)
+        assert np.all(np.diff(distances) >= 0)
+        hits += len({int(i) for i in positions} & exact_top(vectors, query, 10))
+    assert hits / 200 > 0.8
+
+
+def test_full_probe_is_exact() -> None:
+    vectors = random_vectors()
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    index = IVFIndex.train(vectors, n_lists=16)
+    query = vectors[0]
+    positions, _ = index.search(vectors, sq_norms, query, 5, n_probe=16)
+    assert {int(i) for i in positions} == exact_top(vectors, query, 5)
+
+
+def test_search_respects_valid_mask() -> None:
+    vectors = random_vectors()
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    index = IVFIndex.train(vectors, n_lists=16)
+    valid = np.zeros(len(vectors), dtype=bool)
+    valid[::100] = True
+    positions, _ = index.search(vectors, sq_norms, vectors[1], 5, 1, valid=valid)
+    assert len(positions) == 5
+    assert valid[positions].all()
+
+
+def test_search_beyond() -> None:
+    vectors = random_vectors()
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    index = IVFIndex.train(vectors, n_lists=16)
+    query = vectors[0]
+    _, nearest = index.search(vectors, sq_norms, query, 20, n_probe=16)
+    positions, distances = index.search(
+        vectors, sq_norms, query, 10, n_probe=1, beyond=float(nearest[-1])
+    )
+    # the probe is widened past the lists of the nearest rows
+    assert len(positions) == 10
+    assert distances.min() >= nearest[-1]
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    vectors = random_vectors()
+    ids = [uuid.uuid4() for _ in range(len(vectors))]
+    index = IVFIndex.train(vectors, n_lists=16)
+    path = tmp_path / "index.npz"
+    # 7 numeric features and a categorical one with a single value
+    layout = layout_signature([{"Diesel": 0}])
+    index.save(path, ids, layout)
+
+    assert IVFIndex.load(tmp_path / "missing.npz", ids, vectors, layout) is None
+    other = layout_signature([{"Diesel": 0}, {"Manual": 0}])
+    assert IVFIndex.load(path, ids, vectors, other) is None
+
+    # a new item unknown to the saved index gets assigned on load
+    new_ids = [*ids[1:], uuid.uuid4()]
+    loaded = IVFIndex.load(path, new_ids, vectors, layout)
+    assert loaded is not None
+    assert np.array_equal(loaded.centroids, index.centroids)
+    assert np.array_equal(loaded.assignments[:-1], index.assignments[1:])
+    assert 0 <= loaded.assignments[-1] < loaded.n_lists
+
+
+def test_load_new_vocabulary(tmp_path: Path) -> None:
+    vectors = random_vectors()
+    ids = [uuid.uuid4() for _ in range(len(vectors))]
+    index = IVFIndex.train(vectors, n_lists=16)
+    path = tmp_path / "index.npz"
+    index.save(path, ids, layout_signature([{"Diesel": 0}]))
+
+    # "CNG" sorts before "Diesel" and gets a column of its own
+    widened = np.insert(vectors, 7, 0.0, axis=1)
+    layout = layout_signature([{"CNG": 0, "Diesel": 1}])
+    loaded = IVFIndex.load(path, ids, widened, layout)
+    assert loaded is not None
+    assert np.array_equal(loaded.centroids[:, :7], index.centroids[:, :7])
+    assert np.array_equal(loaded.centroids[:, 7], np.zeros(16))
+    assert np.array_equal(loaded.centroids[:, 8], index.centroids[:, 7])
+    assert np.array_equal(loaded.assignments, index.assignments)
@@ -0,0 +1,68 @@
+from app.models import ItemQuery
+from app.recommend.cache import QueryCache, similar_query_key
+
+
+def test_lru_eviction() -> None:
+    cache = QueryCache(max_size=2, ttl_seconds=60)
+    cache.put("a", 1, cache.generation)
+    cache.put("b", 2, cache.generation)
+    assert cache.get("a") == 1
+    cache.put("c", 3, cache.generation)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["size"] == 2
+
+
+def test_ttl_expiry() -> None:
+    cache = QueryCache(max_size=2, ttl_seconds=0)
+    cache.put("a", 1, cache.generation)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_invalidate() -> None:
+    cache = QueryCache(max_size=2, ttl_seconds=60)
+    generation = cache.generation
+    cache.put("a", 1, generation)
+    cache.invalidate()
+    assert cache.get("a") is None
+
+    # computed before the invalidation, must not be stored
+    cache.put("a", 1, generation)
+    assert cache.get("a") is None
+    cache.put("a", 1, cache.generation)
+    assert cache.get("a") == 1
+
+
+def test_disabled() -> None:
+    cache = QueryCache(max_size=0, ttl_seconds=60)
+    cache.put("a", 1, cache.generation)
+    assert cache.get("a") is None
+
+
+def test_similar_query_key() -> None:
+    a = ItemQuery.model_validate(
+        {
+            "min_year": "2010",
+            "min_price": 5000,
+            "max_price": None,
+            "max_km_driven": None,
+            "fuel_type": "Diesel",
+        }
+    )
+    b = ItemQuery(
+        fuel_type="Diesel",
+        max_km_driven=None,
+        max_price=None,
+        min_price=5000.0,
+        min_year=2010,
+    )
+    assert similar_query_key(a, 10, 0) == similar_query_key(b, 10, 0)
+    assert similar_query_key(a, 10, 0) != similar_query_key(a, 10, 10)
@@ -0,0 +1,144 @@
+import uuid
+from pathlib import Path
+
+import numpy as np
+from sqlmodel import Session
+
+from app import crud
+from app.core.bus import EVENTS_CREATED, bus
+from app.models import Event, UserCreate
+from app.recommend.covisit import (
+    CoVisitation,
+    RecentCoVisits,
+    blend,
+    covisited_scores,
+)
+from app.recommend.interactions import Interactions
+from app.tests.recommend.test_features import make_matrix
+from app.tests.utils.item import create_random_item
+from app.tests.utils.utils import random_email, random_lower_string
+
+
+def make_covisitation(top_n: int = 10) -> CoVisitation:
+    item_ids = [uuid.uuid4() for _ in range(4)]
+    # items 0 and 1 are viewed together by both users, item 2 once with 0
+    users = np.array([0, 0, 0, 1, 1, 1])
+    items = np.array([0, 1, 2, 0, 1, 1])
+    weights = np.ones(len(users))
+    user_ids = [uuid.uuid4() for _ in range(2)]
+    interactions = Interactions.from_arrays(users, items, weights, user_ids, item_ids)
+    return CoVisitation.from_interactions(interactions, top_n)
+
+
+def test_cooccurrence_neighbours() -> None:
+    covisitation = make_covisitation()
+    first, second, third, fourth = covisitation.ids
+    scores = covisitation.scores(first)
+    assert list(scores) == [second, third]
+    assert scores[second] > scores[third]
+    assert first not in scores
+    assert covisitation.scores(fourth) == {}
+    assert covisitation.scores(uuid.uuid4()) == {}
+
+
+def test_top_n_pruning() -> None:
+    covisitation = make_covisitation(top_n=1)
+    assert covisitation.neighbours.getnnz(axis=1).max() == 1
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    covisitation = make_covisitation()
+    path = tmp_path / "covisit.npz"
+    covisitation.save(path)
+    loaded = CoVisitation.load(path)
+    assert loaded is not None
+    assert loaded.ids == covisitation.ids
+    assert loaded.scores(loaded.ids[0]) == covisitation.scores(loaded.ids[0])
+
+
+def test_blend_promotes_covisited_items() -> None:
+    matrix = make_matrix()
+    vector = matrix.vector(matrix.ids[0])
+    assert vector is not None
+    positions, distances = matrix.nearest(vector, 1, exclude=matrix.ids[0])
+    assert positions.tolist() == [1]
+
+    covisited = {matrix.ids[3]: 1.0}
+    candidates, scores = blend(matrix, vector, positions, covisited, 0.0)
+    assert candidates.tolist() == [1]
+    assert np.isclose(scores[0], 1.0 / (1.0 + distances[0]))
+    candidates, scores = blend(matrix, vector, positions, covisited, 0.9)
+    assert candidates.tolist() == [1, 3]
+    assert scores[1] > scores[0]
+
+
+def test_from_session(db: Session) -> None:
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    first, second = create_random_item(db), create_random_item(db)
+    for item in (first, second, second):
+        db.add(Event(user_id=user.id, item_id=item.id, event_type="click"))
+    db.commit()
+
+    covisitation = CoVisitation.from_session(db, top_n=10)
+    assert second.id in covisitation.scores(first.id)
+    assert first.id in covisitation.scores(second.id)
+
+
+def test_recent_covisits() -> None:
+    recent = RecentCoVisits(history=2, max_users=2, max_items=10, top_n=10)
+    first, second, third = (uuid.uuid4() for _ in range(3))
+    alice, bob, carol = (uuid.uuid4() for _ in range(3))
+    for user, item in [
+        (alice, first),
+        (alice, second),
+        (alice, second),
+        (bob, first),
+        (bob, third),
+    ]:
+        recent.record(user, item)
+    # repeated events of a user count once
+    assert recent.scores(second) == {first: 1 / np.sqrt(2)}
+    assert recent.scores(first) == {second: 1 / np.sqrt(2), third: 1 / np.sqrt(2)}
+
+    # the least recently active user is forgotten
+    recent.record(carol, third)
+    recent.record(alice, third)
+    assert recent.scores(third)[first] == 1 / np.sqrt(2 * 3)
+    assert second not in recent.scores(third)
+
+    recent.clear()
+    assert recent.scores(first) == {}
+
+
+def test_recent_covisits_bounded() -> None:
+    first, second, third, fourth = (uuid.uuid4() for _ in range(4))
+    alice, bob = uuid.uuid4(), uuid.uuid4()
+    recent = RecentCoVisits(history=10, max_users=10, max_items=2, top_n=1)
+    recent.record(alice, first)
+    recent.record(alice, second)
+    # the least recently touched item is forgotten
+    recent.record(bob, third)
+    assert len(recent) == 2
+    assert recent.scores(second) == {}
+    assert recent.scores(first) == {}
+
+    recent = RecentCoVisits(history=10, max_users=10, max_items=10, top_n=1)
+    for item in [first, second, third, fourth]:
+        recent.record(alice, item)
+    # pairs beyond 2 * top_n are cut back to the top_n most frequent
+    assert list(recent.scores(first)) == [second]
+
+
+def test_published_events_are_covisited() -> None:
+    user_id, first, second = (uuid.uuid4() for _ in range(3))
+    bus.publish(
+        EVENTS_CREATED,
+        [
+            Event(user_id=user_id, item_id=item_id, event_type="view")
+            for item_id in (first, second)
+        ],
+    )
+    assert covisited_scores(first) == {second: 1.0}
@@ -0,0 +1,184 @@
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import ItemCreate, ItemQuery
+from app.recommend.ann import IVFIndex
+from app.recommend.features import (
+    ItemFeatureMatrix,
+    attach_index,
+    get_feature_matrix,
+)
+from app.tests.utils.item import create_random_item
+
+
+def make_matrix() -> ItemFeatureMatrix:
+    ids = [uuid.uuid4() for _ in range(4)]
+    numeric = np.array(
+        [
+            [2014, 450000, 145500, 23.4, 74, 5],
+            [2015, 460000, 140000, 23.0, 75, 5],
+            [2005, 90000, 250000, None, 50, 4],
+            [2020, 1500000, 10000, 17.0, 150, 7],
+        ],
+        dtype=np.float64,
+    )
+    categorical = [
+        ("Diesel", "Manual", "First Owner"),
+        ("Diesel", "Manual", "First Owner"),
+        ("Petrol", "Manual", "Third Owner"),
+        ("Petrol", "Automatic", None),
+    ]
+    return ItemFeatureMatrix(ids, numeric, categorical)
+
+
+def test_matrix_shape() -> None:
+    matrix = make_matrix()
+    assert len(matrix) == 4
+    # 6 numeric + 2 fuel types + 2 transmissions + 2 owner types
+    assert matrix.matrix.shape == (4, 12)
+    assert matrix.matrix.dtype == np.float32
+    assert not np.isnan(matrix.matrix).any()
+
+
+def test_nearest_orders_by_distance() -> None:
+    matrix = make_matrix()
+    anchor = matrix.ids[0]
+    vector = matrix.vector(anchor)
+    assert vector is not None
+
+    positions, distances = matrix.nearest(vector, 3, exclude=anchor)
+    assert [matrix.ids[i] for i in positions][0] == matrix.ids[1]
+    assert matrix.ids.index(anchor) not in positions
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_nearest_many_matches_nearest() -> None:
+    matrix = make_matrix()
+    exclude = np.array([0, -1])
+    neighbours, distances = matrix.nearest_many(matrix.matrix[:2], 4, exclude)
+    assert neighbours.shape == (2, 4)
+
+    positions, expected = matrix.nearest(matrix.matrix[0], 4, exclude=matrix.ids[0])
+    assert neighbours[0, :3].tolist() == positions.tolist()
+    assert neighbours[0, 3] == -1
+    assert np.allclose(distances[0, :3], expected, atol=1e-4)
+
+    positions, _ = matrix.nearest(matrix.matrix[1], 4)
+    assert neighbours[1].tolist() == positions.tolist()
+
+
+def test_encode_matches_stored_row() -> None:
+    matrix = make_matrix()
+    item = ItemCreate(
+        name="Maruti Swift Dzire VDI",
+        year=2014,
+        selling_price=450000,
+        km_driven=145500,
+        fuel_type="Diesel",
+        transmission="Manual",
+        owner_type="First Owner",
+        mileage=23.4,
+        max_power=74,
+        seats=5,
+    )
+    stored = matrix.vector(matrix.ids[0])
+    assert stored is not None
+    assert np.allclose(matrix.encode(item), stored)
+
+
+def test_empty_matrix() -> None:
+    matrix = ItemFeatureMatrix([], np.zeros((0, 6)), [])
+    positions, distances = matrix.nearest(
+        np.zeros(matrix.dimension, dtype=np.float32), 10
+    )
+    assert len(positions) == 0
+    assert len(distances) == 0
+
+
+def test_encode_query_mask() -> None:
+    matrix = make_matrix()
+    query = ItemQuery(
+        min_year=2010,
+        min_price=None,
+        max_price=500000,
+        max_km_driven=None,
+        fuel_type="Diesel",
+    )
+    vector, valid = matrix.encode_query(query)
+    assert valid.tolist() == [True, True, False, False]
+
+    positions, _ = matrix.nearest(vector, 10, valid=valid)
+    assert sorted(map(int, positions)) == [0, 1]
+
+
+def test_nearest_with_index() -> None:
+    matrix = make_matrix()
+    matrix.index = IVFIndex.train(matrix.matrix, n_lists=2)
+    anchor = matrix.ids[0]
+    vector = matrix.vector(anchor)
+    assert vector is not None
+    positions, _ = matrix.nearest(vector, 1, exclude=anchor)
+    assert [matrix.ids[i] for i in positions] == [matrix.ids[1]]
+
+
+def test_nearest_beyond() -> None:
+    matrix = make_matrix()
+    vector = matrix.matrix[0]
+    positions, distances = matrix.nearest(vector, 4)
+    exact = matrix.exact_distances(vector, positions)
+    assert np.allclose(exact, distances, atol=1e-4)
+    beyond, _ = matrix.nearest(vector, 4, beyond=float(distances[2]))
+    assert beyond.tolist() == positions[2:].tolist()
+
+    matrix.index = IVFIndex.train(matrix.matrix, n_lists=2)
+    beyond, _ = matrix.nearest(vector, 4, beyond=float(distances[2]))
+    assert beyond.tolist() == positions[2:].tolist()
+
+
+def test_iter_top_k() -> None:
+    matrix = make_matrix()
+    blocks = list(matrix.iter_top_k(5, batch_size=3))
+    rows = np.concatenate([rows for rows, _, _ in blocks])
+    assert sorted(rows.tolist()) == [0, 1, 2, 3]
+
+    rows, neighbours, distances = blocks[0]
+    assert neighbours.shape == (3, 5)
+    assert neighbours[0, 0] == 1
+    # only 3 other items exist
+    assert (neighbours[:, 3:] == -1).all()
+    assert (neighbours[:, :3] != rows[:, None]).all()
+    assert np.all(np.diff(distances[:, :3], axis=1) >= 0)
+
+
+def test_attach_index_never_trains(tmp_path: Path) -> None:
+    matrix = make_matrix()
+    with (
+        patch.object(settings, "MODEL_DIR", str(tmp_path)),
+        patch.object(settings, "ANN_MIN_ITEMS", 1),
+    ):
+        attach_index(matrix)
+        assert matrix.index is None
+
+        IVFIndex.train(matrix.matrix, n_lists=2).save(
+            settings.ann_index_path, matrix.ids, matrix.layout
+        )
+        attach_index(matrix)
+    assert matrix.index is not None
+
+
+def test_feature_matrix_rebuild_debounced(db: Session) -> None:
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 3600):
+        matrix = get_feature_matrix(db)
+        item = create_random_item(db)
+        assert get_feature_matrix(db) is matrix
+    with patch.object(settings, "SIMILARITY_ENGINE_REBUILD_SECONDS", 0):
+        rebuilt = get_feature_matrix(db)
+        assert rebuilt is not matrix
+        assert item.id in rebuilt.positions
+        # nothing changed since
+        assert get_feature_matrix(db) is rebuilt
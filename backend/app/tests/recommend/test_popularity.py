@@ -0,0 +1,87 @@
+import math
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import Event, ItemPopularity
+from app.recommend.popularity import (
+    ROLLUP_NAME,
+    lock_watermark,
+    refresh_item_popularity,
+)
+from app.recommend.refresh import PopularityRefresher
+from app.tests.utils.item import create_random_item
+
+
+def add_events(db: Session, item_id: uuid.UUID, timestamps: list[datetime]) -> None:
+    db.add_all(
+        [
+            Event(item_id=item_id, event_type="view", timestamp=timestamp)
+            for timestamp in timestamps
+        ]
+    )
+    db.commit()
+
+
+def test_refresh_item_popularity(db: Session) -> None:
+    now = datetime.now(timezone.utc)
+    old, recent = create_random_item(db), create_random_item(db)
+    # three events a month ago weigh less than one from yesterday
+    add_events(db, old.id, [now - timedelta(days=30)] * 3)
+    add_events(db, recent.id, [now - timedelta(days=1)])
+
+    refresh_item_popularity(db, until=now - timedelta(minutes=10), rebuild=True)
+    old_row = db.get(ItemPopularity, old.id)
+    recent_row = db.get(ItemPopularity, recent.id)
+    assert old_row is not None and recent_row is not None
+    assert old_row.event_count == 3
+    assert recent_row.event_count == 1
+    assert recent_row.score > old_row.score
+
+    # only events after the watermark are folded in
+    add_events(db, old.id, [now - timedelta(minutes=5)] * 2)
+    refresh_item_popularity(db, until=now - timedelta(minutes=1))
+    db.refresh(old_row)
+    assert old_row.event_count == 5
+
+    rate = math.log(2) / (settings.POPULARITY_HALF_LIFE_DAYS * 86400.0)
+    x = [
+        t.timestamp() * rate
+        for t in [now - timedelta(days=30)] * 3 + [now - timedelta(minutes=5)] * 2
+    ]
+    expected = max(x) + math.log(sum(math.exp(v - max(x)) for v in x))
+    assert math.isclose(old_row.score, expected, rel_tol=1e-9)
+
+    # a second refresh over the same range changes nothing
+    refresh_item_popularity(db, until=now - timedelta(minutes=1))
+    db.refresh(old_row)
+    assert old_row.event_count == 5
+
+
+def test_popularity_refresher(db: Session) -> None:
+    item = create_random_item(db)
+    # earlier refreshes may have moved the watermark close to now, the event
+    # must come after it and the refresh must not leave it for the next one
+    watermark = lock_watermark(db, ROLLUP_NAME)
+    db.commit()
+    now = datetime.now(timezone.utc)
+    assert watermark is not None
+    assert watermark.watermark is None or watermark.watermark < now
+    add_events(db, item.id, [now])
+
+    refresher = PopularityRefresher(0.01)
+    with patch.object(settings, "ROLLUP_LAG_SECONDS", 0):
+        try:
+            for _ in range(500):
+                row = db.get(ItemPopularity, item.id, populate_existing=True)
+                if row is not None:
+                    break
+                time.sleep(0.01)
+        finally:
+            refresher.close()
+    assert row is not None
+    assert row.event_count == 1
@@ -0,0 +1,133 @@
+"""
+Plan regression tests: every statement a recommender path sends to the
+database must be answerable from an index. Plans are taken with sequential
+scans disabled, so a filtered `Seq Scan` in a plan means no usable index
+exists. Unfiltered scans (e.g. a `LIMIT n` filler) only read what they return.
+"""
+
+import json
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Event, Item, ItemQuery
+from app.recommend import find_most_popular_items, find_similar_query
+from app.recommend.popularity import refresh_item_popularity
+from app.recommend.recommender import find_recommended_items_batch
+from app.recommend.trending import TrendingCounters
+from app.tests.utils.item import create_random_item
+
+
+@contextmanager
+def captured_statements() -> Iterator[list[tuple[str, Any]]]:
+    statements: list[tuple[str, Any]] = []
+
+    def capture(
+        conn: Any,  # noqa: ARG001
+        cursor: Any,  # noqa: ARG001
+        statement: str,
+        parameters: Any,
+        context: Any,  # noqa: ARG001
+        executemany: bool,  # noqa: ARG001
+    ) -> None:
+        if statement.lstrip().upper().startswith(("SELECT", "WITH", "INSERT")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def seq_scans(plan: dict[str, Any]) -> list[str]:
+    found = []
+    if plan["Node Type"] == "Seq Scan" and "Filter" in plan:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def assert_index_backed(statements: list[tuple[str, Any]]) -> None:
+    assert statements
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            result: Any = connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            ).scalar()
+            plan = (json.loads(result) if isinstance(result, str) else result)[0]
+            assert seq_scans(plan["Plan"]) == [], statement
+        connection.rollback()
+
+
+@pytest.fixture(scope="module")
+def seeded(db: Session) -> Item:
+    item = create_random_item(db)
+    for _ in range(5):
+        other = create_random_item(db)
+        db.add(Event(user_id=other.seller_id, item_id=item.id, event_type="view"))
+    db.add(Event(user_id=item.seller_id, item_id=item.id, event_type="view"))
+    db.commit()
+    return item
+
+
+def explain(db: Session, call: Callable[[], Any]) -> None:
+    with captured_statements() as statements:
+        call()
+    db.rollback()
+    assert_index_backed(statements)
+
+
+def test_similar_query_sql_plan(db: Session, seeded: Item) -> None:
+    query = ItemQuery(
+        min_year=2000,
+        min_price=0,
+        max_price=seeded.selling_price,
+        max_km_driven=seeded.km_driven,
+        fuel_type=seeded.fuel_type,
+    )
+    with (
+        patch.object(settings, "SIMILARITY_ENGINE_ENABLED", False),
+        patch.object(settings, "SIMILAR_QUERY_CACHE_SIZE", 0),
+    ):
+        explain(db, lambda: find_similar_query(db, query, limit=5, offset=0))
+
+
+def test_user_popularity_plan(db: Session, seeded: Item) -> None:
+    explain(db, lambda: find_most_popular_items(db, limit=5, user_id=seeded.seller_id))
+    explain(
+        db,
+        lambda: find_recommended_items_batch(db, [seeded.seller_id], limit=5),
+    )
+
+
+def test_popularity_rollup_plans(db: Session, seeded: Item) -> None:  # noqa: ARG001
+    explain(db, lambda: refresh_item_popularity(db))
+    explain(db, lambda: find_most_popular_items(db, limit=5))
+
+
+def test_trending_plan(db: Session, seeded: Item) -> None:  # noqa: ARG001
+    explain(db, lambda: TrendingCounters.from_session(db))
+
+
+def test_item_foreign_key_plans(db: Session, seeded: Item) -> None:
+    # lookups done by foreign key checks when an item or user is deleted
+    explain(
+        db,
+        lambda: db.exec(select(Event.id).where(Event.item_id == seeded.id)).all(),
+    )
+    explain(
+        db,
+        lambda: db.exec(
+            select(Item.id).where(Item.seller_id == seeded.seller_id)
+        ).all(),
+    )
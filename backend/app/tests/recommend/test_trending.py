@@ -0,0 +1,57 @@
+import time
+import uuid
+
+from sqlmodel import Session
+
+from app.models import Event
+from app.recommend.trending import TrendingCounters
+from app.tests.utils.item import create_random_item
+
+
+def test_windows() -> None:
+    now = time.time()
+    counters = TrendingCounters(now)
+    recent, earlier, old = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    counters.record(recent, now, count=2)
+    counters.record(earlier, now - 3 * 3600, count=3)
+    counters.record(old, now - 3 * 86400, count=5)
+
+    assert counters.top("1h", 10, now) == [recent]
+    assert counters.top("24h", 10, now) == [earlier, recent]
+    assert counters.top("7d", 10, now) == [old, earlier, recent]
+    assert counters.top("7d", 1, now) == [old]
+
+
+def test_expiry() -> None:
+    now = time.time()
+    counters = TrendingCounters(now)
+    item = uuid.uuid4()
+    counters.record(item, now)
+
+    assert counters.top("1h", 10, now + 2 * 3600) == []
+    assert counters.top("24h", 10, now + 2 * 3600) == [item]
+    assert counters.top("24h", 10, now + 2 * 86400) == []
+    assert counters.top("7d", 10, now + 2 * 86400) == [item]
+    assert counters.top("7d", 10, now + 8 * 86400) == []
+    assert counters.totals["7d"][0] == 0
+
+
+def test_grow() -> None:
+    counters = TrendingCounters(capacity=2)
+    ids = [uuid.uuid4() for _ in range(5)]
+    for i, item_id in enumerate(ids):
+        counters.record(item_id, count=i + 1)
+    assert len(counters) == 5
+    assert counters.top("1h", 5) == ids[::-1]
+
+
+def test_from_session(db: Session) -> None:
+    item = create_random_item(db)
+    db.add_all([Event(item_id=item.id, event_type="view") for _ in range(3)])
+    db.commit()
+
+    counters = TrendingCounters.from_session(db)
+    position = counters.positions[item.id]
+    assert counters.totals["1h"][position] == 3
+    assert counters.totals["24h"][position] == 3
+    assert counters.totals["7d"][position] == 3
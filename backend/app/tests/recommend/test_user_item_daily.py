@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session, func, select
+
+from app.models import Event, UserItemDaily
+from app.recommend.user_item_daily import refresh_user_item_daily, user_item_counts
+from app.tests.utils.item import create_random_item
+
+
+def total_count(db: Session, user_id: uuid.UUID) -> int:
+    counts = user_item_counts()
+    total: int = db.exec(
+        select(func.sum(counts.c.count)).where(counts.c.user_id == user_id)
+    ).one()
+    return total
+
+
+def test_refresh_user_item_daily(db: Session) -> None:
+    item = create_random_item(db)
+    user_id = item.seller_id
+    now = datetime.now(timezone.utc)
+    two_days, one_day = now - timedelta(days=2), now - timedelta(days=1)
+    for timestamp, event_type in [
+        (two_days, "view"),
+        (two_days + timedelta(seconds=1), "view"),
+        (two_days, "click"),
+        (one_day, "view"),
+        (now - timedelta(minutes=1), "view"),
+    ]:
+        db.add(
+            Event(
+                user_id=user_id,
+                item_id=item.id,
+                event_type=event_type,
+                timestamp=timestamp,
+            )
+        )
+    db.commit()
+
+    refresh_user_item_daily(db, until=now - timedelta(hours=1), rebuild=True)
+    rows = db.exec(select(UserItemDaily).where(UserItemDaily.user_id == user_id)).all()
+    assert {(row.day, row.event_type): row.count for row in rows} == {
+        (two_days.date(), "view"): 2,
+        (two_days.date(), "click"): 1,
+        (one_day.date(), "view"): 1,
+    }
+    # the event newer than the watermark is read from the event table
+    assert total_count(db, user_id) == 5
+
+    # the watermark never moves back
+    assert refresh_user_item_daily(db, until=now - timedelta(days=1)) == 0
+    refresh_user_item_daily(db, until=now)
+    assert total_count(db, user_id) == 5
+    rows = db.exec(select(UserItemDaily).where(UserItemDaily.user_id == user_id)).all()
+    assert sum(row.count for row in rows) == 5
+
+
+def test_user_item_counts_weighted(db: Session) -> None:
+    viewed, bought = create_random_item(db), create_random_item(db)
+    user_id = viewed.seller_id
+    now = datetime.now(timezone.utc)
+    events = [(viewed, "view")] * 3 + [(bought, "purchase")]
+    for item, event_type in events:
+        db.add(
+            Event(
+                user_id=user_id, item_id=item.id, event_type=event_type, timestamp=now
+            )
+        )
+    db.commit()
+
+    counts = user_item_counts()
+    rows = db.exec(
+        select(counts.c.item_id, func.sum(counts.c.count), func.sum(counts.c.weight))
+        .where(counts.c.user_id == user_id)
+        .group_by(counts.c.item_id)
+    ).all()
+    assert {item_id: (count, weight) for item_id, count, weight in rows} == {
+        viewed.id: (3, 3.0),
+        bought.id: (1, 8.0),
+    }
@@ -0,0 +1,61 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.models import ItemSimilarity
+from app.recommend.features import ItemFeatureMatrix
+from app.recommend.interactions import Interactions
+from app.tests.utils.item import create_random_item
+from app.tools.cron_script import (
+    build_als,
+    build_covisitation,
+    build_item_index,
+    build_item_similarity,
+)
+
+
+def test_build_item_index(db: Session, tmp_path: Path) -> None:
+    create_random_item(db)
+    matrix = ItemFeatureMatrix.from_session(db)
+    with patch.object(settings, "MODEL_DIR", str(tmp_path)):
+        build_item_index(matrix)
+        assert not Path(settings.ann_index_path).exists()
+        assert matrix.index is None
+
+        with patch.object(settings, "ANN_MIN_ITEMS", 1):
+            build_item_index(matrix)
+        assert Path(settings.ann_index_path).exists()
+    assert matrix.index is not None
+
+
+def test_build_item_similarity(db: Session) -> None:
+    item = create_random_item(db)
+    for _ in range(3):
+        create_random_item(db)
+    matrix = ItemFeatureMatrix.from_session(db)
+    with patch.object(settings, "SIMILARITY_TOP_K", 3):
+        build_item_similarity(db, matrix)
+
+    rows = db.exec(
+        select(ItemSimilarity)
+        .where(ItemSimilarity.item_id == item.id)
+        .order_by(col(ItemSimilarity.rank))
+    ).all()
+    assert [row.rank for row in rows] == [0, 1, 2]
+    assert item.id not in [row.neighbour_id for row in rows]
+    assert rows[0].score >= rows[1].score >= rows[2].score
+
+
+def test_build_covisitation(db: Session, tmp_path: Path) -> None:
+    with patch.object(settings, "MODEL_DIR", str(tmp_path)):
+        build_covisitation(Interactions.from_session(db))
+        assert Path(settings.covisit_path).exists()
+
+
+def test_build_als(db: Session, tmp_path: Path) -> None:
+    with patch.object(settings, "MODEL_DIR", str(tmp_path)):
+        build_als(Interactions.from_session(db))
+        assert Path(settings.als_dir, "user_factors.npy").exists()
+        assert Path(settings.als_dir, "item_factors.npy").exists()
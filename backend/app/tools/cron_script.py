@@ -1,3 +1,159 @@
 """
-Cron script that will be doing updates of ML models ....
+Periodic maintenance of the event store and the recommender models.
+
+Run by cron through scripts/cron_job.sh, each run in order:
+
+1. creates upcoming event partitions and retires expired ones,
+2. deletes expired event idempotency keys,
+3. folds new events into the item popularity and daily user-item rollups,
+4. trains the ANN (IVF) index over catalogs of `ANN_MIN_ITEMS` or more,
+5. rebuilds the co-visitation counts,
+6. trains the ALS model,
+7. rebuilds the `item_similarity` table from the index and co-visitation.
+
+Steps 4 to 7 are skipped while the catalog is empty.
 """
+
+import logging
+
+from sqlmodel import Session, delete
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.pagination import keyset_top_k
+from app.ingest.dedup import delete_expired_keys
+from app.ingest.partitions import maintain_event_partitions
+from app.models import ItemSimilarity
+from app.recommend.als import AlsModel, train_als
+from app.recommend.covisit import CoVisitation, blend
+from app.recommend.features import ItemFeatureMatrix, build_index
+from app.recommend.interactions import Interactions
+from app.recommend.popularity import refresh_item_popularity
+from app.recommend.user_item_daily import refresh_user_item_daily
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def build_item_index(matrix: ItemFeatureMatrix) -> None:
+    """
+    Train the ANN index over the item catalog and persist it for the API workers.
+    Catalogs below `ANN_MIN_ITEMS` are searched exactly and get no index.
+    """
+    if len(matrix) < settings.ANN_MIN_ITEMS:
+        logger.info(f"Item index skipped for {len(matrix)} items")
+        return
+    index = build_index(matrix)
+    index.save(settings.ann_index_path, matrix.ids, matrix.layout)
+    matrix.index = index
+    logger.info(
+        f"Item index with {index.n_lists} lists over {len(matrix)} items "
+        f"saved to '{settings.ann_index_path}'"
+    )
+
+
+def build_covisitation(interactions: Interactions) -> CoVisitation:
+    """
+    Train item-item co-visitation from events and persist it for the API workers.
+    """
+    covisitation = CoVisitation.from_interactions(
+        interactions, top_n=settings.COVISIT_TOP_N
+    )
+    covisitation.save(settings.covisit_path)
+    logger.info(
+        f"Co-visitation over {len(covisitation)} items with "
+        f"{covisitation.neighbours.nnz} neighbours saved to '{settings.covisit_path}'"
+    )
+    return covisitation
+
+
+def build_als(interactions: Interactions) -> None:
+    """
+    Train the ALS model and publish its factor files for the API workers.
+    """
+    user_factors, item_factors = train_als(
+        interactions,
+        n_factors=settings.ALS_FACTORS,
+        iterations=settings.ALS_ITERATIONS,
+        regularization=settings.ALS_REGULARIZATION,
+        alpha=settings.ALS_ALPHA,
+    )
+    AlsModel.save(
+        settings.als_dir,
+        interactions.user_ids,
+        user_factors,
+        interactions.item_ids,
+        item_factors,
+    )
+    logger.info(
+        f"ALS factors for {len(interactions.user_ids)} users and "
+        f"{len(interactions.item_ids)} items saved to '{settings.als_dir}'"
+    )
+
+
+def build_item_similarity(
+    session: Session,
+    matrix: ItemFeatureMatrix,
+    covisitation: CoVisitation | None = None,
+) -> None:
+    """
+    Replace the `item_similarity` table with the top-K neighbours of every item,
+    blended with co-visitation when given.
+    Readers keep seeing the previous table until the transaction commits.
+    """
+    k = settings.SIMILARITY_TOP_K
+    weight = settings.COVISIT_WEIGHT if covisitation is not None else 0.0
+    session.exec(delete(ItemSimilarity))  # type: ignore
+    connection = session.connection().connection.dbapi_connection
+    assert connection is not None
+    rows = 0
+    with connection.cursor() as cursor:  # type: ignore[attr-defined]
+        with cursor.copy(
+            "COPY item_similarity (item_id, rank, neighbour_id, score) FROM STDIN"
+        ) as copy:
+            for positions, neighbours, _ in matrix.iter_top_k(k):
+                for position, row in zip(positions, neighbours, strict=True):
+                    item_id = matrix.ids[position]
+                    covisited = covisitation.scores(item_id) if covisitation else {}
+                    # scored and ordered like the pages the engine ranks
+                    candidates, scores = blend(
+                        matrix,
+                        matrix.matrix[position],
+                        row[row >= 0],
+                        covisited,
+                        weight,
+                    )
+                    top = keyset_top_k(-scores, matrix.id_of(candidates), k)
+                    for rank, i in enumerate(top):
+                        neighbour = matrix.ids[candidates[i]]
+                        copy.write_row((item_id, rank, neighbour, float(scores[i])))
+                        rows += 1
+    session.commit()
+    logger.info(f"Item similarity table rebuilt with {rows} rows")
+
+
+def main() -> None:
+    logger.info("Updating recommender models")
+    with Session(engine) as session:
+        created, retired = maintain_event_partitions(session)
+        logger.info(f"Event partitions created: {created}, retired: {retired}")
+        expired = delete_expired_keys(session)
+        logger.info(f"Expired event idempotency keys deleted: {expired}")
+        updated = refresh_item_popularity(session)
+        logger.info(f"Item popularity rollup updated for {updated} items")
+        compacted = refresh_user_item_daily(session)
+        logger.info(f"Daily user-item rollup updated with {compacted} rows")
+        matrix = ItemFeatureMatrix.from_session(session)
+        if len(matrix) == 0:
+            logger.info("No items, nothing to update")
+            return
+        build_item_index(matrix)
+        interactions = Interactions.from_session(session)
+        covisitation = build_covisitation(interactions)
+        build_als(interactions)
+        build_item_similarity(session, matrix, covisitation)
+    logger.info("Recommender models updated")
+
+
+if __name__ == "__main__":
+    main()
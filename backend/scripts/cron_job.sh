@@ -1,2 +1,6 @@
 #!/bin/bash
-python /app/app/tools/cron_script.py
+set -e
+# environment of the container, saved by scripts/cron_start.sh
+source /app/cron.env
+cd /app
+python -m app.tools.cron_script
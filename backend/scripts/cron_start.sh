@@ -0,0 +1,12 @@
+#! /usr/bin/env bash
+
+set -e
+
+# cron runs jobs with an almost empty environment, save the container's one
+# (PATH of the venv, PYTHONPATH, POSTGRES_*, ...) for scripts/cron_job.sh,
+# readable by root only as it holds the secrets
+rm -f /app/cron.env
+(umask 077 && export -p > /app/cron.env)
+
+cron
+tail -f /var/log/cron.log